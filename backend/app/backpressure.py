@@ -0,0 +1,215 @@
+"""
+Backpressure
+소켓별 송신 대기열 한도와 느린 클라이언트 정리
+
+- 연결마다 Engine.IO 송신 큐에 넣은 패킷 크기를 기록하고, 큐 길이(qsize)로 아직 나가지 않은 바이트를 계산한다.
+- 이벤트는 우선순위 클래스로 나눈다.
+  CRITICAL (기본): 메시지 / 알림 / 시그널링 / ack - 항상 보낸다.
+  COLLAPSIBLE: 타이핑 / presence / 읽음 위치 - 밀리면 키별 최신 값만 보관했다가 큐가 비면 보낸다.
+  DROPPABLE: 화이트보드 획 - 밀리면 버린다.
+- 대기 바이트가 soft_limit을 넘은 연결에는 COLLAPSIBLE / DROPPABLE 이벤트를 바로 넣지 않는다.
+- hard_limit을 grace 초 넘게 넘고 있는 연결은 끊는다 (클라이언트는 재접속 후 REST로 다시 동기화).
+- report()로 소켓별 대기 바이트와 버림 / 합침 / 끊김 횟수를 노출한다. 소켓은 sid 대신 워커별 키로 만든 불투명 ID로 표시한다.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+CRITICAL = "critical"
+COLLAPSIBLE = "collapsible"
+DROPPABLE = "droppable"
+
+EVENT_PRIORITIES: Dict[str, str] = {
+  "typing_start": COLLAPSIBLE,
+  "typing_stop": COLLAPSIBLE,
+  "presence_update": COLLAPSIBLE,
+  "channel_presence": COLLAPSIBLE,
+  "user_read_update": COLLAPSIBLE,
+  "whiteboard_draw": DROPPABLE,
+}
+
+
+def _first(data: List) -> Dict:
+  return data[0] if data and isinstance(data[0], dict) else {}
+
+
+# 합칠 때 같은 키면 최신 값 하나만 남긴다 (typing_start/stop은 같은 키를 써서 마지막 상태만 보낸다)
+COLLAPSE_KEYS: Dict[str, Callable[[List], Tuple]] = {
+  "typing_start": lambda data: ("typing", _first(data).get("channelId"), _first(data).get("userId")),
+  "typing_stop": lambda data: ("typing", _first(data).get("channelId"), _first(data).get("userId")),
+  "presence_update": lambda data: ("presence", _first(data).get("serverId")),
+  "channel_presence": lambda data: ("channel_presence", _first(data).get("channelId"), _first(data).get("userId")),
+  "user_read_update": lambda data: ("read", _first(data).get("channelId"), _first(data).get("userId")),
+}
+
+
+def _merge_presence(held: List, data: List) -> List:
+  """presence_update는 서버 하나에 여러 사용자가 들어 있어 사용자별로 합친다"""
+  users = {u["userId"]: u for u in _first(held).get("users", [])}
+  users.update({u["userId"]: u for u in _first(data).get("users", [])})
+  return [{**_first(data), "users": list(users.values())}]
+
+
+MERGERS: Dict[str, Callable[[List, List], List]] = {"presence_update": _merge_presence}
+
+
+class Consumer:
+  """연결 하나의 송신 대기 상태"""
+
+  __slots__ = ("sizes", "queued_bytes", "held", "over_since", "dropped", "collapsed")
+
+  def __init__(self):
+    self.sizes: deque = deque()  # 아직 큐에 있는 (것으로 보이는) 패킷 크기
+    self.queued_bytes = 0
+    self.held: "OrderedDict[Tuple, Tuple[str, List]]" = OrderedDict()  # 합칠 키 -> (이벤트, 인자)
+    self.over_since: Optional[float] = None
+    self.dropped = 0
+    self.collapsed = 0
+
+  def sync(self, qsize: int) -> int:
+    """Engine.IO 큐 길이에 맞춰 이미 나간 패킷을 뺀다 (큐는 FIFO)"""
+    while len(self.sizes) > qsize:
+      self.queued_bytes -= self.sizes.popleft()
+    return self.queued_bytes
+
+
+class OutboundLimiter:
+  """소켓별 송신 대기 바이트 한도 + 우선순위별 버림/합침 + 느린 클라이언트 끊기"""
+
+  def __init__(self, soft_limit: int = 256 * 1024, hard_limit: int = 1024 * 1024, grace: float = 10.0,
+               interval: float = 0.5, priorities: Optional[Dict[str, str]] = None):
+    self.soft_limit = soft_limit
+    self.hard_limit = hard_limit
+    self.grace = grace
+    self.interval = interval
+    self.priorities = priorities or EVENT_PRIORITIES
+    self.consumers: Dict[str, Consumer] = {}
+    self.stats = {"dropped": 0, "collapsed": 0, "flushed": 0, "disconnected": 0}
+    self._queue_size: Callable[[str], int] = lambda eio_sid: 0
+    self._resend: Optional[Callable[[str, str, List], Awaitable[None]]] = None
+    self._disconnect: Optional[Callable[[str], Awaitable[None]]] = None
+    self._task: Optional[asyncio.Task] = None
+    self._label_key = os.urandom(16)
+
+  def bind(self, queue_size: Callable[[str], int], resend: Callable[[str, str, List], Awaitable[None]],
+           disconnect: Callable[[str], Awaitable[None]]):
+    """서버 연결 - 큐 길이 조회, 보관한 이벤트 재전송, 연결 끊기"""
+    self._queue_size = queue_size
+    self._resend = resend
+    self._disconnect = disconnect
+
+  def _consumer(self, eio_sid: str) -> Consumer:
+    consumer = self.consumers.get(eio_sid)
+    if consumer is None:
+      consumer = self.consumers[eio_sid] = Consumer()
+    return consumer
+
+  def queued_bytes(self, eio_sid: str) -> int:
+    consumer = self.consumers.get(eio_sid)
+    return consumer.sync(self._queue_size(eio_sid)) if consumer else 0
+
+  def admit(self, eio_sid: str, event: str, data: List) -> bool:
+    """지금 큐에 넣어도 되면 True, 보관했거나 버렸으면 False"""
+    priority = self.priorities.get(event, CRITICAL)
+    if priority == CRITICAL:
+      return True
+    consumer = self._consumer(eio_sid)
+    key = COLLAPSE_KEYS[event](data) if priority == COLLAPSIBLE else None
+    lagging = consumer.sync(self._queue_size(eio_sid)) >= self.soft_limit
+    if not lagging and key not in consumer.held:
+      return True
+    if key is None:
+      consumer.dropped += 1
+      self.stats["dropped"] += 1
+      return False
+    held = consumer.held.pop(key, None)
+    if held is not None:
+      consumer.collapsed += 1
+      self.stats["collapsed"] += 1
+      merge = MERGERS.get(event)
+      if merge is not None and held[0] == event:
+        data = merge(held[1], data)
+    consumer.held[key] = (event, data)
+    return False
+
+  def sent(self, eio_sid: str, sizes: List[int]):
+    """큐에 넣은 패킷 크기 기록"""
+    consumer = self._consumer(eio_sid)
+    for size in sizes:
+      consumer.sizes.append(size)
+      consumer.queued_bytes += size
+
+  def forget(self, eio_sid: str):
+    self.consumers.pop(eio_sid, None)
+
+  async def sweep(self):
+    """큐가 빠진 연결에는 보관한 이벤트를 보내고, hard_limit을 grace 넘게 넘긴 연결은 끊는다"""
+    now = time.monotonic()
+    for eio_sid, consumer in list(self.consumers.items()):
+      queued = consumer.sync(self._queue_size(eio_sid))
+      if queued >= self.hard_limit:
+        if consumer.over_since is None:
+          consumer.over_since = now
+        elif now - consumer.over_since >= self.grace:
+          self.stats["disconnected"] += 1
+          self.forget(eio_sid)
+          await self._disconnect(eio_sid)
+          continue
+      else:
+        consumer.over_since = None
+
+      if consumer.held and queued < self.soft_limit // 2:
+        held, consumer.held = consumer.held, OrderedDict()
+        for event, data in held.values():
+          self.stats["flushed"] += 1
+          await self._resend(eio_sid, event, data)
+      elif not consumer.held and not consumer.sizes and consumer.over_since is None:
+        # 한가한 연결은 다음 송신 때 다시 만든다
+        self.consumers.pop(eio_sid, None)
+
+  async def _run(self):
+    while True:
+      await asyncio.sleep(self.interval)
+      try:
+        await self.sweep()
+      except Exception as e:
+        print(f"[backpressure] 정리 실패: {e}")
+
+  def start(self):
+    if self._task is None:
+      self._task = asyncio.create_task(self._run())
+
+  async def stop(self):
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+
+  def _label(self, eio_sid: str) -> str:
+    """report용 불투명 ID - Engine.IO sid를 알면 polling POST로 그 세션에 이벤트를 넣을 수 있어 노출하지 않는다"""
+    return hashlib.blake2s(eio_sid.encode(), key=self._label_key, digest_size=6).hexdigest()
+
+  def report(self, top: int = 50) -> Dict[str, Any]:
+    sockets = []
+    for eio_sid, consumer in self.consumers.items():
+      queued = consumer.sync(self._queue_size(eio_sid))
+      sockets.append({
+        "socket": self._label(eio_sid),
+        "queuedBytes": queued,
+        "queuedPackets": len(consumer.sizes),
+        "held": len(consumer.held),
+        "dropped": consumer.dropped,
+        "collapsed": consumer.collapsed,
+        "overLimitFor": round(time.monotonic() - consumer.over_since, 1) if consumer.over_since else 0.0,
+      })
+    sockets.sort(key=lambda s: s["queuedBytes"], reverse=True)
+    return {
+      **self.stats,
+      "soft_limit": self.soft_limit,
+      "hard_limit": self.hard_limit,
+      "queued_bytes_total": sum(s["queuedBytes"] for s in sockets),
+      "lagging": sum(1 for s in sockets if s["queuedBytes"] >= self.soft_limit),
+      "sockets": sockets[:top],
+    }
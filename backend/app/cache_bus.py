@@ -0,0 +1,129 @@
+"""
+Cache Bus
+워커 간 프로세스 메모리 캐시 무효화
+
+- 워커마다 메모리에 두는 캐시(권한, 인증 사용자, 알림 설정, 키워드 매처, @멘션 디렉터리, 채널 멤버 목록)는
+  바꾼 워커에서 먼저 고치고, 다른 워커에는 이 버스로 알린다.
+  invalidate(kind, ...)는 등록한 핸들러를 이 워커에서 바로 부르고 다른 워커에도 보내며,
+  publish(kind, ...)는 이 워커는 이미 고쳤을 때(write-through) 다른 워커에만 보낸다.
+- redis가 있으면 채널 하나(cache:invalidate)에 {origin, kind, payload} JSON을 발행하고, 각 워커의 리스너는
+  자기가 보낸 것을 빼고 kind별 핸들러로 넘긴다. redis가 없으면(단일 워커) 보내지 않는다.
+- 핸들러와 발행은 동기 호출이라 기존 무효화 호출 자리를 그대로 바꿀 수 있다 (발행은 송신 태스크가 맡는다).
+- pub/sub은 끊긴 동안의 메시지를 잃으므로 다시 구독할 때마다 on_reset 콜백으로 캐시를 통째로 비운다.
+  각 캐시의 TTL은 그 밖의 누락에 대한 마지막 안전장치다.
+"""
+import asyncio
+import json
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, List
+
+Handler = Callable[[Dict[str, Any]], None]
+
+
+class CacheBus:
+  """kind별 무효화 핸들러 + redis pub/sub 전파"""
+
+  def __init__(self, redis=None, channel: str = "cache:invalidate", retry: float = 1.0):
+    self.redis = redis
+    self.channel = channel
+    self.retry = retry
+    self.origin = uuid.uuid4().hex
+    self.handlers: Dict[str, Handler] = {}
+    self.resets: List[Callable[[], None]] = []
+    self.outbox: deque = deque()
+    self.stats = {"published": 0, "received": 0, "resets": 0, "errors": 0}
+    self._wakeup = asyncio.Event()
+    self._tasks: List[asyncio.Task] = []
+
+  def on(self, kind: str, handler: Handler):
+    self.handlers[kind] = handler
+
+  def on_reset(self, callback: Callable[[], None]):
+    self.resets.append(callback)
+
+  def invalidate(self, kind: str, **payload):
+    """이 워커에서 핸들러를 바로 실행하고 다른 워커에도 보낸다"""
+    self.handlers[kind](payload)
+    self.publish(kind, **payload)
+
+  def publish(self, kind: str, **payload):
+    """다른 워커에만 보낸다"""
+    if self.redis is None:
+      return
+    self.outbox.append(json.dumps({"origin": self.origin, "kind": kind, "payload": payload}))
+    self._wakeup.set()
+
+  def _dispatch(self, raw: str):
+    message = json.loads(raw)
+    if message.get("origin") == self.origin:
+      return
+    handler = self.handlers.get(message.get("kind"))
+    if handler is None:
+      return
+    self.stats["received"] += 1
+    try:
+      handler(message.get("payload") or {})
+    except Exception as e:
+      self.stats["errors"] += 1
+      print(f"[cache-bus] 무효화 처리 실패 ({message.get('kind')}): {e}")
+
+  def _reset(self):
+    self.stats["resets"] += 1
+    for callback in self.resets:
+      try:
+        callback()
+      except Exception as e:
+        print(f"[cache-bus] 캐시 초기화 실패: {e}")
+
+  async def _send(self):
+    while True:
+      await self._wakeup.wait()
+      self._wakeup.clear()
+      while self.outbox:
+        try:
+          await self.redis.publish(self.channel, self.outbox[0])
+        except Exception as e:
+          self.stats["errors"] += 1
+          print(f"[cache-bus] 발행 실패: {e}")
+          await asyncio.sleep(self.retry)
+          continue
+        self.outbox.popleft()
+        self.stats["published"] += 1
+
+  async def _listen(self):
+    subscribed_once = False
+    while True:
+      pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+      try:
+        await pubsub.subscribe(self.channel)
+        if subscribed_once:
+          # 끊긴 동안 놓친 무효화가 있을 수 있다
+          self._reset()
+        subscribed_once = True
+        async for message in pubsub.listen():
+          if message.get("type") == "message":
+            self._dispatch(message["data"])
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        self.stats["errors"] += 1
+        print(f"[cache-bus] 구독 끊김, 다시 연결: {e}")
+      finally:
+        try:
+          await pubsub.reset()
+        except Exception:
+          pass
+      await asyncio.sleep(self.retry)
+
+  def start(self):
+    if self.redis is not None and not self._tasks:
+      self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._send())]
+
+  async def stop(self):
+    for task in self._tasks:
+      task.cancel()
+    self._tasks = []
+
+  def report(self) -> Dict:
+    return {**self.stats, "shared": self.redis is not None, "outbox": len(self.outbox)}
@@ -0,0 +1,238 @@
+"""
+Channel Membership
+채널 멤버십 저장소와 채널 열람(presence) 추적
+
+- 멤버십("채널 멤버인가")은 channel_members 컬렉션에 (채널, 사용자)당 문서 하나로 저장하고,
+  초대 / 첫 입장 / 나가기 / 추방 때만 쓴다. 채널별 멤버 목록은 LRU 캐시에 올려 두고
+  캐시에 없거나 ttl이 지난 채널만 한 번의 $in 쿼리로 읽는다.
+- 멤버십을 바꾸면 이 워커의 캐시는 바로 고치고 on_change(채널 ID 목록)로 알린다 (다른 워커는 invalidate).
+- presence("지금 채널을 보고 있는가")는 이 워커의 소켓을 메모리에 두고(워커 간 공유는 PresenceRegistry가
+  Redis로), 소켓 join/leave/disconnect는 DB를 건드리지 않는다. 한 사용자가 여러 소켓으로 같은 채널을 보면 마지막 소켓이 나갈 때 떠난 것으로 본다.
+"""
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+SUMMARY_FIELDS = ("name", "avatar", "role")
+
+
+def _member_id(channel_id: str, user_id: str) -> str:
+  return f"{channel_id}:{user_id}"
+
+
+def _summary(doc: Dict) -> Dict:
+  summary = {"id": doc["user_id"]}
+  summary.update({k: doc[k] for k in SUMMARY_FIELDS if k in doc})
+  return summary
+
+
+class ChannelMembership:
+  """channel_members 컬렉션 + 채널별 멤버 LRU 캐시"""
+
+  def __init__(self, collection, max_channels: int = 5000, ttl: float = 300.0):
+    self.collection = collection
+    self.max_channels = max_channels
+    self.ttl = ttl
+    self.entries: "OrderedDict[str, Dict[str, Dict]]" = OrderedDict()
+    self.expires_at: Dict[str, float] = {}
+    self.generations: Dict[str, int] = {}  # 채널 -> 무효화 횟수 (조회 중 무효화 감지)
+    self.on_change: Optional[Callable[[List[str]], None]] = None
+
+  async def ensure_indexes(self):
+    await self.collection.create_index([("channel_id", 1), ("joined_at", 1)], name="channel_joined")
+    await self.collection.create_index([("user_id", 1), ("server_id", 1)], name="user_server")
+
+  def _touch(self, channel_id: str):
+    if channel_id not in self.entries:
+      return
+    self.entries.move_to_end(channel_id)
+    while len(self.entries) > self.max_channels:
+      old_channel_id, _ = self.entries.popitem(last=False)
+      self.expires_at.pop(old_channel_id, None)
+
+  async def _load(self, channel_ids: List[str]) -> Dict[str, Dict[str, Dict]]:
+    """채널 ID -> {user_id: 요약} (캐시에 없거나 만료된 채널만 읽는다)"""
+    now = time.monotonic()
+    result = {}
+    missing = []
+    for ch in channel_ids:
+      if ch in self.entries and self.expires_at.get(ch, 0) >= now:
+        result[ch] = self.entries[ch]
+      else:
+        missing.append(ch)
+    if not missing:
+      return result
+    generations = {ch: self.generations.get(ch, 0) for ch in missing}
+    loaded: Dict[str, Dict[str, Dict]] = {ch: {} for ch in missing}
+    cursor = self.collection.find({"channel_id": {"$in": missing}}).sort("joined_at", 1)
+    async for doc in cursor:
+      loaded[doc["channel_id"]][doc["user_id"]] = _summary(doc)
+    expires_at = time.monotonic() + self.ttl
+    for ch, members in loaded.items():
+      result[ch] = members
+      if self.generations.get(ch, 0) == generations[ch]:
+        self.entries[ch] = members
+        self.expires_at[ch] = expires_at
+    return result
+
+  def _changed(self, channel_ids: Iterable[str]):
+    channel_ids = list(dict.fromkeys(channel_ids))
+    for channel_id in channel_ids:
+      # 바뀌기 전에 시작한 조회 결과가 캐시에 들어가지 않도록
+      self.generations[channel_id] = self.generations.get(channel_id, 0) + 1
+    if channel_ids and self.on_change is not None:
+      self.on_change(channel_ids)
+
+  def invalidate(self, channel_ids: Iterable[str]):
+    """다른 워커에서 바뀐 채널 - 다음 조회 때 다시 읽는다"""
+    for channel_id in channel_ids:
+      self.entries.pop(channel_id, None)
+      self.expires_at.pop(channel_id, None)
+      self.generations[channel_id] = self.generations.get(channel_id, 0) + 1
+
+  def clear(self):
+    self.invalidate(list(self.entries))
+
+  async def members_many(self, channel_ids: Iterable[str]) -> Dict[str, List[Dict]]:
+    channel_ids = list(dict.fromkeys(channel_ids))
+    loaded = await self._load(channel_ids)
+    result = {ch: list(loaded[ch].values()) for ch in channel_ids}
+    for ch in channel_ids:
+      self._touch(ch)
+    return result
+
+  async def members(self, channel_id: str) -> List[Dict]:
+    return (await self.members_many([channel_id]))[channel_id]
+
+  async def is_member(self, channel_id: str, user_id: str) -> bool:
+    loaded = await self._load([channel_id])
+    self._touch(channel_id)
+    return user_id in loaded[channel_id]
+
+  async def add(self, channel_ids: Iterable[str], member: Dict, server_id: Optional[str] = None) -> List[str]:
+    """채널들에 멤버 추가 - 새로 추가된 채널 ID 목록 반환 (이미 멤버인 채널은 그대로)"""
+    added = await self.add_many([(channel_id, member) for channel_id in channel_ids], server_id)
+    return [channel_id for channel_id, _ in added]
+
+  async def add_many(self, pairs: List[Tuple[str, Dict]], server_id: Optional[str] = None) -> List[Tuple[str, Dict]]:
+    """(채널 ID, 멤버) 쌍을 bulk_write 한 번으로 upsert - 새로 추가된 쌍 목록 반환"""
+    if not pairs:
+      return []
+    now = datetime.now(timezone.utc)
+    operations = []
+    for channel_id, member in pairs:
+      doc = {
+        "_id": _member_id(channel_id, member["id"]),
+        "channel_id": channel_id,
+        "user_id": member["id"],
+        "server_id": server_id,
+        "joined_at": now,
+      }
+      doc.update({k: member[k] for k in SUMMARY_FIELDS if k in member})
+      operations.append(UpdateOne({"_id": doc["_id"]}, {"$setOnInsert": doc}, upsert=True))
+    result = await self.collection.bulk_write(operations, ordered=False)
+
+    added = []
+    for index in sorted(result.upserted_ids):
+      channel_id, member = pairs[index]
+      added.append((channel_id, member))
+      if channel_id in self.entries:
+        self.entries[channel_id][member["id"]] = _summary({"user_id": member["id"], **member})
+    self._changed(channel_id for channel_id, _ in added)
+    return added
+
+  async def remove(self, user_id: str, channel_ids: Optional[Iterable[str]] = None,
+                   server_id: Optional[str] = None) -> List[str]:
+    """채널 ID 목록 또는 서버 전체 채널에서 멤버 제거 - 제거된 채널 ID 목록 반환"""
+    query: Dict = {"user_id": user_id}
+    if channel_ids is not None:
+      query["channel_id"] = {"$in": list(channel_ids)}
+    if server_id:
+      query["server_id"] = server_id
+    removed = [doc["channel_id"] async for doc in self.collection.find(query, {"channel_id": 1})]
+    if removed:
+      await self.collection.delete_many({"_id": {"$in": [_member_id(ch, user_id) for ch in removed]}})
+    for channel_id in removed:
+      if channel_id in self.entries:
+        self.entries[channel_id].pop(user_id, None)
+    self._changed(removed)
+    return removed
+
+  async def remove_users(self, user_ids: Iterable[str], server_id: str) -> Dict[str, List[str]]:
+    """서버 전체 채널에서 여러 사용자 제거 - 채널 ID -> 제거된 사용자 ID 목록"""
+    query = {"server_id": server_id, "user_id": {"$in": list(user_ids)}}
+    removed: Dict[str, List[str]] = defaultdict(list)
+    async for doc in self.collection.find(query, {"channel_id": 1, "user_id": 1}):
+      removed[doc["channel_id"]].append(doc["user_id"])
+    if removed:
+      await self.collection.delete_many(query)
+    for channel_id, users in removed.items():
+      entry = self.entries.get(channel_id)
+      if entry is not None:
+        for user_id in users:
+          entry.pop(user_id, None)
+    self._changed(removed)
+    return dict(removed)
+
+  async def remove_channels(self, channel_ids: Iterable[str]):
+    """삭제된 채널의 멤버십 정리"""
+    channel_ids = list(channel_ids)
+    if not channel_ids:
+      return
+    await self.collection.delete_many({"channel_id": {"$in": channel_ids}})
+    self.invalidate(channel_ids)
+    self._changed(channel_ids)
+
+
+class ChannelPresence:
+  """채널별로 지금 보고 있는 사용자 (이 워커의 소켓, 워커 간 공유는 PresenceRegistry가 맡는다)"""
+
+  def __init__(self):
+    self.viewers: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+    self.sid_channels: Dict[str, Dict[str, str]] = defaultdict(dict)
+
+  def enter(self, sid: str, channel_id: str, user_id: str) -> bool:
+    """sid가 채널 열람 시작 - 사용자의 첫 열람이면 True"""
+    sids = self.viewers[channel_id][user_id]
+    first = not sids
+    sids.add(sid)
+    self.sid_channels[sid][channel_id] = user_id
+    return first
+
+  def leave(self, sid: str, channel_id: str) -> Optional[str]:
+    """sid가 채널 열람 종료 - 사용자의 마지막 열람이 끝났으면 user_id 반환"""
+    user_id = self.sid_channels.get(sid, {}).pop(channel_id, None)
+    if user_id is None:
+      return None
+    if not self.sid_channels[sid]:
+      del self.sid_channels[sid]
+    users = self.viewers.get(channel_id)
+    sids = users.get(user_id) if users else None
+    if sids is None:
+      return None
+    sids.discard(sid)
+    if sids:
+      return None
+    del users[user_id]
+    if not users:
+      del self.viewers[channel_id]
+    return user_id
+
+  def drop_sid(self, sid: str) -> List[Tuple[str, str]]:
+    """소켓 종료 - 마지막 열람이 끝난 (channel_id, user_id) 목록"""
+    ended = []
+    for channel_id in list(self.sid_channels.get(sid, {})):
+      user_id = self.leave(sid, channel_id)
+      if user_id:
+        ended.append((channel_id, user_id))
+    return ended
+
+  def is_viewing(self, channel_id: str, user_id: str) -> bool:
+    users = self.viewers.get(channel_id)
+    return bool(users and users.get(user_id))
+
+  def channel_viewers(self, channel_id: str) -> Set[str]:
+    return set(self.viewers.get(channel_id, ()))
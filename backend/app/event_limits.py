@@ -0,0 +1,168 @@
+"""
+Event Limits
+Socket.IO 수신 이벤트 토큰 버킷 (sid별 / 사용자별, 이벤트 종류별 설정)
+
+- 이벤트마다 sid 버킷과 사용자 버킷 (초당 rate, burst)을 따로 둔다. 사용자 버킷은 같은 사용자의 모든 기기/탭이 함께 쓴다.
+- 설정이 없는 이벤트는 제한하지 않는다. 기본값은 DEFAULT_EVENT_LIMITS이고 SOCKET_EVENT_LIMITS(JSON)로 덮어쓴다.
+  예: {"message": {"sid": [2, 10], "user": [5, 20]}, "typing_start": null}
+- redis를 주면 사용자 버킷을 Redis 해시 + Lua 스크립트로 원자적으로 갱신해 여러 워커가 같은 버킷을 쓴다.
+  sid는 한 워커에만 붙어 있으므로 sid 버킷은 항상 프로세스 메모리에 둔다. Redis 오류 시에는 메모리 버킷으로 대신한다.
+- check()가 (걸린 범위, 재시도까지 기다릴 초)를 돌려주면 그 이벤트는 핸들러를 부르지 않고 error ack로 거절한다.
+- stats / report()로 이벤트별 허용 / sid 제한 / 사용자 제한 횟수를 노출한다.
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+SID = "sid"
+USER = "user"
+
+# 이벤트 -> {범위: (초당 rate, burst)}
+DEFAULT_EVENT_LIMITS: Dict[str, Dict[str, Tuple[float, int]]] = {
+  "message": {SID: (2, 10), USER: (5, 20)},  # 메시지마다 암호화 + Mongo insert
+  "typing_start": {SID: (2, 5)},
+  "whiteboard_draw": {SID: (60, 120), USER: (120, 240)},
+  "whiteboard_clear": {SID: (0.5, 3)},
+  "notepad_update": {SID: (10, 20), USER: (20, 40)},
+  "call_join": {SID: (0.2, 3), USER: (0.5, 5)},
+  "join": {SID: (5, 30)},
+  "join_server": {SID: (2, 20)},
+  "channel_read": {SID: (5, 20)},
+}
+
+# KEYS[1] = 버킷 해시, ARGV = rate, burst -> {허용 여부, 재시도 대기 초}
+_REDIS_BUCKET = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+def parse_limits(raw: str) -> Dict[str, Dict[str, Tuple[float, int]]]:
+  """SOCKET_EVENT_LIMITS(JSON)를 기본값 위에 덮어쓴다 (null이면 그 이벤트/범위 제한 해제)"""
+  limits = {event: dict(scopes) for event, scopes in DEFAULT_EVENT_LIMITS.items()}
+  if not raw:
+    return limits
+  for event, scopes in json.loads(raw).items():
+    if scopes is None:
+      limits.pop(event, None)
+      continue
+    merged = limits.setdefault(event, {})
+    for scope, value in scopes.items():
+      if scope not in (SID, USER):
+        raise ValueError(f"알 수 없는 제한 범위: {event}.{scope}")
+      if value is None:
+        merged.pop(scope, None)
+      else:
+        merged[scope] = (float(value[0]), int(value[1]))
+  return limits
+
+
+class EventRateLimiter:
+  """이벤트 종류별 sid / 사용자 토큰 버킷"""
+
+  def __init__(self, limits: Optional[Dict[str, Dict[str, Tuple[float, int]]]] = None, redis=None,
+               key_prefix: str = "ratelimit", max_buckets: int = 100000):
+    self.limits = DEFAULT_EVENT_LIMITS if limits is None else limits
+    self.redis = redis
+    self.key_prefix = key_prefix
+    self.max_buckets = max_buckets
+    self.sid_buckets: Dict[str, Dict[str, list]] = {}  # sid -> {이벤트: [tokens, updated_at]} (끊기면 정리)
+    self.user_buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()  # (사용자, 이벤트) -> [tokens, updated_at]
+    self.stats: Dict[str, Dict[str, int]] = {}  # 이벤트 -> {allowed, sid_limited, user_limited}
+    self._script = redis.register_script(_REDIS_BUCKET) if redis is not None else None
+    self.redis_errors = 0
+
+  def _count(self, event: str, key: str):
+    counters = self.stats.get(event)
+    if counters is None:
+      counters = self.stats[event] = {"allowed": 0, "sid_limited": 0, "user_limited": 0}
+    counters[key] += 1
+
+  @staticmethod
+  def _take(bucket: list, rate: float, burst: int) -> Optional[float]:
+    now = time.monotonic()
+    bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+    bucket[1] = now
+    if bucket[0] >= 1:
+      bucket[0] -= 1
+      return None
+    return (1 - bucket[0]) / rate
+
+  def _take_sid(self, sid: str, event: str, rate: float, burst: int) -> Optional[float]:
+    buckets = self.sid_buckets.setdefault(sid, {})
+    bucket = buckets.get(event)
+    if bucket is None:
+      bucket = buckets[event] = [float(burst), time.monotonic()]
+    return self._take(bucket, rate, burst)
+
+  def _take_user(self, user_id: str, event: str, rate: float, burst: int) -> Optional[float]:
+    key = (user_id, event)
+    bucket = self.user_buckets.get(key)
+    if bucket is None:
+      bucket = self.user_buckets[key] = [float(burst), time.monotonic()]
+    self.user_buckets.move_to_end(key)
+    while len(self.user_buckets) > self.max_buckets:
+      self.user_buckets.popitem(last=False)
+    return self._take(bucket, rate, burst)
+
+  async def _take_shared(self, user_id: str, event: str, rate: float, burst: int) -> Optional[float]:
+    try:
+      allowed, wait = await self._script(keys=[f"{self.key_prefix}:{event}:{user_id}"], args=[rate, burst])
+    except Exception as e:
+      self.redis_errors += 1
+      print(f"[ratelimit] redis 버킷 실패, 메모리 버킷 사용: {e}")
+      return self._take_user(user_id, event, rate, burst)
+    return None if int(allowed) else float(wait)
+
+  async def check(self, event: str, sid: str, user_id: Optional[str]) -> Optional[Tuple[str, float]]:
+    """허용하면 None, 거절하면 (걸린 범위, 재시도까지 기다릴 초)"""
+    scopes = self.limits.get(event)
+    if not scopes:
+      return None
+    if SID in scopes:
+      wait = self._take_sid(sid, event, *scopes[SID])
+      if wait is not None:
+        self._count(event, "sid_limited")
+        return SID, wait
+    if USER in scopes and user_id:
+      if self._script is not None:
+        wait = await self._take_shared(user_id, event, *scopes[USER])
+      else:
+        wait = self._take_user(user_id, event, *scopes[USER])
+      if wait is not None:
+        self._count(event, "user_limited")
+        return USER, wait
+    self._count(event, "allowed")
+    return None
+
+  def forget(self, sid: str):
+    """연결이 끊긴 sid의 버킷 정리"""
+    self.sid_buckets.pop(sid, None)
+
+  def report(self) -> Dict[str, Any]:
+    return {
+      "shared": self._script is not None,
+      "sid_buckets": len(self.sid_buckets),
+      "user_buckets": len(self.user_buckets),
+      "redis_errors": self.redis_errors,
+      "limits": {event: {scope: list(value) for scope, value in scopes.items()} for event, scopes in self.limits.items()},
+      "events": self.stats,
+    }
@@ -0,0 +1,137 @@
+"""
+Keyword Matcher
+키워드 알림용 Aho-Corasick 매처
+
+- 모든 사용자의 notification_keywords를 하나의 오토마톤으로 묶어
+  메시지 본문을 한 번만 훑어 일치한 키워드를 찾는다.
+- 키워드 -> 사용자 매핑은 키워드 변경 시 증분 갱신하고, 오토마톤은
+  새로운 키워드가 추가/제거된 경우에만 다음 매칭 때 다시 만든다.
+- 기존 동작과 같이 소문자 부분 문자열 일치로 판단한다.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class AhoCorasick:
+  """정적 패턴 집합 오토마톤 (goto/fail/output)"""
+
+  def __init__(self, patterns: Iterable[str]):
+    self.goto: List[Dict[str, int]] = [{}]
+    self.fail: List[int] = [0]
+    self.output: List[List[str]] = [[]]
+    for pattern in patterns:
+      if pattern:
+        self._insert(pattern)
+    self._build()
+
+  def _insert(self, pattern: str):
+    state = 0
+    for char in pattern:
+      next_state = self.goto[state].get(char)
+      if next_state is None:
+        next_state = len(self.goto)
+        self.goto.append({})
+        self.fail.append(0)
+        self.output.append([])
+        self.goto[state][char] = next_state
+      state = next_state
+    self.output[state].append(pattern)
+
+  def _build(self):
+    queue = deque(self.goto[0].values())
+    while queue:
+      state = queue.popleft()
+      for char, next_state in self.goto[state].items():
+        queue.append(next_state)
+        fallback = self.fail[state]
+        while fallback and char not in self.goto[fallback]:
+          fallback = self.fail[fallback]
+        self.fail[next_state] = self.goto[fallback].get(char, 0)
+        self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+  def find(self, text: str) -> Set[str]:
+    """text에 나타난 패턴 집합"""
+    found = set()
+    state = 0
+    for char in text:
+      while state and char not in self.goto[state]:
+        state = self.fail[state]
+      state = self.goto[state].get(char, 0)
+      if self.output[state]:
+        found.update(self.output[state])
+    return found
+
+
+class KeywordMatcher:
+  """사용자별 알림 키워드 인덱스"""
+
+  def __init__(self):
+    self.user_keywords: Dict[str, List[str]] = {}  # user_id -> 원본 키워드 (순서 유지)
+    self.pattern_users: Dict[str, Set[str]] = {}  # 소문자 키워드 -> user_ids
+    self.loaded = False
+    self._automaton: Optional[AhoCorasick] = None
+
+  def load(self, users: Iterable[Dict]):
+    """시작 시 notification_keywords가 있는 사용자 문서로 전체 구성"""
+    self.user_keywords.clear()
+    self.pattern_users.clear()
+    self._automaton = None
+    for user_doc in users:
+      self.set_keywords(user_doc["_id"], user_doc.get("notification_keywords") or [])
+    self.loaded = True
+
+  def unload(self):
+    """다음 매칭 전에 DB에서 다시 읽도록 표시 (변경 알림을 놓쳤을 수 있을 때)"""
+    self.loaded = False
+
+  def set_keywords(self, user_id: str, keywords: List[str]):
+    """/auth/me/keywords, 프로필 변경 시 호출"""
+    old_patterns = {k.lower() for k in self.user_keywords.get(user_id, [])}
+    keywords = [k for k in keywords if k and k.strip()]
+    new_patterns = {k.lower() for k in keywords}
+    if keywords:
+      self.user_keywords[user_id] = keywords
+    else:
+      self.user_keywords.pop(user_id, None)
+
+    for pattern in old_patterns - new_patterns:
+      users = self.pattern_users.get(pattern)
+      if users is None:
+        continue
+      users.discard(user_id)
+      if not users:
+        del self.pattern_users[pattern]
+        self._automaton = None
+    for pattern in new_patterns - old_patterns:
+      users = self.pattern_users.get(pattern)
+      if users is None:
+        self.pattern_users[pattern] = users = set()
+        self._automaton = None
+      users.add(user_id)
+
+  def match(self, content: str, audience: Optional[Iterable[str]] = None,
+            exclude: Optional[str] = None) -> Dict[str, str]:
+    """한 번의 스캔으로 {user_id: 처음 일치한 키워드} 반환 (audience가 있으면 그 사용자만)"""
+    if not self.pattern_users or not content:
+      return {}
+    if self._automaton is None:
+      self._automaton = AhoCorasick(self.pattern_users)
+    found = self._automaton.find(content.lower())
+    if not found:
+      return {}
+
+    candidates = set()
+    for pattern in found:
+      candidates |= self.pattern_users.get(pattern, set())
+    if audience is not None:
+      candidates &= set(audience)
+    candidates.discard(exclude)
+
+    matches = {}
+    for user_id in candidates:
+      # 사용자당 하나의 키워드 알림만 - 사용자가 등록한 순서상 첫 키워드
+      for keyword in self.user_keywords.get(user_id, []):
+        if keyword.lower() in found:
+          matches[user_id] = keyword
+          break
+    return matches
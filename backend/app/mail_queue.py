@@ -0,0 +1,255 @@
+"""
+Mail Queue
+영속 발신 메일 큐
+
+- 요청 경로(로그인, 비밀번호 재설정)는 mail_queue 컬렉션에 넣기만 하고 바로 반환한다.
+- 워커 태스크가 배치 단위로 메일을 가져가(lease) 워커별 SMTP 연결 하나로 연속 발송하고,
+  idle_timeout 동안 보낼 메일이 없으면 연결을 닫는다.
+- 일시 오류(4xx, 연결 끊김)는 지수 백오프로 재시도하고, 영구 오류(5xx)나
+  max_attempts 초과 메일은 mail_dead_letters 컬렉션으로 옮긴다.
+- lease가 만료된 "sending" 메일(워커 비정상 종료)은 다른 워커가 다시 가져간다.
+  배치의 i번째 메일은 앞 메일들이 최악으로 send_timeout씩 걸려도 만료되지 않도록 lease를 잡고,
+  보내기 직전에 lease_owner로 소유를 확인하며 lease를 갱신한다 (다른 워커가 가져갔으면 건너뛴다).
+- Mongo / SMTP 오류로 워커 루프가 실패하면 연결을 버리고 백오프 후 계속 돈다.
+"""
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Dict, List, Optional
+
+import aiosmtplib
+from pymongo import ReturnDocument
+
+
+def _now() -> datetime:
+  return datetime.now(timezone.utc)
+
+
+class MailQueue:
+  """mail_queue 컬렉션 기반 발신 큐 + SMTP 워커"""
+
+  def __init__(self, collection, dead_letters, hostname: str, port: int, from_email: str,
+               username: str = "", password: str = "", start_tls: bool = True,
+               workers: int = 2, batch_size: int = 20, max_attempts: int = 6,
+               base_delay: float = 5.0, max_delay: float = 900.0, lease: float = 120.0,
+               send_timeout: float = 30.0, idle_timeout: float = 30.0, poll_interval: float = 5.0):
+    self.collection = collection
+    self.dead_letters = dead_letters
+    self.hostname = hostname
+    self.port = port
+    self.from_email = from_email
+    self.username = username
+    self.password = password
+    self.start_tls = start_tls
+    self.workers = workers
+    self.batch_size = batch_size
+    self.max_attempts = max_attempts
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.lease = lease
+    self.send_timeout = send_timeout
+    self.idle_timeout = idle_timeout
+    self.poll_interval = poll_interval
+
+    self.stats = {"sent": 0, "retried": 0, "dead": 0, "connections": 0, "lease_lost": 0, "worker_errors": 0}
+    self._wakeup = asyncio.Event()
+    self._tasks: List[asyncio.Task] = []
+
+  async def ensure_indexes(self):
+    await self.collection.create_index([("status", 1), ("next_attempt_at", 1)], name="status_next_attempt")
+
+  async def enqueue(self, to_email: str, subject: str, body: str) -> str:
+    """메일을 큐에 넣고 ID 반환 (발송은 워커가 비동기로 처리)"""
+    mail_id = f"mail_{uuid.uuid4().hex[:12]}"
+    now = _now()
+    await self.collection.insert_one({
+      "_id": mail_id,
+      "to": to_email,
+      "subject": subject,
+      "body": body,
+      "status": "pending",
+      "attempts": 0,
+      "created_at": now,
+      "next_attempt_at": now,
+    })
+    self._wakeup.set()
+    return mail_id
+
+  def _build_message(self, mail: Dict) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["Subject"] = mail["subject"]
+    message["From"] = self.from_email
+    message["To"] = mail["to"]
+    message.attach(MIMEText(mail["body"], "html"))
+    return message
+
+  async def _claim_batch(self, owner: str) -> List[Dict]:
+    """발송 가능한 메일을 최대 batch_size개 lease (i번째 메일은 앞 메일 i개의 최악 발송 시간만큼 길게)"""
+    batch = []
+    now = _now()
+    for position in range(self.batch_size):
+      lease_until = now + timedelta(seconds=self.lease + position * self.send_timeout)
+      mail = await self.collection.find_one_and_update(
+        {
+          "$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_until": {"$lt": now}},
+          ]
+        },
+        {"$set": {"status": "sending", "lease_until": lease_until, "lease_owner": owner}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+      )
+      if mail is None:
+        break
+      batch.append(mail)
+    return batch
+
+  async def _renew(self, mail: Dict, owner: str) -> bool:
+    """보내기 직전 lease 갱신 - 다른 워커가 이미 가져갔으면 False"""
+    result = await self.collection.update_one(
+      {"_id": mail["_id"], "status": "sending", "lease_owner": owner},
+      {"$set": {"lease_until": _now() + timedelta(seconds=self.lease)}},
+    )
+    if not result.matched_count:
+      self.stats["lease_lost"] += 1
+      return False
+    return True
+
+  def _backoff(self, attempts: int) -> float:
+    delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+  async def _fail(self, mail: Dict, error: Exception, permanent: bool):
+    attempts = mail.get("attempts", 0) + 1
+    if permanent or attempts >= self.max_attempts:
+      await self.dead_letters.insert_one({
+        **mail,
+        "status": "dead",
+        "attempts": attempts,
+        "last_error": str(error),
+        "failed_at": _now(),
+      })
+      await self.collection.delete_one({"_id": mail["_id"]})
+      self.stats["dead"] += 1
+      print(f"[mail_queue] 발송 포기 (dead letter): {mail['to']} - {error}")
+      return
+    await self.collection.update_one(
+      {"_id": mail["_id"]},
+      {
+        "$set": {
+          "status": "pending",
+          "attempts": attempts,
+          "last_error": str(error),
+          "next_attempt_at": _now() + timedelta(seconds=self._backoff(attempts)),
+        },
+        "$unset": {"lease_until": "", "lease_owner": ""},
+      },
+    )
+    self.stats["retried"] += 1
+
+  async def _connect(self) -> aiosmtplib.SMTP:
+    smtp = aiosmtplib.SMTP(hostname=self.hostname, port=self.port, start_tls=self.start_tls,
+                           timeout=self.send_timeout)
+    await smtp.connect()
+    if self.username and self.password:
+      await smtp.login(self.username, self.password)
+    self.stats["connections"] += 1
+    return smtp
+
+  @staticmethod
+  async def _close(smtp: Optional[aiosmtplib.SMTP]):
+    if smtp is None:
+      return
+    try:
+      if smtp.is_connected:
+        await smtp.quit()
+    except Exception:
+      smtp.close()
+
+  async def _send_batch(self, smtp: Optional[aiosmtplib.SMTP], batch: List[Dict],
+                        owner: str) -> Optional[aiosmtplib.SMTP]:
+    """한 연결로 배치 발송 - 연결이 끊기면 다음 메일에서 다시 연결"""
+    for mail in batch:
+      if not await self._renew(mail, owner):
+        continue
+      try:
+        if smtp is None or not smtp.is_connected:
+          smtp = await self._connect()
+        await smtp.send_message(self._build_message(mail))
+      except aiosmtplib.SMTPRecipientsRefused as e:
+        await self._fail(mail, e, permanent=all(500 <= r.code < 600 for r in e.recipients))
+        continue
+      except aiosmtplib.SMTPResponseException as e:
+        # 5xx는 영구 오류, 4xx는 재시도
+        await self._fail(mail, e, permanent=500 <= e.code < 600)
+        continue
+      except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError) as e:
+        await self._close(smtp)
+        smtp = None
+        await self._fail(mail, e, permanent=False)
+        continue
+      await self.collection.delete_one({"_id": mail["_id"]})
+      self.stats["sent"] += 1
+    return smtp
+
+  async def _worker(self):
+    smtp = None
+    last_used = time.monotonic()
+    owner = f"{uuid.uuid4().hex[:12]}"  # 이 워커가 잡은 lease 표시
+    errors = 0
+    try:
+      while True:
+        try:
+          # 조회 전에 비워 두어야 조회와 대기 사이에 들어온 enqueue 신호를 놓치지 않는다
+          self._wakeup.clear()
+          batch = await self._claim_batch(owner)
+          if batch:
+            smtp = await self._send_batch(smtp, batch, owner)
+            last_used = time.monotonic()
+            errors = 0
+            continue
+
+          if smtp is not None and time.monotonic() - last_used >= self.idle_timeout:
+            await self._close(smtp)
+            smtp = None
+          errors = 0
+          try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+          except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+          # Mongo 장애 등 - 워커를 죽이지 않고 연결을 버린 뒤 백오프
+          errors += 1
+          self.stats["worker_errors"] += 1
+          print(f"[mail_queue] 워커 오류, 재시도 대기: {e}")
+          await self._close(smtp)
+          smtp = None
+          await asyncio.sleep(min(self.max_delay, self.poll_interval * (2 ** (errors - 1))) * random.uniform(0.8, 1.2))
+    finally:
+      await self._close(smtp)
+
+  def start(self):
+    if self._tasks:
+      return
+    self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+  async def stop(self):
+    for task in self._tasks:
+      task.cancel()
+    await asyncio.gather(*self._tasks, return_exceptions=True)
+    self._tasks = []
+
+  async def drain(self, timeout: float = 30.0) -> bool:
+    """큐가 빌 때까지 대기 (테스트/종료용)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+      if await self.collection.count_documents({}) == 0:
+        return True
+      self._wakeup.set()
+      await asyncio.sleep(0.05)
+    return False
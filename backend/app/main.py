@@ -1,5 +1,6 @@
 import os
 import sys
+import asyncio
 import uuid
 import mimetypes
 import aiofiles
@@ -9,21 +10,18 @@ import io
 import secrets
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
 
 import socketio
 import pyotp
 import qrcode
-import aiosmtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Request, Header, Body
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from jose import JWTError, jwt
 from motor.motor_asyncio import AsyncIOMotorClient
-from passlib.context import CryptContext
+from pymongo import UpdateOne
 from pydantic import BaseModel, Field, EmailStr
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
@@ -34,6 +32,35 @@ from apscheduler.triggers.date import DateTrigger
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from .user_directory import UserDirectory, build_search_keys, prefix_query, SEARCH_KEY_COLLATION
+from .vector_index import VectorIndex
+from .read_receipts import ReadReceiptBuffer, ReadPositionIndex
+from .unread_deltas import UnreadDeltaBuffer
+from .keyword_matcher import KeywordMatcher
+from .notification_settings import NotificationSettingsCache, allows as notification_allowed
+from .mail_queue import MailQueue
+from .server_store import ServerStore
+from .channel_membership import ChannelMembership, ChannelPresence
+from .presence import OFFLINE, PresenceRegistry
+from .shared_state import SharedHashes, SharedMap, connect_redis
+from .backpressure import OutboundLimiter
+from .event_limits import EventRateLimiter, parse_limits
+from .wire_format import WireManager, WireRedisManager, WireServer, wire_schema
+from .state_cache import RenderedServer, StateCache, etag_matches, state_etag
+from .permission_resolver import PermissionResolver
+from .principal_cache import PrincipalCache
+from .cache_bus import CacheBus
+from .password_hasher import HasherBusy, LoginAdmission, PasswordHasher
+from .permission_bits import ADMIN_ROLES, ROLES, VIEW, channel_bits, compile_mask, evaluate_channels, select
+from .notification_retention import (
+  KEYSET_SORT,
+  compact_read_notifications,
+  ensure_retention_indexes,
+  keyset_filter,
+  next_cursor,
+  rollup_cutoff,
+)
+
 # Load .env from project root
 env_path = Path(__file__).resolve().parent.parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
@@ -108,9 +135,17 @@ def extract_mentions(content: str) -> List[str]:
   return re.findall(r'@(\w+)', plain_text)
 
 
-async def create_notification(user_id: str, notif_type: str, message_id: str, channel_id: str, content: str, trigger: str):
-  """알림 생성 및 저장"""
-  notification = {
+# 그룹 멘션 - 채널 멤버 전체(@channel, @everyone) 또는 접속 중인 멤버(@here)
+GROUP_MENTIONS = {"channel", "everyone", "here"}
+# 역할 멘션 - @admins 등은 해당 역할의 채널 멤버로 확장
+ROLE_MENTIONS = {"owners": "owner", "admins": "admin", "moderators": "moderator"}
+
+# username -> user_id 캐시 (username은 가입 후 바뀌지 않으므로 무효화 불필요)
+username_cache: Dict[str, str] = {}
+
+
+def _build_notification(user_id: str, notif_type: str, message_id: str, channel_id: str, content: str, trigger: str) -> Dict:
+  return {
     "_id": f"notif_{uuid.uuid4().hex[:12]}",
     "user_id": user_id,
     "type": notif_type,
@@ -121,73 +156,128 @@ async def create_notification(user_id: str, notif_type: str, message_id: str, ch
     "read": False,
     "created_at": _now()
   }
-  await notifications_col.insert_one(notification)
-  return notification["_id"]
 
 
-async def process_mentions_and_keywords(message_id: str, channel_id: str, content: str, sender_id: str):
-  """멘션 및 키워드 알림 처리"""
+async def resolve_usernames(usernames: List[str]) -> Dict[str, str]:
+  """username 목록 -> {username: user_id} (캐시에 없는 것만 한 번의 $in 쿼리로 조회)"""
+  missing = [u for u in set(usernames) if u not in username_cache]
+  if missing:
+    cursor = users_col.find({"username": {"$in": missing}}, {"username": 1})
+    async for user_doc in cursor:
+      username_cache[user_doc["username"]] = user_doc["_id"]
+  return {u: username_cache[u] for u in usernames if u in username_cache}
+
+
+async def _ensure_keyword_matcher():
+  """키워드 매처 지연 로드 (시작 시 로드에 실패한 경우 대비)"""
+  if keyword_matcher.loaded:
+    return
+  cursor = users_col.find(
+    {"notification_keywords": {"$exists": True, "$ne": []}},
+    {"notification_keywords": 1}
+  )
+  keyword_matcher.load([doc async for doc in cursor])
+
+
+def _notification_payload(notification: Dict) -> Dict:
+  return {
+    "id": notification["_id"],
+    "type": notification["type"],
+    "message_id": notification["message_id"],
+    "channel_id": notification["channel_id"],
+    "content": notification["content"],
+    "trigger": notification["trigger"],
+    "read": notification.get("read", False),
+    "created_at": notification["created_at"].isoformat(),
+  }
+
+
+async def deliver_notifications(notifications: List[Dict], server_id: Optional[str] = None) -> List[Dict]:
+  """알림 팬아웃 - 수신자 알림 설정(캐시)으로 걸러 한 번에 저장하고 사용자 룸으로 실시간 전송
+
+  접속 중이 아닌 사용자는 재접속 시 notification_digest로 받는다.
+  """
+  if not notifications:
+    return []
+  settings = await notification_settings_cache.get_many(n["user_id"] for n in notifications)
+  delivered = [
+    n for n in notifications
+    if notification_allowed(settings[n["user_id"]], n["type"], n["channel_id"], server_id)
+  ]
+  if not delivered:
+    return []
+
+  await notifications_col.insert_many(delivered, ordered=False)
+  for notification in delivered:
+    await sio.emit("notification", _notification_payload(notification), room=notification["user_id"])
+  return delivered
+
+
+async def process_mentions_and_keywords(message_id: str, channel_id: str, content: str, sender_id: str,
+                                        audience: Optional[Dict[str, str]] = None,
+                                        server_id: Optional[str] = None) -> set:
+  """멘션 및 키워드 알림 처리 - 멘션된 사용자 ID 집합 반환
+
+  audience(채널을 볼 수 있는 사용자 ID -> 역할)가 주어지면 그룹/역할 멘션을 이 사용자들로
+  확장하고, 키워드 알림도 이 사용자들에게만 보낸다. 알림은 deliver_notifications로 한 번에
+  저장/전송한다.
+  """
+  mentioned: Dict[str, str] = {}  # user_id -> trigger (사용자당 첫 멘션 하나)
+
+  def add_mention(user_id: str, trigger: str):
+    if user_id != sender_id and user_id not in mentioned:  # 자기 자신은 제외
+      mentioned[user_id] = trigger
+
   # 멘션 처리
-  mentions = extract_mentions(content)
-  for username in mentions:
-    # 멘션된 사용자 찾기
-    user_doc = await users_col.find_one({"username": username})
-    if user_doc and user_doc["_id"] != sender_id:  # 자기 자신은 제외
-      await create_notification(
-        user_id=user_doc["_id"],
-        notif_type="mention",
-        message_id=message_id,
-        channel_id=channel_id,
-        content=content,
-        trigger=f"@{username}"
-      )
+  mentions = list(dict.fromkeys(extract_mentions(content)))
+  usernames = []
+  for name in mentions:
+    lowered = name.lower()
+    if audience is not None and lowered in GROUP_MENTIONS:
+      targets = audience.keys()
+      if lowered == "here":
+        online_ids = await presence.connected(targets)
+        targets = [uid for uid in targets if uid in online_ids]
+      for user_id in targets:
+        add_mention(user_id, f"@{name}")
+    elif audience is not None and lowered in ROLE_MENTIONS:
+      role = ROLE_MENTIONS[lowered]
+      for user_id, member_role in audience.items():
+        if member_role == role:
+          add_mention(user_id, f"@{name}")
+    else:
+      usernames.append(name)
 
-  # 키워드 알림 처리
-  users_cursor = users_col.find({"notification_keywords": {"$exists": True, "$ne": []}})
-  async for user_doc in users_cursor:
-    if user_doc["_id"] == sender_id:  # 자기 메시지는 제외
-      continue
-    keywords = user_doc.get("notification_keywords", [])
-    for keyword in keywords:
-      if keyword.lower() in content.lower():
-        await create_notification(
-          user_id=user_doc["_id"],
-          notif_type="keyword",
-          message_id=message_id,
-          channel_id=channel_id,
-          content=content,
-          trigger=keyword
-        )
-        break  # 사용자당 하나의 키워드 알림만
+  for username, user_id in (await resolve_usernames(usernames)).items():
+    add_mention(user_id, f"@{username}")
+
+  notifications = [
+    _build_notification(user_id, "mention", message_id, channel_id, content, trigger)
+    for user_id, trigger in mentioned.items()
+  ]
+
+  # 키워드 알림 처리 (전체 키워드를 한 번에 매칭, 자기 메시지는 제외)
+  await _ensure_keyword_matcher()
+  keyword_hits = keyword_matcher.match(content, audience=audience, exclude=sender_id)
+  for user_id, keyword in keyword_hits.items():
+    notifications.append(_build_notification(user_id, "keyword", message_id, channel_id, content, keyword))
+
+  await deliver_notifications(notifications, server_id)
+
+  return set(mentioned)
 
 
 async def send_email(to_email: str, subject: str, body: str):
-  """이메일 발송 유틸리티"""
+  """이메일 발송 요청 - 영속 메일 큐에 넣고 바로 반환 (실제 발송/재시도는 mail_queue 워커)"""
   if not SMTP_USER or not SMTP_PASSWORD:
     print("[send_email] SMTP 설정이 없습니다. 이메일을 발송하지 않습니다.")
     return False
 
   try:
-    message = MIMEMultipart("alternative")
-    message["Subject"] = subject
-    message["From"] = SMTP_FROM_EMAIL
-    message["To"] = to_email
-
-    html_part = MIMEText(body, "html")
-    message.attach(html_part)
-
-    await aiosmtplib.send(
-      message,
-      hostname=SMTP_HOST,
-      port=SMTP_PORT,
-      username=SMTP_USER,
-      password=SMTP_PASSWORD,
-      start_tls=True
-    )
-    print(f"[send_email] 이메일 발송 성공: {to_email}")
+    await mail_queue.enqueue(to_email, subject, body)
     return True
   except Exception as e:
-    print(f"[send_email] 이메일 발송 실패: {e}")
+    print(f"[send_email] 메일 큐 등록 실패: {e}")
     return False
 
 
@@ -242,9 +332,8 @@ async def record_login_session(user_id: str, ip_address: str, user_agent: str):
     "timestamp": _now()
   }
 
-  await login_sessions_col.insert_one(session)
-
   # 새로운 기기/위치 감지 (최근 30일 이내 같은 IP로 로그인한 적이 없는 경우)
+  # 이번 세션을 기록하기 전에 조회해야 방금 넣은 기록과 일치하지 않는다
   thirty_days_ago = _now() - timedelta(days=30)
   existing_session = await login_sessions_col.find_one({
     "user_id": user_id,
@@ -252,6 +341,8 @@ async def record_login_session(user_id: str, ip_address: str, user_agent: str):
     "timestamp": {"$gte": thirty_days_ago}
   })
 
+  await login_sessions_col.insert_one(session)
+
   # 새로운 기기로 로그인하는 경우 이메일 알림 발송
   is_new_device = existing_session is None
   if is_new_device:
@@ -293,6 +384,7 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 SMTP_FROM_EMAIL = os.getenv("SMTP_FROM_EMAIL", SMTP_USER)
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
 
 # 암호화 설정
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", "default-encryption-key-change-in-production-32bytes")
@@ -322,13 +414,45 @@ UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
 UPLOAD_DIR.mkdir(exist_ok=True)  # uploads 폴더 생성
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
+# RAG 벡터 인덱스 저장 경로 (채널별 memmap 파일)
+VECTOR_INDEX_DIR = Path(os.getenv("VECTOR_INDEX_DIR", "vector_index"))
+VECTOR_REINDEX_INTERVAL_MINUTES = float(os.getenv("VECTOR_REINDEX_INTERVAL_MINUTES", "5"))  # 수정/삭제 메시지 재색인 주기
+
+# 보존 정책 (일 단위)
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+NOTIFICATION_ROLLUP_AFTER_DAYS = int(os.getenv("NOTIFICATION_ROLLUP_AFTER_DAYS", "7"))  # 읽은 알림 롤업 시점
+NOTIFICATION_ROLLUP_RETENTION_DAYS = int(os.getenv("NOTIFICATION_ROLLUP_RETENTION_DAYS", "365"))
+LOGIN_SESSION_RETENTION_DAYS = int(os.getenv("LOGIN_SESSION_RETENTION_DAYS", "90"))
+PERMISSION_CACHE_TTL = float(os.getenv("PERMISSION_CACHE_TTL", "60"))  # 초
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))  # 초
+NOTIFICATION_SETTINGS_CACHE_TTL = float(os.getenv("NOTIFICATION_SETTINGS_CACHE_TTL", "30"))  # 초
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+LOGIN_RATE_PER_MINUTE = float(os.getenv("LOGIN_RATE_PER_MINUTE", "10"))  # IP별 실패 시도
+LOGIN_BURST = int(os.getenv("LOGIN_BURST", "10"))
+LOGIN_MAX_CONCURRENT_PER_IP = int(os.getenv("LOGIN_MAX_CONCURRENT_PER_IP", "4"))
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))  # 앞단 리버스 프록시 수 (X-Forwarded-For를 믿을 홉 수)
+REDIS_URL = os.getenv("REDIS_URL", "")  # 비어 있으면 단일 워커 (Socket.IO 룸 / presence / 소켓 상태를 메모리에만 둔다)
+PRESENCE_BROADCAST_WINDOW = float(os.getenv("PRESENCE_BROADCAST_WINDOW", "0.5"))  # 초
+PRESENCE_STALE_SECONDS = float(os.getenv("PRESENCE_STALE_SECONDS", "90"))  # 이보다 오래 갱신되지 않은 연결은 죽은 워커의 것으로 본다
+SOCKET_QUEUE_SOFT_LIMIT = int(os.getenv("SOCKET_QUEUE_SOFT_LIMIT", str(256 * 1024)))  # 바이트, 넘으면 타이핑/화이트보드 등을 버리거나 합침
+SOCKET_QUEUE_HARD_LIMIT = int(os.getenv("SOCKET_QUEUE_HARD_LIMIT", str(1024 * 1024)))  # 바이트
+SOCKET_SLOW_CONSUMER_GRACE = float(os.getenv("SOCKET_SLOW_CONSUMER_GRACE", "10"))  # 초, hard 한도를 이만큼 넘기면 연결 종료
+SOCKET_EVENT_LIMITS = os.getenv("SOCKET_EVENT_LIMITS", "")  # JSON, 이벤트별 {"sid": [초당, burst], "user": [초당, burst]}
+SOCKET_EVENT_LIMITS_SHARED = os.getenv("SOCKET_EVENT_LIMITS_SHARED", "1") == "1"  # REDIS_URL이 있으면 사용자 버킷을 워커 간 공유
+OPS_USERNAMES = {name.strip() for name in os.getenv("OPS_USERNAMES", "").split(",") if name.strip()}  # 운영 지표(*-stats) 조회 허용 사용자
+
 # DB 클라이언트
 mongo_client = AsyncIOMotorClient(MONGO_URI)
 mongo_db = mongo_client[MONGO_DB]
 servers_col = mongo_db["servers"]
+server_categories_col = mongo_db["server_categories"]  # 서버 카테고리 (server_id, position)
+server_channels_col = mongo_db["server_channels"]  # 서버 채널
+channel_members_col = mongo_db["channel_members"]  # (채널, 사용자) 멤버십
 messages_col = mongo_db["messages"]
 users_col = mongo_db["users"]
 notifications_col = mongo_db["notifications"]
+notification_rollups_col = mongo_db["notification_rollups"]  # 읽은 알림 일자별 집계
 audit_logs_col = mongo_db["audit_logs"]
 dm_channels_col = mongo_db["dm_channels"]  # DM and group DM channels
 user_channel_reads_col = mongo_db["user_channel_reads"]  # Track last read timestamps
@@ -337,23 +461,170 @@ password_reset_tokens_col = mongo_db["password_reset_tokens"]  # 비밀번호 
 login_sessions_col = mongo_db["login_sessions"]  # 로그인 세션 기록
 bookmarks_col = mongo_db["bookmarks"]  # 사용자별 북마크(저장한 메시지)
 reminders_col = mongo_db["reminders"]  # 리마인더
+mail_queue_col = mongo_db["mail_queue"]  # 발신 대기 메일
+mail_dead_letters_col = mongo_db["mail_dead_letters"]  # 재시도를 포기한 메일
+
+# 발신 메일 큐 (워커별 SMTP 연결 재사용, 지수 백오프 재시도, dead letter)
+mail_queue = MailQueue(
+  mail_queue_col,
+  mail_dead_letters_col,
+  hostname=SMTP_HOST,
+  port=SMTP_PORT,
+  from_email=SMTP_FROM_EMAIL,
+  username=SMTP_USER,
+  password=SMTP_PASSWORD,
+  workers=MAIL_WORKERS,
+)
+
+# 워커 간 공유 redis (REDIS_URL이 없으면 None)
+redis_client = connect_redis(REDIS_URL)
+
+# 채널 멤버십 (초대/첫 입장/나가기 때만 저장) + 채널 열람 presence (메모리 전용)
+channel_membership = ChannelMembership(channel_members_col)
+channel_presence = ChannelPresence()
+
+
+async def _emit_presence_updates(server_id: str, updates: List[Dict]):
+  await sio.emit("presence_update", {"serverId": server_id, "users": updates}, room=f"presence_{server_id}")
 
-# 비밀번호 해싱 및 인증 스킴 (bcrypt 72바이트 제한 회피를 위해 bcrypt_sha256 사용)
-pwd_context = CryptContext(schemes=["bcrypt_sha256"], deprecated="auto")
+
+async def _presence_servers(user_id: str) -> List[str]:
+  """다른 워커에만 연결돼 있던 사용자의 presence를 정리할 때 알릴 서버"""
+  return list(await permission_resolver.roles_for(user_id))
+
+
+# 소켓 <-> 사용자 presence (기기별 상태 합산, 서버별 일괄 브로드캐스트, REDIS_URL이 있으면 워커 간 공유)
+presence = PresenceRegistry(
+  _emit_presence_updates,
+  viewers=channel_presence,
+  window=PRESENCE_BROADCAST_WINDOW,
+  redis=redis_client,
+  stale=PRESENCE_STALE_SECONDS,
+  servers_of=_presence_servers,
+)
+
+# 서버 문서는 얇게 두고 카테고리/채널은 별도 컬렉션에서 조립
+server_store = ServerStore(servers_col, server_categories_col, server_channels_col, membership=channel_membership)
+
+# /state 렌더링 캐시 ((server_id, role, version) 키)
+state_cache = StateCache()
+
+# (사용자, 채널) 유효 권한 캐시 - 역할 변경/초대/추방/채널 권한 수정 때 무효화
+permission_resolver = PermissionResolver(servers_col, server_store, ttl=PERMISSION_CACHE_TTL)
+
+# 인증된 사용자 캐시 (토큰의 uid 키) - 프로필/키워드/탈퇴/2FA/비밀번호 변경 때 무효화
+principal_cache = PrincipalCache(ttl=PRINCIPAL_CACHE_TTL)
+
+# @멘션 자동완성용 사용자 디렉터리 (서버별 접두사 트라이)
+user_directory = UserDirectory()
+
+# 키워드 알림용 Aho-Corasick 매처 (전체 사용자 notification_keywords)
+keyword_matcher = KeywordMatcher()
+
+# 알림 설정 캐시 (설정 변경 API에서 무효화)
+notification_settings_cache = NotificationSettingsCache(notification_settings_col, ttl=NOTIFICATION_SETTINGS_CACHE_TTL)
+
+# 워커 간 메모리 캐시 무효화 (REDIS_URL이 있을 때 pub/sub으로 전파)
+cache_bus = CacheBus(redis_client)
+cache_bus.on("permission_members", lambda p: permission_resolver.invalidate_members(p["server_id"], p["user_ids"]))
+cache_bus.on("permission_channels", lambda p: permission_resolver.invalidate_channels(p["channel_ids"]))
+cache_bus.on("principal", lambda p: principal_cache.invalidate(p["user_id"]))
+cache_bus.on("notification_settings", lambda p: notification_settings_cache.invalidate(p["user_id"]))
+cache_bus.on("keywords", lambda p: keyword_matcher.set_keywords(p["user_id"], p["keywords"]))
+cache_bus.on("directory_server", lambda p: user_directory.unload_server(p["server_id"]))
+cache_bus.on("directory_user", lambda p: user_directory.drop_user(p["user_id"]))
+cache_bus.on("channel_members", lambda p: channel_membership.invalidate(p["channel_ids"]))
+for _reset in (permission_resolver.clear, principal_cache.clear, notification_settings_cache.clear,
+               keyword_matcher.unload, user_directory.clear, channel_membership.clear):
+  cache_bus.on_reset(_reset)
+channel_membership.on_change = lambda channel_ids: cache_bus.publish("channel_members", channel_ids=channel_ids)
+
+# @chatbot RAG 문맥 검색용 로컬 벡터 인덱스
+vector_index = VectorIndex(VECTOR_INDEX_DIR)
+
+# 비밀번호 해싱 (bcrypt 72바이트 제한 회피를 위해 bcrypt_sha256) - 이벤트 루프 밖 프로세스 풀에서 실행
+password_hasher = PasswordHasher(workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_MAX_QUEUE)
+login_admission = LoginAdmission(
+  rate_per_minute=LOGIN_RATE_PER_MINUTE,
+  burst=LOGIN_BURST,
+  max_concurrent=LOGIN_MAX_CONCURRENT_PER_IP,
+)
 security = HTTPBearer()
 
 # OpenAI 클라이언트
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None
 
 # Socket.IO 서버 (ASGI)
-sio = socketio.AsyncServer(
+# 연결 URL에 ?wire=msgpack을 붙인 클라이언트는 MessagePack + compact 스키마, 나머지는 JSON 텍스트
+sio = WireServer(
     async_mode="asgi",
+    # 여러 워커/노드의 룸 브로드캐스트를 redis pub/sub로 전달 (로드밸런서는 sticky session 필요)
+    client_manager=WireRedisManager(REDIS_URL) if REDIS_URL else WireManager(),
+    # 송신이 밀린 연결은 덜 중요한 이벤트를 버리거나 합치고, 계속 밀리면 끊는다
+    outbound=OutboundLimiter(
+        soft_limit=SOCKET_QUEUE_SOFT_LIMIT,
+        hard_limit=SOCKET_QUEUE_HARD_LIMIT,
+        grace=SOCKET_SLOW_CONSUMER_GRACE,
+    ),
+    # 받은 이벤트를 이벤트별 sid / 사용자 토큰 버킷으로 거르고, 넘치면 핸들러 대신 error ack
+    inbound=EventRateLimiter(
+        parse_limits(SOCKET_EVENT_LIMITS),
+        redis=redis_client if SOCKET_EVENT_LIMITS_SHARED else None,
+        key_prefix="socket:ratelimit",
+    ),
     cors_allowed_origins="*",  # 모든 origin 허용 (디버깅용)
     allow_upgrades=True,
     logger=True,  # Socket.IO 로깅 활성화
     engineio_logger=True,  # Engine.IO 로깅 활성화
 )
 
+
+
+async def _emit_user_read_update(channel_id: str, user_id: str, last_read_at: datetime):
+  await sio.emit(
+      "user_read_update",
+      {"channelId": channel_id, "userId": user_id, "lastReadAt": last_read_at.isoformat()},
+      room=channel_id
+  )
+
+
+# 채널별 멤버 읽음 위치 정렬 배열 ("N명 읽음" 집계용, 채널 최초 조회 시 지연 로드)
+read_positions = ReadPositionIndex()
+# 다른 워커가 처리한 읽음도 로드된 채널에 반영 (_mark_read에서 발행)
+cache_bus.on("read_position", lambda p: read_positions.update(
+  p["channel_id"], p["user_id"], datetime.fromisoformat(p["at"])
+))
+cache_bus.on_reset(read_positions.clear)
+
+async def _count_unread_after(user_id: str, channel_id: str, since: datetime) -> int:
+  """읽음 시각 이후 채널 메시지 수 (fan_out_unreads가 세는 것과 같은 기준 - 본인/AI 메시지 제외)"""
+  return await messages_col.count_documents({
+    "channel_id": channel_id,
+    "timestamp": {"$gt": since},
+    "sender.id": {"$nin": [user_id, "ai_bot"]},
+  })
+
+
+# 읽음 위치 write-behind 버퍼 (주기적 bulk_write + 룸별 브로드캐스트 제한)
+read_receipts = ReadReceiptBuffer(
+  user_channel_reads_col, _emit_user_read_update, positions=read_positions, recount=_count_unread_after
+)
+
+
+async def _emit_unread_deltas(user_id: str, deltas: List[Dict]):
+  await sio.emit("unread_delta", {"deltas": deltas}, room=user_id)
+
+
+# 사용자 룸(room=user_id)으로 보내는 미읽음 증분 (사용자별로 짧게 모아서 전송)
+unread_deltas = UnreadDeltaBuffer(_emit_unread_deltas)
+
+
+def _mark_read(user_id: str, channel_id: str, timestamp: datetime):
+  """읽음 처리 공통 경로 - write-behind 버퍼 기록 + 사용자의 다른 세션 배지 초기화"""
+  read_receipts.mark(user_id, channel_id, timestamp)
+  cache_bus.publish("read_position", channel_id=channel_id, user_id=user_id, at=timestamp.isoformat())
+  unread_deltas.clear(user_id, channel_id)
+
 # 스케줄러 초기화 (리마인더용)
 scheduler = AsyncIOScheduler()
 
@@ -526,6 +797,203 @@ def parse_remind_command(content: str) -> Optional[dict]:
   }
 
 
+async def _startup_step(name: str, step):
+  """기동 단계 하나 실행 - 실패해도 로그만 남기고 다음 단계를 계속한다"""
+  try:
+    await step()
+  except Exception as e:
+    print(f"[backend] {name} 실패: {e}")
+
+
+async def _ensure_read_indexes():
+  await user_channel_reads_col.create_index(
+    [("user_id", 1), ("channel_id", 1)],
+    name="user_channel_unique",
+    unique=True,
+  )
+  # /unreads 조회용 - 미읽음이 있는 행만 인덱싱
+  await user_channel_reads_col.create_index(
+    [("user_id", 1)],
+    name="user_unread_partial",
+    partialFilterExpression={"unread_count": {"$gt": 0}},
+  )
+
+
+async def _ensure_retention_indexes():
+  # 알림/로그인 세션/재설정 토큰 보존 정책 (TTL) 및 알림 목록 인덱스
+  await ensure_retention_indexes(
+    notifications_col,
+    notification_rollups_col,
+    login_sessions_col,
+    password_reset_tokens_col,
+    notification_days=NOTIFICATION_RETENTION_DAYS,
+    rollup_days=NOTIFICATION_ROLLUP_RETENTION_DAYS,
+    login_session_days=LOGIN_SESSION_RETENTION_DAYS,
+  )
+
+
+async def _migrate_server_documents():
+  # 아직 임베디드 categories를 가진 서버를 카테고리/채널 컬렉션으로 이전
+  migrated = await server_store.migrate_all()
+  if migrated:
+    print(f"[backend] 서버 {migrated}개의 카테고리/채널을 별도 컬렉션으로 이전")
+
+
+async def _backfill_search_keys():
+  # search_keys가 없는 기존 사용자 백필
+  async for user_doc in users_col.find({"search_keys": {"$exists": False}}):
+    await users_col.update_one(
+      {"_id": user_doc["_id"]},
+      {"$set": {"search_keys": build_search_keys(user_doc)}}
+    )
+
+
+@fastapi_app.on_event("startup")
+async def ensure_indexes():
+  """컬렉션 인덱스 생성 및 누락 필드 백필 (단계마다 따로 실패 처리)"""
+  await _startup_step("사용자 검색 인덱스 생성", lambda: users_col.create_index(
+    [("search_keys", 1)],
+    name="search_keys_ko",
+    collation=SEARCH_KEY_COLLATION,
+  ))
+  await _startup_step("읽음 위치 인덱스 생성", _ensure_read_indexes)
+  # 읽음 처리 중 세어진 미읽음 재계산용
+  await _startup_step("메시지 채널/시각 인덱스 생성", lambda: messages_col.create_index(
+    [("channel_id", 1), ("timestamp", 1)]
+  ))
+  # 수정된 메시지 RAG 재색인용
+  await _startup_step("메시지 edited_at 인덱스 생성", lambda: messages_col.create_index(
+    [("edited_at", 1)], name="edited_at_sparse", sparse=True
+  ))
+  await _startup_step("보존 정책 인덱스 생성", _ensure_retention_indexes)
+  await _startup_step("카테고리/채널 인덱스 생성", server_store.ensure_indexes)
+  await _startup_step("채널 멤버십 인덱스 생성", channel_membership.ensure_indexes)
+  await _startup_step("서버 문서 이전", _migrate_server_documents)
+  await _startup_step("search_keys 백필", _backfill_search_keys)
+
+  # 벡터 인덱스가 없는 채널은 백그라운드에서 백필 (태스크가 GC되지 않도록 참조 유지)
+  # 여러 워커 중 인덱스 디렉터리 잠금을 잡은 하나만 백필/재색인한다
+  global vector_backfill_task
+  if vector_index.acquire_writer():
+    vector_backfill_task = asyncio.create_task(backfill_vector_index())
+
+
+vector_backfill_task: Optional[asyncio.Task] = None
+
+
+def _index_channel_batch(channel_id: str, docs: List[Dict]) -> int:
+  """복호화 + 임베딩 (스레드 풀에서 실행)"""
+  items = [(doc["_id"], strip_html_tags(decrypt_text(doc.get("content", "")))) for doc in docs]
+  return vector_index.add_many(channel_id, items)
+
+
+async def backfill_vector_index():
+  """기존 메시지로 채널별 RAG 벡터 인덱스 생성 (인덱스 파일이 없는 채널만)"""
+  loop = asyncio.get_running_loop()
+  try:
+    channel_ids = await messages_col.distinct("channel_id")
+    for channel_id in channel_ids:
+      if await loop.run_in_executor(None, vector_index.has_channel, channel_id):
+        continue
+      cursor = messages_col.find(
+        {"channel_id": channel_id, "is_deleted": {"$ne": True}, "sender.id": {"$ne": "ai_bot"}},
+        {"content": 1}
+      ).sort("timestamp", 1)
+      docs = [msg_doc async for msg_doc in cursor]
+      # 복호화/임베딩은 CPU 작업이라 이벤트 루프 밖에서
+      count = await loop.run_in_executor(None, _index_channel_batch, channel_id, docs)
+      print(f"[rag] 벡터 인덱스 백필: {channel_id} ({count}개)")
+  except Exception as e:
+    print(f"[rag] 벡터 인덱스 백필 실패: {e}")
+
+
+async def reindex_edited_messages():
+  """주기 실행 - 다른 서비스(messaging-service 등)에서 수정/삭제된 메시지를 벡터 인덱스에 반영"""
+  global vector_backfill_task
+  if not vector_index.is_writer:
+    # 맡고 있던 워커가 죽었으면 이 워커가 넘겨받고, 그 워커가 못 끝낸 백필도 이어서 한다
+    if not vector_index.acquire_writer():
+      return
+    vector_backfill_task = asyncio.create_task(backfill_vector_index())
+  loop = asyncio.get_running_loop()
+  try:
+    since = vector_index.edited_since()
+    query = {"edited_at": {"$gt": since} if since else {"$ne": None}}
+    cursor = messages_col.find(query, {"channel_id": 1, "content": 1, "is_deleted": 1, "sender.id": 1, "edited_at": 1})
+    latest = since
+    by_channel: Dict[str, List[Dict]] = {}
+    async for msg_doc in cursor.sort("edited_at", 1):
+      latest = msg_doc["edited_at"]
+      if msg_doc.get("is_deleted") or (msg_doc.get("sender") or {}).get("id") == "ai_bot":
+        await loop.run_in_executor(None, vector_index.remove, msg_doc["channel_id"], msg_doc["_id"])
+      else:
+        by_channel.setdefault(msg_doc["channel_id"], []).append(msg_doc)
+    for channel_id, docs in by_channel.items():
+      await loop.run_in_executor(None, _index_channel_batch, channel_id, docs)
+    if latest is not None and latest != since:
+      vector_index.mark_edited_since(latest)
+  except Exception as e:
+    print(f"[rag] 수정 메시지 재색인 실패: {e}")
+
+
+async def compact_notifications_job():
+  """매일 실행 - 읽은 지 오래된 알림을 일자별 롤업으로 압축"""
+  try:
+    cutoff = rollup_cutoff(_now(), NOTIFICATION_ROLLUP_AFTER_DAYS)
+    count = await compact_read_notifications(notifications_col, notification_rollups_col, cutoff)
+    print(f"[retention] 읽은 알림 롤업 완료: {count}개")
+  except Exception as e:
+    print(f"[retention] 읽은 알림 롤업 실패: {e}")
+
+
+@fastapi_app.on_event("startup")
+async def start_background_tasks():
+  read_receipts.start()
+  unread_deltas.start()
+  presence.start()
+  sio.outbound.start()
+  cache_bus.start()
+  password_hasher.start()
+  if SMTP_USER and SMTP_PASSWORD:
+    try:
+      await mail_queue.ensure_indexes()
+    except Exception as e:
+      print(f"[backend] 메일 큐 인덱스 생성 실패: {e}")
+    mail_queue.start()
+  scheduler.add_job(
+    compact_notifications_job,
+    trigger="cron",
+    hour=4,
+    id="compact_notifications",
+    replace_existing=True,
+  )
+  scheduler.add_job(
+    reindex_edited_messages,
+    trigger="interval",
+    minutes=VECTOR_REINDEX_INTERVAL_MINUTES,
+    id="reindex_edited_messages",
+    replace_existing=True,
+  )
+  if not scheduler.running:
+    scheduler.start()
+  try:
+    await _ensure_keyword_matcher()
+  except Exception as e:
+    print(f"[backend] 키워드 매처 로드 실패: {e}")
+
+
+@fastapi_app.on_event("shutdown")
+async def stop_background_tasks():
+  # 버퍼에 남은 읽음 위치 반영
+  await read_receipts.stop()
+  await unread_deltas.stop()
+  await presence.stop()
+  await sio.outbound.stop()
+  await cache_bus.stop()
+  await mail_queue.stop()
+  password_hasher.stop()
+
+
 # 초기 데이터 부트스트랩 (MongoDB에 서버/메시지가 없을 때)
 @fastapi_app.on_event("startup")
 async def bootstrap_default_data():
@@ -579,11 +1047,12 @@ async def bootstrap_default_data():
       },
   ]
 
-  await servers_col.insert_one(default_server)
+  await server_store.create_server(default_server)
   await messages_col.insert_many(default_messages)
 
   # 스케줄러 시작 및 기존 리마인더 로드
-  scheduler.start()
+  if not scheduler.running:
+    scheduler.start()
   await load_existing_reminders()
   print("[backend] 스케줄러 시작 완료")
 
@@ -653,6 +1122,7 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
   username: Optional[str] = None
+  user_id: Optional[str] = None  # uid 클레임 (이전에 발급된 토큰에는 없음)
 
 
 class AuthResponse(BaseModel):
@@ -808,7 +1278,30 @@ class InviteRequest(BaseModel):
   username: Optional[str] = None
   email: Optional[str] = None
   channel_ids: Optional[List[str]] = None
-  role: str = "member"  # 초대 시 부여할 역할
+  role: str = Field(default="member", pattern="^(admin|moderator|member)$")  # 초대 시 부여할 역할
+
+
+class BulkInviteRequest(BaseModel):
+  user_ids: List[str] = Field(default_factory=list, max_length=1000)
+  usernames: List[str] = Field(default_factory=list, max_length=1000)
+  emails: List[str] = Field(default_factory=list, max_length=1000)
+  channel_ids: Optional[List[str]] = None
+  role: str = Field(default="member", pattern="^(admin|moderator|member)$")
+
+
+class BulkInviteResponse(BaseModel):
+  invited: List[str] = Field(default_factory=list)  # 새로 추가된 사용자 ID
+  already_members: List[str] = Field(default_factory=list)
+  not_found: List[str] = Field(default_factory=list)  # 찾지 못한 ID/username/email
+
+
+class BulkKickRequest(BaseModel):
+  user_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+
+class BulkKickResponse(BaseModel):
+  kicked: List[str] = Field(default_factory=list)
+  skipped: List[str] = Field(default_factory=list)  # owner, 본인, 멤버가 아닌 사용자
 
 
 class RoleUpdateRequest(BaseModel):
@@ -910,6 +1403,7 @@ class Notification(BaseModel):
 
 class NotificationList(BaseModel):
   notifications: List[Notification]
+  next_cursor: Optional[str] = None  # 다음 페이지 커서 (없으면 마지막 페이지)
 
 
 class SearchQuery(BaseModel):
@@ -995,9 +1489,19 @@ class UnreadCountsResponse(BaseModel):
   unreads: List[UnreadCount]
 
 
+class ReadCountsRequest(BaseModel):
+  message_ids: List[str]
+
+
+class ReadCountsResponse(BaseModel):
+  channel_id: str
+  counts: Dict[str, int]  # message_id -> 읽은 멤버 수 (작성자 제외)
+
+
 class MentionsResponse(BaseModel):
   mentions: List[Notification]
   total: int
+  next_cursor: Optional[str] = None
 
 
 class KeywordUpdate(BaseModel):
@@ -1012,12 +1516,26 @@ class StateResponse(BaseModel):
 # 유틸 함수
 # -----------------------------
 # 비밀번호 해싱 및 검증
-def hash_password(password: str) -> str:
-  return pwd_context.hash(password)
+def _hasher_busy() -> HTTPException:
+  return HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many password operations in progress, retry shortly",
+    headers={"Retry-After": "1"},
+  )
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-  return pwd_context.verify(plain_password, hashed_password)
+async def hash_password(password: str) -> str:
+  try:
+    return await password_hasher.hash(password)
+  except HasherBusy:
+    raise _hasher_busy()
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+  try:
+    return await password_hasher.verify(plain_password, hashed_password)
+  except HasherBusy:
+    raise _hasher_busy()
 
 
 def ensure_password_length(password: str):
@@ -1044,14 +1562,30 @@ def decode_access_token(token: str) -> Optional[TokenData]:
     username: str = payload.get("sub")
     if username is None:
       return None
-    return TokenData(username=username)
+    return TokenData(username=username, user_id=payload.get("uid"))
   except JWTError:
     return None
 
 
+PRINCIPAL_PROJECTION = {
+  "username": 1, "name": 1, "email": 1, "avatar": 1, "created_at": 1, "notification_keywords": 1, "deleted_at": 1,
+}
+
+
 # 현재 사용자 가져오기
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
-  token = credentials.credentials
+  return await _user_from_token(credentials.credentials)
+
+
+async def get_ops_user(current_user: User = Depends(get_current_user)) -> User:
+  """운영 지표 엔드포인트 - OPS_USERNAMES에 있는 사용자만 (비어 있으면 아무도 볼 수 없다)"""
+  if current_user.username not in OPS_USERNAMES:
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="운영 지표에 접근할 권한이 없습니다.")
+  return current_user
+
+
+async def _user_from_token(token: str) -> User:
+  """JWT -> User (캐시 우선). 토큰이 잘못됐거나 사용자가 없으면 401"""
   token_data = decode_access_token(token)
   if token_data is None or token_data.username is None:
     raise HTTPException(
@@ -1060,7 +1594,12 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
       headers={"WWW-Authenticate": "Bearer"},
     )
 
-  user_doc = await users_col.find_one({"username": token_data.username})
+  if token_data.user_id:
+    cached = principal_cache.get(token_data.user_id)
+    if cached is not None and cached.username == token_data.username:
+      return cached
+
+  user_doc = await users_col.find_one({"username": token_data.username}, PRINCIPAL_PROJECTION)
   if user_doc is None:
     raise HTTPException(
       status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1068,7 +1607,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
       headers={"WWW-Authenticate": "Bearer"},
     )
 
-  return User(
+  user = User(
     id=user_doc["_id"],
     username=user_doc["username"],
     name=user_doc["name"],
@@ -1078,6 +1617,11 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     notification_keywords=user_doc.get("notification_keywords", []),
     deleted_at=user_doc.get("deleted_at"),
   )
+  # uid 없는 옛 토큰은 캐시하지 않는다 (키로 쓸 ID를 토큰에서 검증할 수 없음)
+  if token_data.user_id == user.id:
+    principal_cache.put(user.id, user)
+  return user
+
 
 def _server_doc_to_model(doc: Dict, filter_user_id: Optional[str] = None) -> Server:
   categories = doc.get("categories", [])
@@ -1089,18 +1633,13 @@ def _server_doc_to_model(doc: Dict, filter_user_id: Optional[str] = None) -> Ser
     user_member = next((m for m in members if m.get("id") == filter_user_id), None)
     user_role = user_member.get("role", "member") if user_member else "member"
 
-    # Filter channels in each category
-    filtered_categories = []
-    for cat_data in categories:
-      cat = Category(**cat_data)
-      # Filter channels user can access
-      accessible_channels = [
-        ch for ch in cat.channels
-        if _can_access_channel(ch, filter_user_id, user_role)
-      ]
-      cat.channels = accessible_channels
-      filtered_categories.append(cat)
-    categories = [c.model_dump() for c in filtered_categories]
+    # 서버 채널 전체를 권한 비트로 한 번에 평가
+    channels = [{**ch, "server_id": doc["_id"]} for cat in categories for ch in cat.get("channels", [])]
+    visible = set(select(channels, evaluate_channels(channels, filter_user_id, {doc["_id"]: user_role})))
+    categories = [
+      {**cat, "channels": [ch for ch in cat.get("channels", []) if ch["id"] in visible]}
+      for cat in categories
+    ]
 
   return Server(
       id=doc["_id"],
@@ -1115,34 +1654,26 @@ def _server_doc_to_model(doc: Dict, filter_user_id: Optional[str] = None) -> Ser
 # 권한 체크 함수
 async def _check_permission(server_id: str, user_id: str, required_roles: List[str]) -> bool:
   """서버에서 사용자의 역할이 required_roles에 포함되는지 확인"""
-  server_doc = await servers_col.find_one({"_id": server_id})
-  if not server_doc:
-    return False
-
-  members = server_doc.get("members", [])
-  user_member = next((m for m in members if m.get("id") == user_id), None)
-
-  if not user_member:
-    return False
-
-  user_role = user_member.get("role", "member")
-  return user_role in required_roles
+  return await permission_resolver.has_role(server_id, user_id, required_roles)
 
 
 async def _get_user_role(server_id: str, user_id: str) -> Optional[str]:
   """서버에서 사용자의 역할 가져오기"""
-  server_doc = await servers_col.find_one({"_id": server_id})
-  if not server_doc:
-    return None
+  return await permission_resolver.role(server_id, user_id)
 
-  members = server_doc.get("members", [])
-  user_member = next((m for m in members if m.get("id") == user_id), None)
 
-  return user_member.get("role") if user_member else None
+async def _check_invite_role(server_id: str, user_id: str, role: str):
+  """초대 권한 확인 - 멤버는 member로만 초대하고, member보다 높은 역할은 owner/admin만
+  자기 역할 이하로 부여할 수 있다 (ROLES는 높은 역할부터)"""
+  caller_role = await permission_resolver.role(server_id, user_id)
+  if caller_role is None:
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed or server not found")
+  if role != "member" and (caller_role not in ADMIN_ROLES or ROLES.index(role) < ROLES.index(caller_role)):
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to grant this role")
 
 
 async def _ensure_channel(channel_id: str):
-  server_doc = await servers_col.find_one({"categories.channels.id": channel_id})
+  server_doc = await server_store.find_by_channel(channel_id)
   if not server_doc:
     return None, None, None
 
@@ -1169,36 +1700,35 @@ def _message_to_response(msg: Message) -> Dict:
   return data
 
 
-def _can_access_channel(channel: Channel, user_id: str, user_role: str) -> bool:
-  """Check if a user can access a channel based on permissions"""
-  # Public channels are accessible to everyone
-  if not channel.is_private:
-    return True
+def _channel_audience(server: Optional[Server], channel: Optional[Channel], dm_channel: Optional[Dict] = None) -> Dict[str, str]:
+  """메시지를 받을 사용자 ID -> 역할 (DM 참가자 또는 채널 접근 권한이 있는 서버 멤버)"""
+  if dm_channel is not None:
+    return {user_id: "member" for user_id in dm_channel.get("participants", [])}
+  if server is None or channel is None:
+    return {}
+  mask = compile_mask(channel.is_private, channel.allowed_roles, channel.post_permission)
+  allowed_members = set(channel.allowed_members)
+  return {m.id: m.role for m in server.members if channel_bits(mask, m.role, m.id in allowed_members) & VIEW}
 
-  # Check if user is in allowed_members list
-  if user_id in channel.allowed_members:
-    return True
-
-  # Check if user's role is in allowed_roles list
-  if user_role in channel.allowed_roles:
-    return True
-
-  # Owner and admin can access all channels
-  if user_role in ["owner", "admin"]:
-    return True
 
-  return False
+async def fan_out_unreads(channel_id: str, recipient_ids: Iterable[str], sender_id: Optional[str], mentioned_ids: set,
+                          timestamp: datetime):
+  """메시지 팬아웃 시 (사용자, 채널)별 미읽음 카운터/멘션 플래그를 증분 갱신
 
-
-def _can_post_in_channel(channel: Channel, user_role: str) -> bool:
-  """Check if a user can post messages in a channel"""
-  if channel.post_permission == "everyone":
-    return True
-  elif channel.post_permission == "admin_only":
-    return user_role in ["owner", "admin"]
-  elif channel.post_permission == "owner_only":
-    return user_role == "owner"
-  return True  # Default to allowing
+  last_message_at / last_mention_at은 읽음 버퍼가 읽음 시각 이후에 센 메시지를 지우지 않도록 남긴다.
+  """
+  operations = []
+  for user_id in recipient_ids:
+    if user_id == sender_id:
+      continue
+    update = {"$inc": {"unread_count": 1}, "$max": {"last_message_at": timestamp}}
+    if user_id in mentioned_ids:
+      update["$set"] = {"has_mention": True}
+      update["$max"]["last_mention_at"] = timestamp
+    operations.append(UpdateOne({"user_id": user_id, "channel_id": channel_id}, update, upsert=True))
+    unread_deltas.add(user_id, channel_id, 1, user_id in mentioned_ids)
+  if operations:
+    await user_channel_reads_col.bulk_write(operations, ordered=False)
 
 
 # -----------------------------
@@ -1223,7 +1753,7 @@ async def signup(user_data: UserSignup):
   ensure_password_length(user_data.password)
 
   user_id = f"user_{uuid.uuid4().hex[:12]}"
-  hashed_password = hash_password(user_data.password)
+  hashed_password = await hash_password(user_data.password)
   avatar = user_data.name[:1].upper()
 
   user_doc = {
@@ -1235,10 +1765,13 @@ async def signup(user_data: UserSignup):
       "hashed_password": hashed_password,
       "created_at": _now(),
   }
+  user_doc["search_keys"] = build_search_keys(user_doc)
 
   await users_col.insert_one(user_doc)
+  user_directory.upsert_user(user_doc)
+  username_cache[user_data.username] = user_id
 
-  access_token = create_access_token(data={"sub": user_data.username})
+  access_token = create_access_token(data={"sub": user_data.username, "uid": user_id})
   user = User(
       id=user_id,
       username=user_data.username,
@@ -1251,12 +1784,40 @@ async def signup(user_data: UserSignup):
   return AuthResponse(access_token=access_token, token_type="bearer", user=user)
 
 
+def _client_ip(request: Request) -> str:
+  """클라이언트 IP - 프록시 뒤(TRUSTED_PROXY_HOPS > 0)면 X-Forwarded-For에서 신뢰하는 프록시가 붙인 주소를 쓴다"""
+  peer = request.client.host if request.client else "unknown"
+  if TRUSTED_PROXY_HOPS <= 0:
+    return peer
+  forwarded = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+  # 각 프록시는 자기가 받은 연결의 주소를 뒤에 붙이므로, 끝에서 TRUSTED_PROXY_HOPS번째가 클라이언트다
+  if len(forwarded) >= TRUSTED_PROXY_HOPS:
+    return forwarded[-TRUSTED_PROXY_HOPS]
+  return peer
+
+
 @fastapi_app.post("/auth/login", response_model=AuthResponse)
 async def login(credentials: TwoFactorLogin, request: Request):
-  user_doc = await users_col.find_one({"username": credentials.username})
-  ensure_password_length(credentials.password)
+  # IP별 실패 횟수/동시 검증 수 제한 (크리덴셜 스터핑이 해싱 풀을 독점하지 않도록)
+  ip_address = _client_ip(request)
+  retry_after = login_admission.admit(ip_address)
+  if retry_after is not None:
+    raise HTTPException(
+      status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+      detail="Too many login attempts",
+      headers={"Retry-After": str(int(retry_after) + 1)},
+    )
+  try:
+    user_doc = await users_col.find_one({"username": credentials.username})
+    ensure_password_length(credentials.password)
+    authenticated = False
+    if user_doc:
+      authenticated = await verify_password(credentials.password, user_doc.get("hashed_password", ""))
+  finally:
+    login_admission.release(ip_address)
 
-  if not user_doc or not verify_password(credentials.password, user_doc.get("hashed_password", "")):
+  if not authenticated:
+    login_admission.fail(ip_address)
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
 
   # 2FA 활성화 확인
@@ -1277,14 +1838,14 @@ async def login(credentials: TwoFactorLogin, request: Request):
     # TOTP 검증
     totp = pyotp.TOTP(totp_secret)
     if not totp.verify(credentials.totp_code):
+      login_admission.fail(ip_address)
       raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid 2FA code")
 
   # 로그인 세션 기록
-  ip_address = request.client.host if request.client else "unknown"
   user_agent = request.headers.get("user-agent", "unknown")
   await record_login_session(user_doc["_id"], ip_address, user_agent)
 
-  access_token = create_access_token(data={"sub": credentials.username})
+  access_token = create_access_token(data={"sub": credentials.username, "uid": user_doc["_id"]})
   user = User(
       id=user_doc["_id"],
       username=user_doc["username"],
@@ -1332,15 +1893,31 @@ async def update_profile(profile_data: UserProfileUpdate, current_user: User = D
     update_fields["status_message"] = profile_data.status_message
   if profile_data.notification_keywords is not None:
     update_fields["notification_keywords"] = profile_data.notification_keywords
+    cache_bus.invalidate("keywords", user_id=current_user.id, keywords=profile_data.notification_keywords)
 
   if update_fields:
     await users_col.update_one(
       {"_id": current_user.id},
       {"$set": update_fields}
     )
+    cache_bus.invalidate("principal", user_id=current_user.id)
 
   # 업데이트된 사용자 정보 반환
   updated_user_doc = await users_col.find_one({"_id": current_user.id})
+
+  # 이름/닉네임/이메일이 바뀌면 검색 키와 자동완성 트라이 갱신
+  search_keys = build_search_keys(updated_user_doc)
+  if search_keys != updated_user_doc.get("search_keys"):
+    await users_col.update_one(
+      {"_id": current_user.id},
+      {"$set": {"search_keys": search_keys}}
+    )
+  user_directory.upsert_user(updated_user_doc)
+  cache_bus.publish("directory_user", user_id=current_user.id)
+  await _refresh_socket_principals(
+    current_user.id, updated_user_doc["name"], updated_user_doc.get("avatar") or updated_user_doc["name"][:1]
+  )
+
   return User(
     id=updated_user_doc["_id"],
     username=updated_user_doc["username"],
@@ -1437,13 +2014,14 @@ async def reset_password(reset_data: PasswordResetConfirm):
   ensure_password_length(reset_data.new_password)
 
   # 새 비밀번호 해싱
-  hashed_password = hash_password(reset_data.new_password)
+  hashed_password = await hash_password(reset_data.new_password)
 
   # 비밀번호 업데이트
   await users_col.update_one(
     {"_id": token_doc["user_id"]},
     {"$set": {"hashed_password": hashed_password}}
   )
+  cache_bus.invalidate("principal", user_id=token_doc["user_id"])
 
   # 토큰 사용 완료 표시
   await mark_token_as_used(reset_data.token)
@@ -1483,6 +2061,7 @@ async def setup_2fa(current_user: User = Depends(get_current_user)):
     {"_id": current_user.id},
     {"$set": {"totp_secret": secret, "totp_enabled": False}}
   )
+  cache_bus.invalidate("principal", user_id=current_user.id)
 
   return {
     "secret": secret,
@@ -1509,6 +2088,7 @@ async def verify_2fa(verify_data: TwoFactorVerify, current_user: User = Depends(
     {"_id": current_user.id},
     {"$set": {"totp_enabled": True}}
   )
+  cache_bus.invalidate("principal", user_id=current_user.id)
 
   return {"status": "ok", "message": "2FA enabled successfully"}
 
@@ -1520,6 +2100,7 @@ async def disable_2fa(current_user: User = Depends(get_current_user)):
     {"_id": current_user.id},
     {"$set": {"totp_enabled": False, "totp_secret": None}}
   )
+  cache_bus.invalidate("principal", user_id=current_user.id)
 
   return {"status": "ok", "message": "2FA disabled successfully"}
 
@@ -1808,6 +2389,8 @@ async def update_keywords(payload: KeywordUpdate, current_user: User = Depends(g
     {"_id": current_user.id},
     {"$set": {"notification_keywords": payload.keywords}}
   )
+  cache_bus.invalidate("keywords", user_id=current_user.id, keywords=payload.keywords)
+  cache_bus.invalidate("principal", user_id=current_user.id)
   return {"keywords": payload.keywords}
 
 
@@ -1818,6 +2401,7 @@ async def delete_account(current_user: User = Depends(get_current_user)):
     {"_id": current_user.id},
     {"$set": {"deleted_at": _now()}}
   )
+  cache_bus.invalidate("principal", user_id=current_user.id)
   return None
 
 
@@ -1825,14 +2409,25 @@ async def delete_account(current_user: User = Depends(get_current_user)):
 # 알림 API
 # -----------------------------
 @fastapi_app.get("/notifications", response_model=NotificationList)
-async def get_notifications(current_user: User = Depends(get_current_user), unread_only: bool = False):
+async def get_notifications(
+    current_user: User = Depends(get_current_user),
+    unread_only: bool = False,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+):
+  """알림 목록 (최신순, next_cursor로 다음 페이지 조회)"""
+  limit = max(1, min(limit, 100))
   query = {"user_id": current_user.id}
   if unread_only:
     query["read"] = False
+  try:
+    query = keyset_filter(query, cursor)
+  except ValueError:
+    raise HTTPException(status_code=400, detail="Invalid cursor")
 
-  cursor = notifications_col.find(query).sort("created_at", -1).limit(50)
+  docs = await notifications_col.find(query).sort(KEYSET_SORT).limit(limit).to_list(length=limit)
   notifications = []
-  async for doc in cursor:
+  for doc in docs:
     notifications.append(
       Notification(
         id=doc["_id"],
@@ -1846,7 +2441,7 @@ async def get_notifications(current_user: User = Depends(get_current_user), unre
         created_at=doc["created_at"]
       )
     )
-  return {"notifications": notifications}
+  return {"notifications": notifications, "next_cursor": next_cursor(docs, limit)}
 
 
 @fastapi_app.patch("/notifications/{notification_id}/read")
@@ -1863,25 +2458,130 @@ async def mark_notification_read(notification_id: str, current_user: User = Depe
 # -----------------------------
 # 서버 및 채널 API
 # -----------------------------
+# 브라우저(렌더러 fetch)가 캐시한 응답을 매번 If-None-Match로 재검증하게 한다
+STATE_CACHE_CONTROL = "private, no-cache"
+
+
+def _render_state_server(doc: Dict, role: str) -> RenderedServer:
+  """역할 기준으로 채널을 거른 서버 (allowed_members로만 열리는 채널은 허용 사용자와 함께 보관)"""
+  channels = [{**ch, "server_id": doc["_id"]} for cat in doc.get("categories", []) for ch in cat.get("channels", [])]
+  role_visible = set(select(channels, evaluate_channels(channels, "", {doc["_id"]: role})))
+  server = _server_doc_to_model(doc)
+  gated = {}
+  for category in server.categories:
+    visible = []
+    for ch in category.channels:
+      if ch.id in role_visible:
+        visible.append(ch)
+      elif ch.allowed_members:
+        visible.append(ch)
+        gated[ch.id] = frozenset(ch.allowed_members)
+    category.channels = visible
+  return RenderedServer(server.model_dump(mode="json"), gated)
+
+
 @fastapi_app.get("/state", response_model=StateResponse)
-async def get_state(current_user: User = Depends(get_current_user)):
-  # 가입한 서버만 조회
-  servers_cursor = servers_col.find({"members.id": current_user.id})
-  servers: List[Server] = []
-  async for doc in servers_cursor:
-    # Filter channels based on user permissions
-    servers.append(_server_doc_to_model(doc, filter_user_id=current_user.id))
-  return {"servers": servers}
+async def get_state(
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
+):
+  state_cache.stats["requests"] += 1
+
+  # 가입한 서버의 버전과 내 역할만 먼저 조회 (서버 문서 전체/채널은 캐시에 없을 때만)
+  cursor = servers_col.find(
+    {"members.id": current_user.id},
+    {"version": 1, "members": {"$elemMatch": {"id": current_user.id}}},
+  )
+  keys = []
+  async for doc in cursor:
+    role = (doc.get("members") or [{}])[0].get("role", "member")
+    keys.append((doc["_id"], role, doc.get("version", 0)))
+
+  etag = state_etag(current_user.id, keys)
+  if etag_matches(if_none_match, etag):
+    state_cache.stats["not_modified"] += 1
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": STATE_CACHE_CONTROL})
+
+  rendered = [state_cache.get(key) for key in keys]
+  missing = {key[0]: i for i, key in enumerate(keys) if rendered[i] is None}
+  if missing:
+    for doc in await server_store.find({"_id": {"$in": list(missing)}}):
+      i = missing[doc["_id"]]
+      # 버전 조회 이후 바뀐 서버는 실제로 렌더링한 버전으로 키를 맞춘다
+      keys[i] = (doc["_id"], keys[i][1], doc.get("version", 0))
+      rendered[i] = _render_state_server(doc, keys[i][1])
+      state_cache.put(keys[i], rendered[i])
+    etag = state_etag(current_user.id, keys)
+
+  servers = [value.for_user(current_user.id) for value in rendered if value is not None]
+  return JSONResponse({"servers": servers}, headers={"ETag": etag, "Cache-Control": STATE_CACHE_CONTROL})
+
+
+@fastapi_app.get("/state/cache-stats")
+async def get_state_cache_stats(current_user: User = Depends(get_ops_user)):
+  """/state 캐시 적중률 (304 비율 포함)"""
+  return state_cache.report()
+
+
+@fastapi_app.get("/auth/cache-stats")
+async def get_principal_cache_stats(current_user: User = Depends(get_ops_user)):
+  """인증 사용자 캐시 적중률"""
+  return principal_cache.report()
+
+
+@fastapi_app.get("/auth/password-stats")
+async def get_password_stats(current_user: User = Depends(get_ops_user)):
+  """비밀번호 해싱 풀 대기열 / 로그인 허용 제어 지표"""
+  return {"hasher": password_hasher.report(), "admission": login_admission.report()}
+
+
+@fastapi_app.get("/presence/stats")
+async def get_presence_stats(current_user: User = Depends(get_ops_user)):
+  """이 워커의 소켓 / 사용자 수와 presence 브로드캐스트 횟수"""
+  return presence.report()
+
+
+@fastapi_app.get("/socket/wire-schema")
+async def get_wire_schema(current_user: User = Depends(get_current_user)):
+  """MessagePack 연결용 compact 스키마 (이벤트별 짧은 키, 생략되는 기본값)"""
+  return wire_schema()
+
+
+@fastapi_app.get("/socket/wire-stats")
+async def get_wire_stats(current_user: User = Depends(get_ops_user)):
+  """이 워커에서 보낸 형식별 패킷 수 / 바이트"""
+  return {**sio.wire_stats, "msgpack_connections": len(sio.wire_formats)}
+
+
+@fastapi_app.get("/socket/backpressure-stats")
+async def get_backpressure_stats(current_user: User = Depends(get_ops_user)):
+  """이 워커의 소켓별 송신 대기 바이트 (많은 순) / 버림 / 합침 / 느린 연결 종료 횟수"""
+  return sio.outbound.report()
+
+
+@fastapi_app.get("/socket/rate-limit-stats")
+async def get_rate_limit_stats(current_user: User = Depends(get_ops_user)):
+  """이 워커의 이벤트별 수신 허용 / sid 제한 / 사용자 제한 횟수와 설정된 한도"""
+  return sio.inbound.report()
+
+
+@fastapi_app.get("/cache/bus-stats")
+async def get_cache_bus_stats(current_user: User = Depends(get_ops_user)):
+  """워커 간 캐시 무효화 발행 / 수신 / 재구독(전체 초기화) 횟수"""
+  return cache_bus.report()
+
+
+@fastapi_app.get("/permissions/cache-stats")
+async def get_permission_cache_stats(current_user: User = Depends(get_ops_user)):
+  """유효 권한 캐시 적중률 / 항목 수"""
+  return permission_resolver.report()
 
 
 @fastapi_app.get("/servers", response_model=List[Server])
 async def list_servers(current_user: User = Depends(get_current_user)):
   """사용자가 속한 서버 목록 조회"""
-  cursor = servers_col.find({"members.id": current_user.id})
-  servers = []
-  async for doc in cursor:
-    servers.append(_server_doc_to_model(doc))
-  return servers
+  server_docs = await server_store.find({"members.id": current_user.id})
+  return [_server_doc_to_model(doc) for doc in server_docs]
 
 
 @fastapi_app.post("/servers", response_model=Server, status_code=201)
@@ -1919,16 +2619,14 @@ async def create_server(payload: ServerCreate, current_user: User = Depends(get_
       "members": [owner_member],
       "created_at": _now(),
   }
-  await servers_col.insert_one(doc)
+  await server_store.create_server(doc)
   return _server_doc_to_model(doc)
 
 
 @fastapi_app.post("/servers/{server_id}/invite", response_model=Server)
 async def invite_to_server(server_id: str, payload: InviteRequest, current_user: User = Depends(get_current_user)):
-  # 서버 존재 및 권한 확인 (현재 사용자가 멤버인지 확인)
-  server_doc = await servers_col.find_one({"_id": server_id, "members.id": current_user.id})
-  if not server_doc:
-    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed or server not found")
+  # 서버 존재 및 권한 확인 (멤버인지, 부여하려는 역할을 줄 수 있는지)
+  await _check_invite_role(server_id, current_user.id, payload.role)
 
   # 초대 대상 사용자 확인 (ID, username, email 중 하나로 조회)
   query = []
@@ -1945,38 +2643,31 @@ async def invite_to_server(server_id: str, payload: InviteRequest, current_user:
   if not target_user:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-  member = await _get_member_summary(target_user["_id"])
-  member["status"] = "offline"
-  member["role"] = payload.role  # 초대 시 지정된 역할 부여
+  member = {
+    **await _get_member_summary(target_user["_id"]),
+    "status": "offline",
+    "role": payload.role,  # 초대 시 지정된 역할 부여
+  }
 
   # 서버 멤버에 추가
   await servers_col.update_one(
       {"_id": server_id},
-      {"$addToSet": {"members": member}},
+      {"$addToSet": {"members": member}, "$inc": {"version": 1}},
   )
+  user_directory.add_member(server_id, target_user)
+  cache_bus.publish("directory_server", server_id=server_id)
+  cache_bus.invalidate("permission_members", server_id=server_id, user_ids=[target_user["_id"]])
 
   # 채널 멤버에도 추가 (지정된 channel_ids 또는 모든 채널)
-  categories = server_doc.get("categories", [])
-  target_channel_ids = payload.channel_ids or [
-      ch.get("id") for cat in categories for ch in cat.get("channels", [])
-  ]
+  server_channel_ids = await server_store.channel_ids(server_id)
+  if payload.channel_ids:
+    server_channel_ids = [ch_id for ch_id in server_channel_ids if ch_id in set(payload.channel_ids)]
 
-  if target_channel_ids:
-    for cat in categories:
-      for ch in cat.get("channels", []):
-        if ch.get("id") in target_channel_ids:
-          members = ch.get("members", [])
-          if not any(m.get("id") == member["id"] for m in members):
-            members.append(member)
-          ch["members"] = members
-
-    await servers_col.update_one(
-        {"_id": server_id},
-        {"$set": {"categories": categories}},
-    )
+  if server_channel_ids:
+    added_channel_ids = await channel_membership.add(server_channel_ids, member, server_id=server_id)
 
-    # 소켓 이벤트로 각 채널에 멤버 추가 알림
-    for ch_id in target_channel_ids:
+    # 소켓 이벤트로 새로 추가된 채널에 멤버 추가 알림
+    for ch_id in added_channel_ids:
       await sio.emit(
           "member_joined",
           {"channelId": ch_id, "member": member},
@@ -1984,10 +2675,84 @@ async def invite_to_server(server_id: str, payload: InviteRequest, current_user:
       )
 
   # 최신 서버 반환
-  updated_server = await servers_col.find_one({"_id": server_id})
+  updated_server = await server_store.find_one({"_id": server_id})
   return _server_doc_to_model(updated_server)
 
 
+@fastapi_app.post("/servers/{server_id}/invite/bulk", response_model=BulkInviteResponse)
+async def bulk_invite_to_server(server_id: str, payload: BulkInviteRequest, current_user: User = Depends(get_current_user)):
+  """여러 사용자를 한 번에 초대 (사용자 조회 1회, 채널 멤버십 bulk_write 1회, 채널별 이벤트 1회)"""
+  await _check_invite_role(server_id, current_user.id, payload.role)
+
+  conditions = []
+  if payload.user_ids:
+    conditions.append({"_id": {"$in": payload.user_ids}})
+  if payload.usernames:
+    conditions.append({"username": {"$in": payload.usernames}})
+  if payload.emails:
+    conditions.append({"email": {"$in": payload.emails}})
+  if not conditions:
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="user_ids, usernames, or emails is required")
+
+  user_docs = await users_col.find(
+    {"$or": conditions},
+    {"username": 1, "name": 1, "nickname": 1, "email": 1, "avatar": 1},
+  ).to_list(None)
+
+  found = set()
+  for user_doc in user_docs:
+    found.update((user_doc["_id"], user_doc.get("username"), user_doc.get("email")))
+  requested = list(dict.fromkeys(payload.user_ids + payload.usernames + payload.emails))
+  response = BulkInviteResponse(not_found=[key for key in requested if key not in found])
+
+  # 이미 멤버인 사용자 (권한 확인이 아니라 중복 추가를 막기 위한 조회)
+  server_doc = await servers_col.find_one({"_id": server_id}, {"members.id": 1})
+  existing_ids = {m["id"] for m in (server_doc or {}).get("members", [])}
+  new_members = []
+  for user_doc in user_docs:
+    if user_doc["_id"] in existing_ids:
+      response.already_members.append(user_doc["_id"])
+      continue
+    new_members.append({
+      "id": user_doc["_id"],
+      "name": user_doc["name"],
+      "avatar": user_doc.get("avatar") or user_doc["name"][:1],
+      "status": "offline",
+      "role": payload.role,
+    })
+  if not new_members:
+    return response
+
+  # 서버 멤버 추가 (이미 멤버인 사용자는 위에서 제외)
+  await servers_col.update_one(
+      {"_id": server_id},
+      {"$push": {"members": {"$each": new_members}}, "$inc": {"version": 1}},
+  )
+  for user_doc in user_docs:
+    if user_doc["_id"] not in existing_ids:
+      user_directory.add_member(server_id, user_doc)
+  cache_bus.publish("directory_server", server_id=server_id)
+  response.invited = [m["id"] for m in new_members]
+  cache_bus.invalidate("permission_members", server_id=server_id, user_ids=response.invited)
+
+  # 채널 멤버십 (지정된 channel_ids 또는 모든 채널)
+  channel_ids = await server_store.channel_ids(server_id)
+  if payload.channel_ids:
+    channel_ids = [ch_id for ch_id in channel_ids if ch_id in set(payload.channel_ids)]
+  added = await channel_membership.add_many(
+    [(ch_id, member) for ch_id in channel_ids for member in new_members], server_id
+  )
+
+  # 채널별로 한 번만 알림
+  joined_by_channel: Dict[str, List[Dict]] = {}
+  for ch_id, member in added:
+    joined_by_channel.setdefault(ch_id, []).append(member)
+  for ch_id, members in joined_by_channel.items():
+    await sio.emit("members_joined", {"channelId": ch_id, "members": members}, room=ch_id)
+
+  return response
+
+
 @fastapi_app.post(
     "/servers/{server_id}/categories",
     response_model=Category,
@@ -2000,11 +2765,7 @@ async def create_category(server_id: str, payload: CategoryCreate):
       collapsed=payload.collapsed,
       channels=[],
   )
-  result = await servers_col.update_one(
-      {"_id": server_id},
-      {"$push": {"categories": category.model_dump()}},
-  )
-  if result.matched_count == 0:
+  if not await server_store.add_category(server_id, category.model_dump()):
     raise HTTPException(status_code=404, detail="Server not found")
   return category
 
@@ -2014,29 +2775,14 @@ async def create_category(server_id: str, payload: CategoryCreate):
     response_model=Category,
 )
 async def update_category(server_id: str, category_id: str, payload: CategoryUpdate):
-  updates = {}
-  if payload.name is not None:
-    updates["categories.$[cat].name"] = payload.name
-  if payload.collapsed is not None:
-    updates["categories.$[cat].collapsed"] = payload.collapsed
-
+  updates = payload.model_dump(exclude_none=True)
   if not updates:
     raise HTTPException(status_code=400, detail="No updates provided")
 
-  result = await servers_col.update_one(
-      {"_id": server_id},
-      {"$set": updates},
-      array_filters=[{"cat.id": category_id}],
-  )
-  if result.matched_count == 0:
-    raise HTTPException(status_code=404, detail="Server not found")
-
-  server_doc = await servers_col.find_one({"_id": server_id})
-  server = _server_doc_to_model(server_doc)
-  category = next((c for c in server.categories if c.id == category_id), None)
+  category = await server_store.update_category(server_id, category_id, updates)
   if not category:
     raise HTTPException(status_code=404, detail="Category not found")
-  return category
+  return Category(**category)
 
 
 @fastapi_app.delete(
@@ -2044,24 +2790,14 @@ async def update_category(server_id: str, category_id: str, payload: CategoryUpd
     status_code=204,
 )
 async def delete_category(server_id: str, category_id: str):
-  server_doc = await servers_col.find_one({"_id": server_id})
-  if not server_doc:
-    raise HTTPException(status_code=404, detail="Server not found")
-
-  server = _server_doc_to_model(server_doc)
-  category = next((c for c in server.categories if c.id == category_id), None)
-  if not category:
+  channel_ids = await server_store.delete_category(server_id, category_id)
+  if channel_ids is None:
     raise HTTPException(status_code=404, detail="Category not found")
+  cache_bus.invalidate("permission_channels", channel_ids=channel_ids)
 
   # 삭제된 카테고리의 메시지 삭제
-  channel_ids = [ch.id for ch in category.channels]
   if channel_ids:
     await messages_col.delete_many({"channel_id": {"$in": channel_ids}})
-
-  await servers_col.update_one(
-      {"_id": server_id},
-      {"$pull": {"categories": {"id": category_id}}},
-  )
   return None
 
 
@@ -2081,15 +2817,9 @@ async def create_channel(server_id: str, category_id: str, payload: ChannelCreat
       allowed_members=payload.allowed_members,
       post_permission=payload.post_permission,
   )
-  result = await servers_col.update_one(
-      {"_id": server_id},
-      {"$push": {"categories.$[cat].channels": channel.model_dump()}},
-      array_filters=[{"cat.id": category_id}],
-  )
-  if result.matched_count == 0:
-    raise HTTPException(status_code=404, detail="Server not found")
-  if result.modified_count == 0:
+  if not await server_store.add_channel(server_id, category_id, channel.model_dump()):
     raise HTTPException(status_code=404, detail="Category not found")
+  channel.server_id = server_id
   return channel
 
 
@@ -2098,39 +2828,15 @@ async def create_channel(server_id: str, category_id: str, payload: ChannelCreat
     response_model=Channel,
 )
 async def update_channel(server_id: str, category_id: str, channel_id: str, payload: ChannelUpdate):
-  updates = {}
-  if payload.name is not None:
-    updates["categories.$[cat].channels.$[ch].name"] = payload.name
-  if payload.is_private is not None:
-    updates["categories.$[cat].channels.$[ch].is_private"] = payload.is_private
-  if payload.allowed_roles is not None:
-    updates["categories.$[cat].channels.$[ch].allowed_roles"] = payload.allowed_roles
-  if payload.allowed_members is not None:
-    updates["categories.$[cat].channels.$[ch].allowed_members"] = payload.allowed_members
-  if payload.post_permission is not None:
-    updates["categories.$[cat].channels.$[ch].post_permission"] = payload.post_permission
+  updates = payload.model_dump(exclude_none=True)
   if not updates:
     raise HTTPException(status_code=400, detail="No updates provided")
-
-  result = await servers_col.update_one(
-      {"_id": server_id},
-      {"$set": updates},
-      array_filters=[{"cat.id": category_id}, {"ch.id": channel_id}],
-  )
-  if result.matched_count == 0:
-    raise HTTPException(status_code=404, detail="Server not found")
-  if result.modified_count == 0:
-    raise HTTPException(status_code=404, detail="Channel not found")
-
-  server_doc = await servers_col.find_one({"_id": server_id})
-  server = _server_doc_to_model(server_doc)
-  category = next((c for c in server.categories if c.id == category_id), None)
-  if not category:
-    raise HTTPException(status_code=404, detail="Category not found")
-  channel = next((c for c in category.channels if c.id == channel_id), None)
+
+  channel = await server_store.update_channel(server_id, category_id, channel_id, updates)
   if not channel:
     raise HTTPException(status_code=404, detail="Channel not found")
-  return channel
+  cache_bus.invalidate("permission_channels", channel_ids=[channel_id])
+  return Channel(**channel)
 
 
 @fastapi_app.delete(
@@ -2138,15 +2844,9 @@ async def update_channel(server_id: str, category_id: str, channel_id: str, payl
     status_code=204,
 )
 async def delete_channel(server_id: str, category_id: str, channel_id: str):
-  result = await servers_col.update_one(
-      {"_id": server_id},
-      {"$pull": {"categories.$[cat].channels": {"id": channel_id}}},
-      array_filters=[{"cat.id": category_id}],
-  )
-  if result.matched_count == 0:
-    raise HTTPException(status_code=404, detail="Server not found")
-  if result.modified_count == 0:
+  if not await server_store.delete_channel(server_id, category_id, channel_id):
     raise HTTPException(status_code=404, detail="Channel not found")
+  cache_bus.invalidate("permission_channels", channel_ids=[channel_id])
 
   await messages_col.delete_many({"channel_id": channel_id})
   return None
@@ -2164,55 +2864,16 @@ async def move_channel(
     payload: ChannelMove
 ):
   """Move a channel from one category to another"""
-  # First, get the server to find the channel
-  server = await servers_col.find_one({"_id": server_id})
-  if not server:
+  if not await servers_col.count_documents({"_id": server_id}, limit=1):
     raise HTTPException(status_code=404, detail="Server not found")
 
-  # Find the channel in the source category
-  channel_to_move = None
-  for cat in server.get("categories", []):
-    if cat["id"] == category_id:
-      for ch in cat.get("channels", []):
-        if ch["id"] == channel_id:
-          channel_to_move = ch
-          break
-      break
-
-  if not channel_to_move:
-    raise HTTPException(status_code=404, detail="Channel not found in source category")
-
-  # Verify target category exists
-  target_exists = False
-  for cat in server.get("categories", []):
-    if cat["id"] == payload.target_category_id:
-      target_exists = True
-      break
-
-  if not target_exists:
-    raise HTTPException(status_code=404, detail="Target category not found")
-
-  # Remove channel from source category
-  remove_result = await servers_col.update_one(
-      {"_id": server_id},
-      {"$pull": {"categories.$[cat].channels": {"id": channel_id}}},
-      array_filters=[{"cat.id": category_id}],
-  )
-
-  if remove_result.modified_count == 0:
-    raise HTTPException(status_code=500, detail="Failed to remove channel from source category")
-
-  # Add channel to target category
-  add_result = await servers_col.update_one(
-      {"_id": server_id},
-      {"$push": {"categories.$[cat].channels": channel_to_move}},
-      array_filters=[{"cat.id": payload.target_category_id}],
-  )
-
-  if add_result.modified_count == 0:
-    raise HTTPException(status_code=500, detail="Failed to add channel to target category")
+  # 채널 문서의 category_id/position만 바꾼다
+  channel = await server_store.move_channel(server_id, category_id, channel_id, payload.target_category_id)
+  if not channel:
+    raise HTTPException(status_code=404, detail="Channel or target category not found")
+  cache_bus.invalidate("permission_channels", channel_ids=[channel_id])
 
-  return channel_to_move
+  return channel
 
 
 # ============ DM Channel Endpoints ============
@@ -2408,6 +3069,7 @@ async def create_message(channel_id: str, payload: MessageCreate):
   except Exception as e:
     print(f"[ERROR] Failed to write debug log: {e}", file=sys.stderr, flush=True)
   print(f"[DEBUG] create_message called: channel_id={channel_id}, content={payload.content}", file=sys.stderr, flush=True)
+  server, channel, dm_channel = None, None, None
   # Check if it's a DM channel
   if channel_id.startswith("dm_"):
     dm_channel = await dm_channels_col.find_one({"_id": channel_id})
@@ -2423,18 +3085,15 @@ async def create_message(channel_id: str, payload: MessageCreate):
     if not channel:
       raise HTTPException(status_code=404, detail="Channel not found")
     if payload.sender and payload.sender.id:
-      # 서버 멤버가 아닌 경우 차단
-      server_doc = await servers_col.find_one({"_id": server.id, "members.id": payload.sender.id})
-      if not server_doc:
+      # 멤버 여부 / 채널 접근 / 작성 권한을 캐시된 유효 권한 하나로 확인
+      permission = await permission_resolver.for_channel(
+        payload.sender.id, channel_id, {**channel.model_dump(), "server_id": server.id}
+      )
+      if not permission or not permission.is_member:
         raise HTTPException(status_code=403, detail="Not a member of this server")
-
-      # Get user's role and check channel access permission
-      user_role = await _get_user_role(server.id, payload.sender.id)
-      if not _can_access_channel(channel, payload.sender.id, user_role or "member"):
+      if not permission.can_view:
         raise HTTPException(status_code=403, detail="You don't have permission to access this channel")
-
-      # Check post permission
-      if not _can_post_in_channel(channel, user_role or "member"):
+      if not permission.can_post:
         raise HTTPException(status_code=403, detail="You don't have permission to post in this channel")
 
   # 슬래시 명령어 파싱 (/remind)
@@ -2521,10 +3180,18 @@ async def create_message(channel_id: str, payload: MessageCreate):
     )
 
   print(f"[backend] message saved (REST) channel={channel_id}, id={message.id}, sender={sender.name}")
+  _index_message_for_rag(channel_id, message.id, payload.content, sender.id)
 
   # 멘션 및 키워드 알림 처리 (암호화되지 않은 원본 content 사용)
+  audience = _channel_audience(server, channel, dm_channel)
+  mentioned_ids = set()
   if sender.id:
-    await process_mentions_and_keywords(message.id, channel_id, payload.content, sender.id)
+    mentioned_ids = await process_mentions_and_keywords(
+      message.id, channel_id, payload.content, sender.id, audience, server.id if server else None
+    )
+
+  # 미읽음 카운터 팬아웃
+  await fan_out_unreads(channel_id, audience, sender.id, mentioned_ids, message.timestamp)
 
   await sio.emit(
       "message",
@@ -2611,7 +3278,8 @@ async def delete_message(
     raise HTTPException(status_code=404, detail="Message not found")
 
   # 서버 정보 조회 (권한 확인용)
-  server_doc = await servers_col.find_one({"categories.channels.id": msg_doc["channel_id"]})
+  server_id = await server_store.server_id_for_channel(msg_doc["channel_id"])
+  server_doc = await servers_col.find_one({"_id": server_id}) if server_id else None
   if not server_doc:
     raise HTTPException(status_code=404, detail="Server not found")
 
@@ -2650,6 +3318,7 @@ async def delete_message(
       }
     }
   )
+  _update_vector_index(vector_index.remove, msg_doc["channel_id"], message_id)
 
   # Socket.IO로 브로드캐스트
   await sio.emit(
@@ -2827,18 +3496,13 @@ async def get_file(file_id: str):
     response_model=List[ChannelMember],
 )
 async def get_channel_members(channel_id: str):
-  server_doc = await servers_col.find_one({"categories.channels.id": channel_id})
-  if not server_doc:
+  if not await server_store.server_id_for_channel(channel_id):
     raise HTTPException(status_code=404, detail="Channel not found")
 
-  # Find the channel and get its members
-  for category in server_doc.get("categories", []):
-    for channel in category.get("channels", []):
-      if channel["id"] == channel_id:
-        members = channel.get("members", [])
-        return [ChannelMember(**m) for m in members]
-
-  raise HTTPException(status_code=404, detail="Channel not found")
+  # status는 저장하지 않고 지금 채널을 보고 있는지로 채운다
+  members = await channel_membership.members(channel_id)
+  viewing = await presence.viewing(channel_id)
+  return [ChannelMember(**m, status="online" if m["id"] in viewing else "offline") for m in members]
 
 
 @fastapi_app.post(
@@ -2847,28 +3511,13 @@ async def get_channel_members(channel_id: str):
     status_code=201,
 )
 async def add_channel_member(channel_id: str, member: ChannelMember):
-  # Find the server containing this channel
-  server_doc = await servers_col.find_one({"categories.channels.id": channel_id})
-  if not server_doc:
+  server_id = await server_store.server_id_for_channel(channel_id)
+  if not server_id:
     raise HTTPException(status_code=404, detail="Channel not found")
 
-  # Check if member already exists
-  for category in server_doc.get("categories", []):
-    for channel in category.get("channels", []):
-      if channel["id"] == channel_id:
-        existing_members = channel.get("members", [])
-        if any(m["id"] == member.id for m in existing_members):
-          raise HTTPException(status_code=400, detail="Member already exists in channel")
-
   # Add member to channel
-  result = await servers_col.update_one(
-      {"categories.channels.id": channel_id},
-      {"$push": {"categories.$[].channels.$[ch].members": member.model_dump()}},
-      array_filters=[{"ch.id": channel_id}],
-  )
-
-  if result.modified_count == 0:
-    raise HTTPException(status_code=404, detail="Channel not found")
+  if not await channel_membership.add([channel_id], member.model_dump(), server_id=server_id):
+    raise HTTPException(status_code=400, detail="Member already exists in channel")
 
   # Emit Socket.IO event for real-time update
   await sio.emit(
@@ -2885,13 +3534,8 @@ async def add_channel_member(channel_id: str, member: ChannelMember):
     status_code=204,
 )
 async def remove_channel_member(channel_id: str, user_id: str):
-  result = await servers_col.update_one(
-      {"categories.channels.id": channel_id},
-      {"$pull": {"categories.$[].channels.$[ch].members": {"id": user_id}}},
-      array_filters=[{"ch.id": channel_id}],
-  )
-
-  if result.modified_count == 0:
+  removed = await channel_membership.remove(user_id, channel_ids=[channel_id])
+  if not removed:
     raise HTTPException(status_code=404, detail="Channel or member not found")
 
   # Emit Socket.IO event for real-time update
@@ -2933,11 +3577,12 @@ async def update_member_role(
   # 역할 업데이트
   result = await servers_col.update_one(
       {"_id": server_id, "members.id": user_id},
-      {"$set": {"members.$.role": payload.role}}
+      {"$set": {"members.$.role": payload.role}, "$inc": {"version": 1}}
   )
 
   if result.matched_count == 0:
     raise HTTPException(status_code=404, detail="서버 또는 멤버를 찾을 수 없습니다.")
+  cache_bus.invalidate("permission_members", server_id=server_id, user_ids=[user_id])
 
   # 업데이트된 멤버 정보 반환
   server_doc = await servers_col.find_one({"_id": server_id})
@@ -2958,20 +3603,13 @@ async def update_my_nickname(
 ):
   """현재 사용자의 서버별 닉네임 업데이트"""
   # 서버 멤버인지 확인
-  server_doc = await servers_col.find_one({"_id": server_id})
-  if not server_doc:
-    raise HTTPException(status_code=404, detail="서버를 찾을 수 없습니다.")
-
-  members = server_doc.get("members", [])
-  is_member = any(m.get("id") == current_user.id for m in members)
-
-  if not is_member:
+  if not await permission_resolver.is_member(server_id, current_user.id):
     raise HTTPException(status_code=403, detail="이 서버의 멤버가 아닙니다.")
 
   # 닉네임 업데이트
   result = await servers_col.update_one(
       {"_id": server_id, "members.id": current_user.id},
-      {"$set": {"members.$.nickname": payload.nickname}}
+      {"$set": {"members.$.nickname": payload.nickname}, "$inc": {"version": 1}}
   )
 
   if result.matched_count == 0:
@@ -3010,28 +3648,74 @@ async def kick_member(
 
   # 서버에서 멤버 제거
   result = await servers_col.update_one(
-      {"_id": server_id},
-      {"$pull": {"members": {"id": user_id}}}
+      {"_id": server_id, "members.id": user_id},
+      {"$pull": {"members": {"id": user_id}}, "$inc": {"version": 1}}
   )
 
   if result.modified_count == 0:
     raise HTTPException(status_code=404, detail="멤버를 찾을 수 없습니다.")
+  user_directory.remove_member(server_id, user_id)
+  cache_bus.publish("directory_server", server_id=server_id)
+  cache_bus.invalidate("permission_members", server_id=server_id, user_ids=[user_id])
 
   # 모든 채널에서도 제거
-  server_doc = await servers_col.find_one({"_id": server_id})
-  categories = server_doc.get("categories", [])
+  await channel_membership.remove(user_id, server_id=server_id)
+
+  # 추방된 서버 채널의 미읽음 카운터 정리
+  channel_ids = await server_store.channel_ids(server_id)
+  await user_channel_reads_col.update_many(
+      {"user_id": user_id, "channel_id": {"$in": channel_ids}},
+      {"$set": {"unread_count": 0, "has_mention": False}}
+  )
+
+  return None
+
+
+@fastapi_app.post("/servers/{server_id}/members/bulk-kick", response_model=BulkKickResponse)
+async def bulk_kick_members(
+    server_id: str,
+    payload: BulkKickRequest,
+    current_user: User = Depends(get_current_user)
+):
+  """여러 멤버를 한 번에 추방 (owner와 본인은 건너뜀)"""
+  if not await permission_resolver.has_role(server_id, current_user.id, ["owner", "admin", "moderator"]):
+    raise HTTPException(status_code=403, detail="권한이 없습니다.")
 
-  for cat in categories:
-    for ch in cat.get("channels", []):
-      members = ch.get("members", [])
-      ch["members"] = [m for m in members if m.get("id") != user_id]
+  # 대상들의 역할 (owner / 비멤버 건너뛰기용)
+  server_doc = await servers_col.find_one({"_id": server_id}, {"members.id": 1, "members.role": 1})
+  if not server_doc:
+    raise HTTPException(status_code=404, detail="서버를 찾을 수 없습니다.")
+  roles = {m["id"]: m.get("role", "member") for m in server_doc.get("members", [])}
+
+  response = BulkKickResponse()
+  for user_id in dict.fromkeys(payload.user_ids):
+    if user_id == current_user.id or roles.get(user_id) in (None, "owner"):
+      response.skipped.append(user_id)
+    else:
+      response.kicked.append(user_id)
+  if not response.kicked:
+    return response
 
   await servers_col.update_one(
       {"_id": server_id},
-      {"$set": {"categories": categories}}
+      {"$pull": {"members": {"id": {"$in": response.kicked}}}, "$inc": {"version": 1}},
   )
-
-  return None
+  for user_id in response.kicked:
+    user_directory.remove_member(server_id, user_id)
+  cache_bus.publish("directory_server", server_id=server_id)
+  cache_bus.invalidate("permission_members", server_id=server_id, user_ids=response.kicked)
+
+  removed = await channel_membership.remove_users(response.kicked, server_id)
+  for ch_id, user_ids in removed.items():
+    await sio.emit("members_left", {"channelId": ch_id, "userIds": user_ids}, room=ch_id)
+
+  # 추방된 서버 채널의 미읽음 카운터 정리
+  channel_ids = await server_store.channel_ids(server_id)
+  await user_channel_reads_col.update_many(
+      {"user_id": {"$in": response.kicked}, "channel_id": {"$in": channel_ids}},
+      {"$set": {"unread_count": 0, "has_mention": False}}
+  )
+  return response
 
 
 # -----------------------------
@@ -3056,16 +3740,9 @@ async def search(
 
   results = SearchResults()
 
-  # 사용자 검색
+  # 사용자 검색 (search_keys 접두사 범위 검색 - 이름/아이디/이메일/초성)
   if type in ["all", "users"]:
-    user_query = {
-        "$or": [
-            {"name": {"$regex": q, "$options": "i"}},
-            {"username": {"$regex": q, "$options": "i"}},
-            {"email": {"$regex": q, "$options": "i"}}
-        ]
-    }
-    user_cursor = users_col.find(user_query).limit(limit)
+    user_cursor = users_col.find(prefix_query(q), collation=SEARCH_KEY_COLLATION).limit(limit)
     async for user_doc in user_cursor:
       results.users.append(User(
           id=user_doc["_id"],
@@ -3080,16 +3757,12 @@ async def search(
   if type in ["all", "messages"]:
     message_query = {"content": {"$regex": q, "$options": "i"}}
 
-    # 특정 서버 내에서만 검색
+    # 읽을 수 있는 채널만 (특정 서버 내 검색이면 그 서버 채널로 한정)
     if server_id:
-      server_doc = await servers_col.find_one({"_id": server_id})
-      if server_doc:
-        channel_ids = [
-            ch.get("id")
-            for cat in server_doc.get("categories", [])
-            for ch in cat.get("channels", [])
-        ]
-        message_query["channel_id"] = {"$in": channel_ids}
+      channel_ids = await permission_resolver.readable_channels(current_user.id, server_ids=[server_id])
+    else:
+      channel_ids = await _get_accessible_channels(current_user.id)
+    message_query["channel_id"] = {"$in": channel_ids}
 
     message_cursor = messages_col.find(message_query).sort("timestamp", -1).limit(limit)
     async for msg_doc in message_cursor:
@@ -3115,31 +3788,82 @@ async def search_in_server(
 ):
   """서버 내 검색"""
   # 서버 멤버 확인
-  server_doc = await servers_col.find_one({"_id": server_id, "members.id": current_user.id})
-  if not server_doc:
+  if not await permission_resolver.is_member(server_id, current_user.id):
     raise HTTPException(status_code=403, detail="서버에 접근 권한이 없습니다.")
 
   return await search(q=q, type=type, server_id=server_id, limit=limit, current_user=current_user)
 
 
+@fastapi_app.get("/servers/{server_id}/presence")
+async def get_server_presence(server_id: str, current_user: User = Depends(get_current_user)):
+  """서버 멤버 중 접속 중인 사용자 상태 (online / idle) - 이후 변경은 presence_update 이벤트로 받는다"""
+  if not await permission_resolver.is_member(server_id, current_user.id):
+    raise HTTPException(status_code=403, detail="서버에 접근 권한이 없습니다.")
+  server_doc = await servers_col.find_one({"_id": server_id}, {"members.id": 1})
+  member_ids = [m["id"] for m in (server_doc or {}).get("members", []) if m.get("id")]
+  statuses = await presence.statuses(member_ids)
+  return {"serverId": server_id, "users": {uid: st for uid, st in statuses.items() if st != OFFLINE}}
+
+
+@fastapi_app.get("/servers/{server_id}/members/autocomplete")
+async def autocomplete_members(
+    server_id: str,
+    q: str = "",
+    limit: int = 10,
+    current_user: User = Depends(get_current_user)
+):
+  """@멘션 자동완성 - 서버 멤버 중 접두사(초성 포함)가 일치하는 top-k 반환"""
+  if not user_directory.is_loaded(server_id):
+    server_doc = await servers_col.find_one({"_id": server_id}, {"members.id": 1})
+    if not server_doc:
+      raise HTTPException(status_code=404, detail="서버를 찾을 수 없습니다.")
+    member_ids = [m["id"] for m in server_doc.get("members", []) if m.get("id")]
+    user_docs = await users_col.find(
+      {"_id": {"$in": member_ids}},
+      {"username": 1, "name": 1, "nickname": 1, "email": 1, "avatar": 1}
+    ).to_list(None)
+    user_directory.load_server(server_id, user_docs)
+
+  if current_user.id not in user_directory.members.get(server_id, ()):
+    raise HTTPException(status_code=403, detail="서버에 접근 권한이 없습니다.")
+
+  limit = max(1, min(limit, 50))
+  return {"members": user_directory.autocomplete(server_id, q, limit=limit)}
+
+
 # -----------------------------
 # Socket.IO 이벤트
 # -----------------------------
 
-# 온라인 사용자 추적 (세션 ID -> 사용자 ID 매핑)
-online_users = {}
-user_cache: Dict[str, Dict] = {}
+# 멤버 요약 캐시 (user_id -> {id, name, avatar, status})
+user_cache = SharedMap(redis_client, "socket:member_summary", ttl=600)
 
 # 통화 참가자 추적 (WebRTC용) - disconnect에서 사용하기 위해 여기에 정의
-call_participants = {}  # channel_id -> {sid: user_info}
+call_participants = SharedHashes(redis_client, "socket:calls", ttl=86400)  # channel_id -> {sid: user_info}
 # 서버별 사용자 추적 (WebRTC용)
-user_servers = {}  # sid -> server_id
+user_servers = SharedMap(redis_client, "socket:server", ttl=86400)  # sid -> server_id
+
+
+async def _prune_calls(calls: Dict[str, Dict[str, Dict]]) -> Dict[str, Dict[str, Dict]]:
+  """죽은 워커가 남긴 통화 참가자(presence에 살아 있는 연결이 없는 sid)를 지우고 뺀 목록 반환"""
+  live = await presence.live_sids({info.get("id") for participants in calls.values() for info in participants.values()})
+  for channel_id, participants in calls.items():
+    for ghost_sid in [s for s in participants if s not in live]:
+      del participants[ghost_sid]
+      await call_participants.delete(channel_id, ghost_sid)
+  return calls
+
+
+async def _live_call_participants(channel_id: str) -> Dict[str, Dict]:
+  """채널의 통화 참가자 (sid -> 참가자 정보), 죽은 워커의 sid 제외"""
+  return (await _prune_calls({channel_id: await call_participants.all(channel_id)}))[channel_id]
 
 
 async def _get_member_summary(user_id: str) -> Dict:
   # 캐시 우선
-  if user_id in user_cache:
-    return user_cache[user_id]
+  summary = await user_cache.get(user_id)
+  if summary is not None:
+    return summary
 
   user_doc = await users_col.find_one({"_id": user_id})
   if user_doc:
@@ -3156,58 +3880,118 @@ async def _get_member_summary(user_id: str) -> Dict:
         "avatar": user_id[:1] if user_id else "U",
         "status": "online",
     }
-  user_cache[user_id] = summary
+  await user_cache.set(user_id, summary)
   return summary
 
 
+def _socket_token(environ: Dict, auth) -> Optional[str]:
+  """connect auth 페이로드({"token": ...}) 우선, 없으면 Authorization 헤더"""
+  if isinstance(auth, dict) and auth.get("token"):
+    return auth["token"]
+  header = environ.get("HTTP_AUTHORIZATION", "")
+  if header.startswith("Bearer "):
+    return header[len("Bearer "):]
+  return None
+
+
+async def _socket_principal(sid: str) -> Dict:
+  """connect에서 인증된 사용자 (id, name, avatar, servers) - 핸들러는 페이로드의 userId 대신 이것을 쓴다"""
+  session = await sio.get_session(sid)
+  return session["principal"]
+
+
+async def _socket_channel_server(user_id: str, channel_id: Optional[str]) -> Optional[str]:
+  """소켓 이벤트가 가리키는 채널을 볼 수 있는지 확인 - 서버 채널이면 서버 ID, DM 참가자면 "",
+  볼 수 없으면 None (페이로드의 channelId/serverId를 그대로 믿지 않도록 join과 같은 can_view 기준)"""
+  if not channel_id:
+    return None
+  if channel_id.startswith("dm_"):
+    if await dm_channels_col.count_documents({"_id": channel_id, "participants": user_id}, limit=1):
+      return ""
+    return None
+  permission = await permission_resolver.for_channel(user_id, channel_id)
+  if not permission or not permission.can_view:
+    return None
+  return permission.server_id
+
+
+def _principal_sender(principal: Dict) -> Sender:
+  avatar = principal.get("avatar") or ""
+  if not avatar or len(avatar) > 2:
+    avatar = principal["name"][:1] or "U"
+  return Sender(id=principal["id"], name=principal["name"], avatar=avatar)
+
+
+async def _refresh_socket_principals(user_id: str, name: str, avatar: str):
+  """프로필 변경을 이미 연결된 소켓 세션에 반영"""
+  await user_cache.delete(user_id)
+  for sid in presence.sids_of(user_id):
+    session = await sio.get_session(sid)
+    if session.get("principal"):
+      session["principal"].update({"name": name, "avatar": avatar})
+      await sio.save_session(sid, session)
+
+
 @sio.event
-async def connect(sid, environ):
-  print(f"[backend] Socket.IO client connected: {sid}")
-  await sio.save_session(sid, {"channels": [], "user_id": None})
+async def connect(sid, environ, auth=None):
+  """JWT를 한 번 검증하고 사용자 정보를 소켓 세션에 저장 (이후 이벤트는 DB 조회 없이 세션 사용)"""
+  token = _socket_token(environ, auth)
+  if not token:
+    raise socketio.exceptions.ConnectionRefusedError("authentication required")
+  try:
+    user = await _user_from_token(token)
+  except HTTPException as e:
+    raise socketio.exceptions.ConnectionRefusedError(e.detail)
+
+  # 가입 서버 목록 (역할 캐시도 같이 채움)
+  roles = await permission_resolver.roles_for(user.id)
+  principal = {"id": user.id, "name": user.name, "avatar": user.avatar, "servers": list(roles)}
+
+  # 사용자 룸(room=user_id) - 미읽음 증분/리마인더 수신용, 서버 presence 룸 - presence_update 수신용
+  await sio.enter_room(sid, user.id)
+  for server_id in principal["servers"]:
+    await sio.enter_room(sid, f"presence_{server_id}")
+  previous = await presence.connect(sid, user.id, principal["servers"])
+  await sio.save_session(sid, {
+    "channels": [],
+    "user_id": user.id,
+    "principal": principal,
+    "digest_pending": previous == OFFLINE,  # join_user에서 오프라인 알림 다이제스트 전송
+  })
+  print(f"[backend] Socket.IO client connected: {sid} ({user.id})")
 
 
 @sio.event
 async def disconnect(sid):
   print(f"[backend] Socket.IO client disconnected: {sid}")
-  
-  # 통화 참가자에서 제거 및 voice_state_update 브로드캐스트
-  for channel_id in list(call_participants.keys()):
-    if sid in call_participants[channel_id]:
-      del call_participants[channel_id][sid]
-      remaining = list(call_participants[channel_id].values())
+  user_id, status, calls, ended = await presence.disconnect(sid)
+
+  # 통화 참가자에서 제거 및 voice_state_update 브로드캐스트 (이 sid가 참가한 통화만)
+  server_id = await user_servers.pop(sid)
+  for channel_id in calls:
+    if await call_participants.delete(channel_id, sid):
+      remaining = list((await _live_call_participants(channel_id)).values())
       print(f"[WebRTC] Removed {sid} from call_participants[{channel_id}], remaining: {len(remaining)}")
       
       # 서버 룸에 브로드캐스트
-      server_id = user_servers.get(sid)
       if server_id:
         await sio.emit("voice_state_update", {
           "serverId": server_id,
           "channelId": channel_id,
           "participants": remaining
         }, room=f"server_{server_id}")
-      
-      # 빈 채널 정리
-      if not call_participants[channel_id]:
-        del call_participants[channel_id]
-  
-  # user_servers에서 제거
-  if sid in user_servers:
-    del user_servers[sid]
   
-  # 사용자의 온라인 상태 업데이트
-  if sid in online_users:
-    user_id = online_users[sid]
-    del online_users[sid]
+  # 마지막 기기가 끊기면 재접속 알림 다이제스트 기준 시각 기록
+  if user_id and status == OFFLINE:
+    await users_col.update_one({"_id": user_id}, {"$set": {"last_seen_at": _now()}})
 
-    # 사용자가 속한 모든 채널에 오프라인 상태 브로드캐스트
-    session = await sio.get_session(sid)
-    channels = session.get("channels", [])
-    for channel_id in channels:
-      await sio.emit(
-          "member_left",
-          {"userId": user_id, "channelId": channel_id},
-          room=channel_id,
-      )
+  # 보고 있던 채널에 열람 종료 브로드캐스트 (같은 사용자의 다른 소켓이 남아 있으면 생략)
+  for channel_id, viewer_id in ended:
+    await sio.emit(
+        "channel_presence",
+        {"channelId": channel_id, "userId": viewer_id, "status": "offline"},
+        room=channel_id,
+    )
 
   await sio.save_session(sid, {"channels": [], "user_id": None})
 
@@ -3215,43 +3999,79 @@ async def disconnect(sid):
 @sio.event
 async def join(sid, data):
   channel_id = data.get("channelId") or data.get("channel_id")
-  user_id = data.get("userId") or data.get("user_id")
+  session = await sio.get_session(sid)
+  principal = session["principal"]
+  user_id = principal["id"]
 
   server, category, channel = await _ensure_channel(channel_id)
   if not channel:
     return False
+  permission = await permission_resolver.for_channel(
+    user_id, channel_id, {**channel.model_dump(), "server_id": server.id}
+  )
+  if not permission or not permission.can_view:
+    return False
 
   await sio.enter_room(sid, channel_id)
-  session = await sio.get_session(sid)
   channels = set(session.get("channels", []))
   channels.add(channel_id)
+  session["channels"] = list(channels)
+  await sio.save_session(sid, session)
 
-  # 사용자 ID 저장
-  if user_id:
-    online_users[sid] = user_id
-    await sio.save_session(sid, {"channels": list(channels), "user_id": user_id})
-
-    # 채널 멤버 목록에 추가 (중복 없이)
-    member = await _get_member_summary(user_id)
-    await servers_col.update_one(
-        {"categories.channels.id": channel_id},
-        {"$addToSet": {"categories.$[].channels.$[ch].members": member}},
-        array_filters=[{"ch.id": channel_id}],
-    )
+  # 처음 들어온 채널만 멤버십 저장 (재접속/채널 전환은 캐시 확인만 하고 DB에 쓰지 않음)
+  if not await channel_membership.is_member(channel_id, user_id):
+    member = {"id": user_id, "name": principal["name"], "avatar": principal["avatar"], "status": "online"}
+    if await channel_membership.add([channel_id], member, server_id=server.id):
+      await sio.emit(
+          "member_joined",
+          {"channelId": channel_id, "member": member},
+          room=channel_id,
+      )
 
-    # 채널에 온라인 상태 브로드캐스트
+  # 채널 열람 presence (REDIS_URL이 있으면 워커 간 공유)
+  if await presence.enter_channel(sid, channel_id, user_id):
     await sio.emit(
-        "member_joined",
-        {"channelId": channel_id, "member": member},
+        "channel_presence",
+        {"channelId": channel_id, "userId": user_id, "status": "online"},
         room=channel_id,
     )
-  else:
-    await sio.save_session(sid, {"channels": list(channels)})
 
   await sio.emit("joined", {"channelId": channel_id}, to=sid)
   return True
 
 
+async def _send_notification_digest(sid: str, user_id: str, limit: int = 20):
+  user_doc = await users_col.find_one({"_id": user_id}, {"last_seen_at": 1})
+  query = {"user_id": user_id, "read": False}
+  if user_doc and user_doc.get("last_seen_at"):
+    query["created_at"] = {"$gt": user_doc["last_seen_at"]}
+  total = await notifications_col.count_documents(query)
+  if not total:
+    return
+  cursor = notifications_col.find(query).sort("created_at", -1).limit(limit)
+  notifications = [_notification_payload(doc) async for doc in cursor]
+  await sio.emit("notification_digest", {"total": total, "notifications": notifications}, to=sid)
+
+
+@sio.event
+async def join_user(sid, data):
+  """로그인 직후/재연결 시 사용자 룸 참가 (사용자 룸은 connect에서 이미 참가, 페이로드의 userId는 무시)"""
+  session = await sio.get_session(sid)
+  user_id = session["user_id"]
+
+  # 다른 세션 없이 접속한 경우 오프라인 동안 쌓인 알림 다이제스트 전송 (소켓당 한 번)
+  if session.pop("digest_pending", False):
+    await sio.save_session(sid, session)
+    await _send_notification_digest(sid, user_id)
+  return True
+
+
+@sio.event
+async def set_presence(sid, data):
+  """기기 상태 변경 {status: "online" | "idle"} - 사용자 상태는 모든 기기를 합산해 서버별로 모아서 알린다"""
+  return await presence.set_status(sid, (data or {}).get("status"))
+
+
 @sio.event
 async def leave(sid, data):
   channel_id = data.get("channelId") or data.get("channel_id")
@@ -3261,10 +4081,16 @@ async def leave(sid, data):
   session = await sio.get_session(sid)
   channels = set(session.get("channels", []))
   channels.discard(channel_id)
-  await sio.save_session(sid, {"channels": list(channels)})
-  user_id = online_users.get(sid)
+  session["channels"] = list(channels)
+  await sio.save_session(sid, session)
+  # 채널을 그만 볼 뿐 멤버십은 유지
+  user_id = await presence.leave_channel(sid, channel_id)
   if user_id:
-    await sio.emit("member_left", {"channelId": channel_id, "userId": user_id}, room=channel_id)
+    await sio.emit(
+        "channel_presence",
+        {"channelId": channel_id, "userId": user_id, "status": "offline"},
+        room=channel_id,
+    )
   await sio.emit("left", {"channelId": channel_id}, to=sid)
   return True
 
@@ -3274,7 +4100,6 @@ async def message(sid, data):
   channel_id = data.get("channelId") or data.get("channel_id")
   print(f"[backend] Received message event: channel_id={channel_id}, sid={sid}")
   raw_message = data.get("message") or {}
-  sender_payload = raw_message.get("sender")
   content = raw_message.get("content") or ""
   files_payload = raw_message.get("files") or []
   thread_id = raw_message.get("thread_id") or raw_message.get("threadId")
@@ -3286,14 +4111,15 @@ async def message(sid, data):
   if not channel:
     return False
 
-  if isinstance(sender_payload, dict):
-    sender_model = Sender(
-        id=sender_payload.get("id"),
-        name=sender_payload.get("name") or "익명",
-        avatar=sender_payload.get("avatar") or sender_payload.get("name", "U")[:1],
-    )
-  else:
-    sender_model = Sender(name=str(sender_payload or "익명"), avatar=str(sender_payload or "익")[0])
+  # 발신자는 페이로드가 아니라 connect에서 인증된 사용자
+  sender_model = _principal_sender(await _socket_principal(sid))
+
+  # REST create_message와 같은 유효 권한 확인 (캐시)
+  permission = await permission_resolver.for_channel(
+    sender_model.id, channel_id, {**channel.model_dump(), "server_id": server.id}
+  )
+  if not permission or not permission.can_post:
+    return False
 
   message_obj = Message(
       id=f"msg_{uuid.uuid4().hex[:12]}",
@@ -3327,10 +4153,18 @@ async def message(sid, data):
     )
 
   print(f"[backend] message saved (socket) channel={channel_id}, id={message_obj.id}, sender={message_obj.sender.name}")
+  _index_message_for_rag(channel_id, message_obj.id, content, message_obj.sender.id)
 
   # 멘션 및 키워드 알림 처리 (암호화되지 않은 원본 content 사용)
+  audience = _channel_audience(server, channel)
+  mentioned_ids = set()
   if message_obj.sender.id:
-    await process_mentions_and_keywords(message_obj.id, channel_id, content, message_obj.sender.id)
+    mentioned_ids = await process_mentions_and_keywords(
+      message_obj.id, channel_id, content, message_obj.sender.id, audience, server.id if server else None
+    )
+
+  # 미읽음 카운터 팬아웃
+  await fan_out_unreads(channel_id, audience, message_obj.sender.id, mentioned_ids, message_obj.timestamp)
 
   await sio.emit(
       "message",
@@ -3404,87 +4238,77 @@ async def message(sid, data):
 
 async def _get_accessible_channels(user_id: str) -> List[str]:
     """사용자가 접근 가능한 모든 채널 ID 반환"""
-    channel_ids = set()
-
-    # 1. 서버 채널
-    async for server in servers_col.find({"members.id": user_id}):
-        for cat in server.get("categories", []):
-            for ch in cat.get("channels", []):
-                # 권한 체크 로직 (단순화: 멤버면 접근 가능)
-                # 실제로는 _can_access_channel 등을 사용해야 하지만, 
-                # 여기서는 서버 멤버면 기본적으로 접근 가능한 것으로 가정 (Private 제외 등은 추가 필요)
-                # 검색 로직과 유사하게 가져감
-                accessible = False
-                if not ch.get("is_private", False):
-                    accessible = True
-                elif user_id in ch.get("allowed_members", []):
-                    accessible = True
-                # role check 생략 (복잡도 감소)
-                
-                if accessible:
-                    channel_ids.add(ch["id"])
+    # 1. 서버 채널 (역할/allowed_members 반영한 권한 비트 일괄 평가)
+    channel_ids = await permission_resolver.readable_channels(user_id)
 
     # 2. DM 채널
-    async for dm in dm_channels_col.find({"participants": user_id}):
-        channel_ids.add(dm["_id"])
+    async for dm in dm_channels_col.find({"participants": user_id}, {"_id": 1}):
+        channel_ids.append(dm["_id"])
+
+    return channel_ids
 
-    return list(channel_ids)
+
+def _update_vector_index(method: Callable, channel_id: str, message_id: str, *args):
+  """벡터 인덱스 추가/묘비를 스레드 풀에서 실행하고 기다리지 않는다
+  (임베딩, 다른 워커가 잡은 파일 잠금, 디스크 쓰기가 이벤트 루프와 메시지 전송을 막지 않도록)"""
+  def run():
+    try:
+      method(channel_id, message_id, *args)
+    except Exception as e:
+      print(f"[rag] 벡터 인덱스 갱신 실패: {e}")
+  asyncio.get_running_loop().run_in_executor(None, run)
+
+
+def _index_message_for_rag(channel_id: str, message_id: str, content: str, sender_id: Optional[str]):
+  """메시지 저장 시 RAG 벡터 인덱스에 증분 추가 (AI 응답은 제외)"""
+  if sender_id == "ai_bot" or not content:
+    return
+  _update_vector_index(vector_index.add, channel_id, message_id, strip_html_tags(content))
 
 
 async def get_relevant_context(query: str, user_id: str, limit: int = 10) -> str:
-    """사용자 질문과 관련된 최근 메시지 검색 (RAG)"""
+    """사용자 질문과 관련된 메시지 검색 (RAG)
+
+    접근 가능한 채널의 로컬 벡터 인덱스에서 코사인 유사도 top-k를 찾고,
+    해당 메시지만 조회/복호화한다.
+    """
     channel_ids = await _get_accessible_channels(user_id)
     if not channel_ids:
         return "관련 대화 내역이 없습니다."
 
-    # 정규식으로 키워드 검색 (단순 검색)
-    # 실제 프로덕션에서는 Vector DB가 필요함
-    # 여기서는 query의 단어들이 포함된 메시지를 찾음
-    keywords = [k for k in query.split() if len(k) > 1]
-    if not keywords:
+    if not query.strip():
         return ""
 
-    regex_pattern = "|".join([re.escape(k) for k in keywords])
-    
-    # 암호화된 메시지를 복호화해서 검색할 수 없으므로, 
-    # MongoDB regex는 암호화된 상태에서는 작동하지 않음!
-    # ★ 중요: 현재 아키텍처는 메시지가 암호화되어 저장됨 (encrypt_text -> base64)
-    # 따라서 DB 차원의 텍스트 검색은 불가능함.
-    # 
-    # 대안: 최신 메시지 N개를 가져와서 메모리에서 복호화 후 검색
-    # (성능 이슈가 있을 수 있으나, 프로토타입으로는 적절)
-    
-    # 최근 메시지 500개 조회
-    cursor = messages_col.find({
-        "channel_id": {"$in": channel_ids}
-    }).sort("timestamp", -1).limit(200)
+    # 다른 서비스에서 삭제되어 아직 묘비가 없는 행이 섞일 수 있어 여유 있게 찾는다
+    # 채널마다 파일 잠금 + 동기화 + 행렬 곱이라 스레드 풀에서
+    hits = await asyncio.get_running_loop().run_in_executor(None, vector_index.search, query, channel_ids, limit * 2)
+    if not hits:
+        return "관련된 대화 내용을 찾을 수 없습니다."
+
+    message_ids = [message_id for _, _, message_id in hits]
+    cursor = messages_col.find({"_id": {"$in": message_ids}, "is_deleted": {"$ne": True}})
+    live_docs = {msg_doc["_id"]: msg_doc async for msg_doc in cursor}
+    for _, channel_id, message_id in hits:
+        if message_id not in live_docs:
+            _update_vector_index(vector_index.remove, channel_id, message_id)
 
     relevant_messages = []
-    
-    async for msg_doc in cursor:
-        try:
-            content = decrypt_text(msg_doc.get("content", ""))
-            # 검색어 매칭 확인
-            if any(k.lower() in content.lower() for k in keywords):
-                sender_name = msg_doc.get("sender", {}).get("name", "Unknown")
-                timestamp = msg_doc.get("timestamp")
-                if isinstance(timestamp, datetime):
-                    time_str = timestamp.strftime("%Y-%m-%d %H:%M")
-                else:
-                    time_str = str(timestamp)
-                
-                relevant_messages.append(f"[{time_str}] {sender_name}: {content}")
-        except:
-            continue
-            
-        if len(relevant_messages) >= limit:
-            break
-    
+    for msg_doc in [live_docs[message_id] for message_id in message_ids if message_id in live_docs][:limit]:
+        content = decrypt_text(msg_doc.get("content", ""))
+        sender_name = msg_doc.get("sender", {}).get("name", "Unknown")
+        timestamp = msg_doc.get("timestamp")
+        if isinstance(timestamp, datetime):
+            time_str = timestamp.strftime("%Y-%m-%d %H:%M")
+        else:
+            time_str = str(timestamp)
+        relevant_messages.append((timestamp, f"[{time_str}] {sender_name}: {content}"))
+
     if not relevant_messages:
         return "관련된 대화 내용을 찾을 수 없습니다."
 
     # 시간순 정렬 (과거 -> 현재)
-    return "\n".join(reversed(relevant_messages))
+    relevant_messages.sort(key=lambda item: item[0] if isinstance(item[0], datetime) else datetime.min)
+    return "\n".join(line for _, line in relevant_messages)
 
 
 async def summarize_conversation(messages: List[Dict]) -> str:
@@ -3633,24 +4457,21 @@ async def extract_channel_tasks(
 @sio.event
 async def typing_start(sid, data):
   channel_id = data.get("channelId") or data.get("channel_id")
-  user_id = online_users.get(sid)
-  if channel_id and user_id:
-    # Get user name for display
-    user_doc = await users_col.find_one({"_id": user_id})
-    if user_doc:
-        username = user_doc.get("name") or user_doc.get("username")
-        await sio.emit(
-            "typing_start",
-            {"channelId": channel_id, "userId": user_id, "username": username},
-            room=channel_id,
-            skip_sid=sid
-        )
+  # 표시 이름은 세션의 사용자 정보 (키 입력마다 DB 조회하지 않음)
+  principal = await _socket_principal(sid)
+  if await _socket_channel_server(principal["id"], channel_id) is not None:
+    await sio.emit(
+        "typing_start",
+        {"channelId": channel_id, "userId": principal["id"], "username": principal["name"]},
+        room=channel_id,
+        skip_sid=sid
+    )
 
 @sio.event
 async def typing_stop(sid, data):
   channel_id = data.get("channelId") or data.get("channel_id")
-  user_id = online_users.get(sid)
-  if channel_id and user_id:
+  user_id = (await _socket_principal(sid))["id"]
+  if await _socket_channel_server(user_id, channel_id) is not None:
     await sio.emit(
         "typing_stop",
         {"channelId": channel_id, "userId": user_id},
@@ -3662,24 +4483,11 @@ async def typing_stop(sid, data):
 async def channel_read(sid, data):
   """Update last read time via socket for real-time receipts"""
   channel_id = data.get("channelId") or data.get("channel_id")
-  user_id = online_users.get(sid)
-  
-  if channel_id and user_id:
-      timestamp = _now()
-      
-      # Update DB
-      await user_channel_reads_col.update_one(
-        {"user_id": user_id, "channel_id": channel_id},
-        {"$set": {"last_read_at": timestamp}},
-        upsert=True
-      )
+  user_id = (await _socket_principal(sid))["id"]
 
-      # Broadcast update
-      await sio.emit(
-          "user_read_update",
-          {"channelId": channel_id, "userId": user_id, "lastReadAt": timestamp.isoformat()},
-          room=channel_id
-      )
+  if await _socket_channel_server(user_id, channel_id) is not None:
+      # write-behind 버퍼에 기록 (DB 반영/브로드캐스트는 버퍼가 묶어서 처리)
+      _mark_read(user_id, channel_id, _now())
 
 # ========================================
 # WebRTC Signaling (디스코드 스타일 음성 채널)
@@ -3691,28 +4499,34 @@ async def channel_read(sid, data):
 async def join_server(sid, data):
     """사용자가 서버에 접속할 때 서버 룸에 참가"""
     server_id = data.get("serverId")
-    user_id = data.get("userId")
-    
+    principal = await _socket_principal(sid)
+    user_id = principal["id"]
+
     if not server_id:
         return
+    # 서버 멤버만 서버 룸(음성 상태 브로드캐스트)에 참가
+    if not await permission_resolver.is_member(server_id, user_id):
+        return
+    if server_id not in principal["servers"]:
+        # connect 이후 가입한 서버 - presence 룸에도 참가
+        principal["servers"].append(server_id)
+        presence.add_server(sid, server_id)
+        await sio.enter_room(sid, f"presence_{server_id}")
     
     # 이전 서버에서 나가기
-    old_server = user_servers.get(sid)
+    old_server = await user_servers.get(sid)
     if old_server and old_server != server_id:
         await sio.leave_room(sid, f"server_{old_server}")
     
     # 새 서버 룸에 참가
     await sio.enter_room(sid, f"server_{server_id}")
-    user_servers[sid] = server_id
-    
-    if user_id:
-        online_users[sid] = user_id
-    
+    await user_servers.set(sid, server_id)
+
     print(f"[WebRTC] {sid} joined server room server_{server_id}")
     
     # 현재 서버의 모든 음성 채널 참가자 상태 전송
     voice_states = {}
-    for channel_id, participants in call_participants.items():
+    for channel_id, participants in (await _prune_calls(await call_participants.items())).items():
         if len(participants) > 0:
             voice_states[channel_id] = list(participants.values())
     
@@ -3728,8 +4542,7 @@ async def leave_server(sid, data):
     server_id = data.get("serverId")
     if server_id:
         await sio.leave_room(sid, f"server_{server_id}")
-        if sid in user_servers:
-            del user_servers[sid]
+        await user_servers.delete(sid)
         print(f"[WebRTC] {sid} left server room server_{server_id}")
 
 
@@ -3737,40 +4550,41 @@ async def leave_server(sid, data):
 async def call_join(sid, data):
     """음성 채널 참여"""
     channel_id = data.get("currentChannelId") or data.get("channelId")
-    server_id = data.get("serverId")
-    # 프론트엔드에서 보낸 userId를 우선 사용, 없으면 online_users에서 조회
-    user_id = data.get("userId") or online_users.get(sid)
-    user_name = data.get("userName", "User")
-    
-    print(f"[WebRTC] call_join - sid: {sid}, channel: {channel_id}, server: {server_id}, userId: {user_id}, userName: {user_name}")
+    # 참가자 ID/이름은 connect에서 인증된 세션 사용자
+    principal = await _socket_principal(sid)
+    user_id = principal["id"]
+    user_name = principal["name"]
     
-    if not channel_id:
+    # 채널을 볼 수 있는 사용자만 참가하고, 서버 ID는 페이로드 대신 채널이 속한 서버를 쓴다
+    server_id = await _socket_channel_server(user_id, channel_id)
+    if server_id is None:
         return
     
-    # 채널의 통화 참가자 목록에 추가
-    if channel_id not in call_participants:
-        call_participants[channel_id] = {}
+    print(f"[WebRTC] call_join - sid: {sid}, channel: {channel_id}, server: {server_id}, userId: {user_id}, userName: {user_name}")
     
     # 같은 user_id로 이미 참가한 경우 기존 항목 제거 (중복 방지)
     if user_id:
-        existing_sids = [s for s, info in call_participants[channel_id].items() if info.get("id") == user_id]
+        existing = await _live_call_participants(channel_id)
+        existing_sids = [s for s, info in existing.items() if info.get("id") == user_id]
         for old_sid in existing_sids:
-            del call_participants[channel_id][old_sid]
+            await call_participants.delete(channel_id, old_sid)
+            presence.remove_call(old_sid, channel_id)
             print(f"[WebRTC] Removed duplicate participant: {old_sid} for user {user_id}")
     
     # 🔥 CRITICAL FIX: 'sid' 필드 포함! 프론트엔드에서 userId <-> socketId 매핑에 필수
-    call_participants[channel_id][sid] = {
+    # 채널의 통화 참가자 목록에 추가
+    await call_participants.set(channel_id, sid, {
         "id": user_id,
         "sid": sid,  # 🔥 Socket ID 포함!
         "name": user_name,
         "isScreenSharing": False
-    }
+    })
+    presence.add_call(sid, channel_id)
+    participants = await _live_call_participants(channel_id)
     
-    # online_users와 user_servers에도 등록 (screen_share 이벤트에서 사용)
-    if user_id:
-        online_users[sid] = user_id
+    # user_servers에도 등록 (screen_share 이벤트에서 사용)
     if server_id:
-        user_servers[sid] = server_id
+        await user_servers.set(sid, server_id)
     
     # 해당 채널 room에 참가
     await sio.enter_room(sid, f"call_{channel_id}")
@@ -3781,14 +4595,14 @@ async def call_join(sid, data):
         "callerId": sid,
         "userId": user_id,
         "userName": user_name,
-        "participants": list(call_participants[channel_id].values())  # 🔥 각 participant에 sid 포함됨
+        "participants": list(participants.values())  # 🔥 각 participant에 sid 포함됨
     }, room=f"call_{channel_id}", skip_sid=sid)
     
     # 새 참가자에게 현재 참가자 목록 전송
     await sio.emit("call_participants", {
         "channelId": channel_id,
-        "participants": list(call_participants[channel_id].values()),  # 🔥 각 participant에 sid 포함됨
-        "existingPeers": [s for s in call_participants[channel_id].keys() if s != sid]
+        "participants": list(participants.values()),  # 🔥 각 participant에 sid 포함됨
+        "existingPeers": [s for s in participants.keys() if s != sid]
     }, to=sid)
     
     # ★ 서버 룸에 음성 상태 업데이트 브로드캐스트 (모든 서버 멤버가 볼 수 있도록)
@@ -3796,7 +4610,7 @@ async def call_join(sid, data):
         await sio.emit("voice_state_update", {
             "serverId": server_id,
             "channelId": channel_id,
-            "participants": list(call_participants[channel_id].values())  # 🔥 각 participant에 sid 포함됨
+            "participants": list(participants.values())  # 🔥 각 participant에 sid 포함됨
         }, room=f"server_{server_id}")
 
 
@@ -3914,11 +4728,11 @@ async def call_leave(sid, data):
     
     print(f"[WebRTC] {sid} leaving call in {channel_id}, server: {server_id}")
     
-    if channel_id and channel_id in call_participants:
-        if sid in call_participants[channel_id]:
-            del call_participants[channel_id][sid]
+    if channel_id:
+        await call_participants.delete(channel_id, sid)
+        presence.remove_call(sid, channel_id)
         
-        remaining_participants = list(call_participants[channel_id].values())
+        remaining_participants = list((await _live_call_participants(channel_id)).values())
         
         # 다른 참가자들에게 알림 (P2P 연결 정리용)
         await sio.emit("user_left", {
@@ -3936,24 +4750,22 @@ async def call_leave(sid, data):
                 "channelId": channel_id,
                 "participants": remaining_participants
             }, room=f"server_{server_id}")
-        
-        # 참가자가 없으면 정리
-        if not call_participants[channel_id]:
-            del call_participants[channel_id]
 
 
 @sio.event
 async def screen_share_started(sid, data):
     """화면 공유 시작 알림"""
     channel_id = data.get("channelId")
-    user_id = online_users.get(sid)
-    server_id = user_servers.get(sid)
+    user_id = (await _socket_principal(sid))["id"]
+    server_id = await user_servers.get(sid)
     
     print(f"[WebRTC] screen_share_started - sid: {sid}, channel: {channel_id}, user: {user_id}, server: {server_id}")
     
-    if channel_id and channel_id in call_participants:
-        if sid in call_participants[channel_id]:
-            call_participants[channel_id][sid]["isScreenSharing"] = True
+    participants = await _live_call_participants(channel_id) if channel_id else {}
+    if participants:
+        if sid in participants:
+            participants[sid]["isScreenSharing"] = True
+            await call_participants.set(channel_id, sid, participants[sid])
         
         # 통화 참가자에게 알림
         await sio.emit("screen_share_started", {
@@ -3967,7 +4779,7 @@ async def screen_share_started(sid, data):
             await sio.emit("voice_state_update", {
                 "serverId": server_id,
                 "channelId": channel_id,
-                "participants": list(call_participants[channel_id].values())
+                "participants": list(participants.values())
             }, room=f"server_{server_id}")
 
 
@@ -3975,14 +4787,16 @@ async def screen_share_started(sid, data):
 async def screen_share_stopped(sid, data):
     """화면 공유 종료 알림"""
     channel_id = data.get("channelId")
-    user_id = online_users.get(sid)
-    server_id = user_servers.get(sid)
+    user_id = (await _socket_principal(sid))["id"]
+    server_id = await user_servers.get(sid)
     
     print(f"[WebRTC] screen_share_stopped - sid: {sid}, channel: {channel_id}, user: {user_id}, server: {server_id}")
     
-    if channel_id and channel_id in call_participants:
-        if sid in call_participants[channel_id]:
-            call_participants[channel_id][sid]["isScreenSharing"] = False
+    participants = await _live_call_participants(channel_id) if channel_id else {}
+    if participants:
+        if sid in participants:
+            participants[sid]["isScreenSharing"] = False
+            await call_participants.set(channel_id, sid, participants[sid])
         
         # 통화 참가자에게 알림
         await sio.emit("screen_share_stopped", {
@@ -3996,7 +4810,7 @@ async def screen_share_stopped(sid, data):
             await sio.emit("voice_state_update", {
                 "serverId": server_id,
                 "channelId": channel_id,
-                "participants": list(call_participants[channel_id].values())
+                "participants": list(participants.values())
             }, room=f"server_{server_id}")
 
 
@@ -4016,6 +4830,9 @@ async def whiteboard_draw(sid, data):
     if not server_id or not channel_id or not draw_data:
         print(f"[Whiteboard] Missing data - server_id: {server_id}, channel_id: {channel_id}, draw_data: {draw_data}")
         return
+    user_id = (await _socket_principal(sid))["id"]
+    if await _socket_channel_server(user_id, channel_id) != server_id:
+        return
 
     # 같은 채널의 다른 사용자들에게 전송 (본인 제외)
     print(f"[Whiteboard] Broadcasting to room {channel_id}")
@@ -4034,6 +4851,9 @@ async def whiteboard_clear(sid, data):
 
     if not server_id or not channel_id:
         return
+    user_id = (await _socket_principal(sid))["id"]
+    if await _socket_channel_server(user_id, channel_id) != server_id:
+        return
 
     # 같은 채널의 다른 사용자들에게 전송 (본인 제외)
     await sio.emit("whiteboard_clear", {
@@ -4047,7 +4867,7 @@ async def whiteboard_clear(sid, data):
 # ========================================
 
 # Store notepad content per server+channel (key: "{server_id}:{channel_id}")
-notepad_content = {}
+notepad_content = SharedMap(redis_client, "socket:notepad")
 
 @sio.event
 async def notepad_join(sid, data):
@@ -4056,10 +4876,13 @@ async def notepad_join(sid, data):
     channel_id = data.get("channelId")
     if not server_id or not channel_id:
         return
+    user_id = (await _socket_principal(sid))["id"]
+    if await _socket_channel_server(user_id, channel_id) != server_id:
+        return
     
     # 서버+채널 조합 키
     content_key = f"{server_id}:{channel_id}"
-    content = notepad_content.get(content_key, "")
+    content = await notepad_content.get(content_key, "")
     await sio.emit("notepad_content", {
         "serverId": server_id,
         "channelId": channel_id,
@@ -4076,10 +4899,13 @@ async def notepad_update(sid, data):
     
     if not server_id or not channel_id:
         return
+    user_id = (await _socket_principal(sid))["id"]
+    if await _socket_channel_server(user_id, channel_id) != server_id:
+        return
     
     # 서버+채널 조합 키로 저장
     content_key = f"{server_id}:{channel_id}"
-    notepad_content[content_key] = content
+    await notepad_content.set(content_key, content)
     
     # 같은 채널의 다른 사용자들에게 전송 (본인 제외)
     await sio.emit("notepad_update", {
@@ -4145,19 +4971,12 @@ async def search_messages(
 
   # Server filter (if specified, check if message's channel belongs to server)
   if search_query.server_id:
-    server_doc = await servers_col.find_one({"_id": search_query.server_id})
-    if server_doc:
-      # Get all channel IDs in this server
-      server_channel_ids = []
-      for cat in server_doc.get("categories", []):
-        for ch in cat.get("channels", []):
-          server_channel_ids.append(ch["id"])
-
-      # Filter messages to only those in server channels
-      matching_messages = [
-        msg for msg in matching_messages
-        if msg["channel_id"] in server_channel_ids
-      ]
+    server_channel_ids = set(await server_store.channel_ids(search_query.server_id))
+    # Filter messages to only those in server channels
+    matching_messages = [
+      msg for msg in matching_messages
+      if msg["channel_id"] in server_channel_ids
+    ]
 
   # Apply pagination
   total = len(matching_messages)
@@ -4172,15 +4991,12 @@ async def search_messages(
     server_name = None
 
     # Try to find in regular servers
-    server_doc = await servers_col.find_one({"categories.channels.id": msg_doc["channel_id"]})
+    channel_doc = await server_store.get_channel(msg_doc["channel_id"])
+    server_doc = await servers_col.find_one({"_id": channel_doc["server_id"]}, {"name": 1}) if channel_doc else None
     if server_doc:
       server_id = server_doc["_id"]
       server_name = server_doc["name"]
-      for cat in server_doc.get("categories", []):
-        for ch in cat.get("channels", []):
-          if ch["id"] == msg_doc["channel_id"]:
-            channel_name = ch["name"]
-            break
+      channel_name = channel_doc["name"]
     else:
       # Try DM channels
       dm_doc = await dm_channels_col.find_one({"_id": msg_doc["channel_id"]})
@@ -4284,17 +5100,11 @@ async def search_files(
 
   # Server filter
   if search_query.server_id:
-    server_doc = await servers_col.find_one({"_id": search_query.server_id})
-    if server_doc:
-      server_channel_ids = []
-      for cat in server_doc.get("categories", []):
-        for ch in cat.get("channels", []):
-          server_channel_ids.append(ch["id"])
-
-      matching_files = [
-        item for item in matching_files
-        if item["message"]["channel_id"] in server_channel_ids
-      ]
+    server_channel_ids = set(await server_store.channel_ids(search_query.server_id))
+    matching_files = [
+      item for item in matching_files
+      if item["message"]["channel_id"] in server_channel_ids
+    ]
 
   # Apply pagination
   total = len(matching_files)
@@ -4311,15 +5121,12 @@ async def search_files(
     server_id = None
     server_name = None
 
-    server_doc = await servers_col.find_one({"categories.channels.id": msg_doc["channel_id"]})
+    channel_doc = await server_store.get_channel(msg_doc["channel_id"])
+    server_doc = await servers_col.find_one({"_id": channel_doc["server_id"]}, {"name": 1}) if channel_doc else None
     if server_doc:
       server_id = server_doc["_id"]
       server_name = server_doc["name"]
-      for cat in server_doc.get("categories", []):
-        for ch in cat.get("channels", []):
-          if ch["id"] == msg_doc["channel_id"]:
-            channel_name = ch["name"]
-            break
+      channel_name = channel_doc["name"]
     else:
       dm_doc = await dm_channels_col.find_one({"_id": msg_doc["channel_id"]})
       if dm_doc:
@@ -4355,23 +5162,48 @@ async def mark_channel_as_read(
   """채널을 읽음으로 표시"""
   timestamp = _now()
 
-  # Upsert last read timestamp for this user-channel combination
-  await user_channel_reads_col.update_one(
-    {"user_id": current_user.id, "channel_id": channel_id},
-    {"$set": {"last_read_at": timestamp}},
-    upsert=True
-  )
-  
-  # Broadcast update via socket if connected?
-  # The client is expected to emit 'channel_read` socket event for real-time, 
-  # but this REST API handles the persistence.
-  # We could broadcast here too but that might duplicate events if client does both.
-  # Let's rely on client emitting socket event for now, or add broadcast here.
-  # For safety, let's just stick to DB update here.
+  # channel_read 소켓 이벤트와 같은 write-behind 경로 사용 (중복 요청은 버퍼에서 합쳐짐)
+  _mark_read(current_user.id, channel_id, timestamp)
 
   return {"success": True, "channel_id": channel_id, "last_read_at": timestamp}
 
 
+@fastapi_app.post("/servers/{server_id}/mark-read")
+async def mark_server_as_read(
+    server_id: str,
+    current_user: User = Depends(get_current_user)
+):
+  """서버의 접근 가능한 모든 채널을 읽음으로 표시"""
+  if not await permission_resolver.is_member(server_id, current_user.id):
+    raise HTTPException(status_code=403, detail="서버에 접근 권한이 없습니다.")
+
+  channel_ids = await permission_resolver.readable_channels(current_user.id, server_ids=[server_id])
+
+  timestamp = _now()
+  for channel_id in channel_ids:
+    _mark_read(current_user.id, channel_id, timestamp)
+
+  return {"success": True, "server_id": server_id, "channel_ids": channel_ids, "last_read_at": timestamp}
+
+
+@fastapi_app.post("/unreads/mark-all-read")
+async def mark_all_channels_as_read(
+    current_user: User = Depends(get_current_user)
+):
+  """미읽음이 있는 모든 채널을 읽음으로 표시"""
+  cursor = user_channel_reads_col.find(
+    {"user_id": current_user.id, "unread_count": {"$gt": 0}},
+    {"channel_id": 1}
+  )
+  channel_ids = [doc["channel_id"] async for doc in cursor]
+
+  timestamp = _now()
+  for channel_id in channel_ids:
+    _mark_read(current_user.id, channel_id, timestamp)
+
+  return {"success": True, "channel_ids": channel_ids, "last_read_at": timestamp}
+
+
 @fastapi_app.get("/channels/{channel_id}/read-states")
 async def get_channel_read_states(
     channel_id: str,
@@ -4384,65 +5216,102 @@ async def get_channel_read_states(
     cursor = user_channel_reads_col.find({"channel_id": channel_id})
     read_states = {}
     async for doc in cursor:
-        read_states[doc["user_id"]] = doc["last_read_at"]
-        
+        if doc.get("last_read_at"):
+            read_states[doc["user_id"]] = doc["last_read_at"]
+
+    # write-behind 버퍼에 대기 중인 최신 읽음 위치 반영
+    read_states.update(read_receipts.pending_for_channel(channel_id))
+
     return read_states
 
 
-@fastapi_app.get("/unreads", response_model=UnreadCountsResponse)
-async def get_unread_counts(
+async def _ensure_read_positions(channel_id: str):
+  """채널 읽음 위치 배열 지연 로드 (DB + write-behind 버퍼 대기분)"""
+  if read_positions.is_loaded(channel_id):
+    return
+  read_states = {}
+  cursor = user_channel_reads_col.find({"channel_id": channel_id}, {"user_id": 1, "last_read_at": 1})
+  async for doc in cursor:
+    if doc.get("last_read_at"):
+      read_states[doc["user_id"]] = doc["last_read_at"]
+  # 조회 중 도착한 읽음 이벤트는 버퍼에 남아 있으므로 함께 반영 (더 최신 값 우선)
+  for user_id, timestamp in read_receipts.pending_for_channel(channel_id).items():
+    current = read_states.get(user_id)
+    if current is None or timestamp.replace(tzinfo=None) > current.replace(tzinfo=None):
+      read_states[user_id] = timestamp
+  if not read_positions.is_loaded(channel_id):
+    read_positions.load(channel_id, read_states)
+
+
+@fastapi_app.post("/channels/{channel_id}/read-counts", response_model=ReadCountsResponse)
+async def get_channel_read_counts(
+    channel_id: str,
+    request: ReadCountsRequest,
     current_user: User = Depends(get_current_user)
 ):
-  """전체 채널의 미읽음 카운트 조회"""
-  unreads = []
+  """메시지 페이지 단위 "N명 읽음" 집계
+
+  채널 멤버 읽음 위치 정렬 배열에 메시지 시각으로 이진 탐색한다.
+  """
+  # 볼 수 있는 채널만 (서버 채널은 permission_resolver.for_channel의 can_view, DM은 참가자)
+  if await _socket_channel_server(current_user.id, channel_id) is None:
+    raise HTTPException(status_code=403, detail="채널에 접근 권한이 없습니다.")
 
-  # Get all user's last read timestamps
-  reads_cursor = user_channel_reads_col.find({"user_id": current_user.id})
-  last_reads = {}
-  async for read_doc in reads_cursor:
-    last_reads[read_doc["channel_id"]] = read_doc["last_read_at"]
+  message_ids = request.message_ids[:200]
+  if not message_ids:
+    return ReadCountsResponse(channel_id=channel_id, counts={})
 
-  # Get all channels user has access to (from servers and DMs)
-  servers_cursor = servers_col.find({"members.id": current_user.id})
-  channel_ids = set()
+  cursor = messages_col.find(
+    {"_id": {"$in": message_ids}, "channel_id": channel_id},
+    {"timestamp": 1, "sender.id": 1}
+  )
+  messages = [doc async for doc in cursor if isinstance(doc.get("timestamp"), datetime)]
 
-  async for server_doc in servers_cursor:
-    for cat in server_doc.get("categories", []):
-      for ch in cat.get("channels", []):
-        channel_ids.add(ch["id"])
+  await _ensure_read_positions(channel_id)
+  counts = read_positions.seen_counts(
+    channel_id,
+    [(doc["timestamp"], (doc.get("sender") or {}).get("id")) for doc in messages]
+  )
 
-  # Add DM channels
-  dm_cursor = dm_channels_col.find({"participants": current_user.id})
-  async for dm_doc in dm_cursor:
-    channel_ids.add(dm_doc["_id"])
+  return ReadCountsResponse(
+    channel_id=channel_id,
+    counts={doc["_id"]: count for doc, count in zip(messages, counts)}
+  )
 
-  # Count unread messages for each channel
-  for channel_id in channel_ids:
-    last_read = last_reads.get(channel_id)
 
-    # Build query for messages newer than last read
-    msg_query = {
-      "channel_id": channel_id,
-      "is_deleted": {"$ne": True}
-    }
+@fastapi_app.get("/unreads", response_model=UnreadCountsResponse)
+async def get_unread_counts(
+    current_user: User = Depends(get_current_user)
+):
+  """전체 채널의 미읽음 카운트 조회
 
-    if last_read:
-      msg_query["timestamp"] = {"$gt": last_read}
+  메시지 팬아웃 시 증분 갱신되는 user_channel_reads.unread_count를
+  부분 인덱스(user_unread_partial)로 한 번에 조회한다.
+  """
+  cursor = user_channel_reads_col.find(
+    {"user_id": current_user.id, "unread_count": {"$gt": 0}},
+    {"channel_id": 1, "unread_count": 1, "has_mention": 1}
+  )
 
-    # Count total unread
-    unread_count = await messages_col.count_documents(msg_query)
+  # 버퍼에만 있고 아직 DB에 반영되지 않은 읽음 처리는 미읽음에서 제외
+  pending_reads = read_receipts.pending_channels(current_user.id)
+  read_docs = [doc async for doc in cursor if doc["channel_id"] not in pending_reads]
 
-    # Check if any are mentions
-    mention_query = msg_query.copy()
-    mention_query["content"] = {"$regex": f"@{current_user.username}", "$options": "i"}
-    has_mention = await messages_col.count_documents(mention_query) > 0
+  # 추방/비공개 전환 등으로 더 이상 볼 수 없는 서버 채널 제외 (권한 비트 일괄 평가)
+  server_channel_ids = [doc["channel_id"] for doc in read_docs if not doc["channel_id"].startswith("dm_")]
+  readable = set()
+  if server_channel_ids:
+    readable = set(await permission_resolver.readable_channels(current_user.id, channel_ids=server_channel_ids))
 
-    if unread_count > 0:
-      unreads.append(UnreadCount(
-        channel_id=channel_id,
-        count=unread_count,
-        has_mention=has_mention
-      ))
+  unreads = []
+  for read_doc in read_docs:
+    if not read_doc["channel_id"].startswith("dm_") and read_doc["channel_id"] not in readable:
+      continue
+    unreads.append(UnreadCount(
+      channel_id=read_doc["channel_id"],
+      count=read_doc["unread_count"],
+      has_mention=read_doc.get("has_mention", False)
+    ))
 
   return UnreadCountsResponse(unreads=unreads)
 
@@ -4480,6 +5349,7 @@ async def update_notification_settings(
     {"$set": settings.model_dump()},
     upsert=True
   )
+  cache_bus.invalidate("notification_settings", user_id=current_user.id)
 
   return settings
 
@@ -4522,6 +5392,7 @@ async def set_channel_notification_level(
     {"$set": settings_doc},
     upsert=True
   )
+  cache_bus.invalidate("notification_settings", user_id=current_user.id)
 
   return {"success": True, "channel_id": channel_id, "level": level}
 
@@ -4530,9 +5401,11 @@ async def set_channel_notification_level(
 async def get_my_mentions(
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-  """내가 언급된 알림 목록 조회"""
+  """내가 언급된 알림 목록 조회 (cursor가 있으면 offset 대신 키셋 페이지네이션)"""
+  limit = max(1, min(limit, 100))
   # Query notifications where user was mentioned
   query = {
     "user_id": current_user.id,
@@ -4542,10 +5415,17 @@ async def get_my_mentions(
 
   total = await notifications_col.count_documents(query)
 
-  notifications_cursor = notifications_col.find(query).sort("created_at", -1).skip(offset).limit(limit)
+  try:
+    page_query = keyset_filter(query, cursor)
+  except ValueError:
+    raise HTTPException(status_code=400, detail="Invalid cursor")
+  notifications_cursor = notifications_col.find(page_query).sort(KEYSET_SORT)
+  if not cursor and offset:
+    notifications_cursor = notifications_cursor.skip(offset)
+  docs = await notifications_cursor.limit(limit).to_list(length=limit)
 
   mentions = []
-  async for notif_doc in notifications_cursor:
+  for notif_doc in docs:
     mentions.append(Notification(
       id=notif_doc["_id"],
       user_id=notif_doc["user_id"],
@@ -4558,7 +5438,7 @@ async def get_my_mentions(
       created_at=notif_doc["created_at"]
     ))
 
-  return MentionsResponse(mentions=mentions, total=total)
+  return MentionsResponse(mentions=mentions, total=total, next_cursor=next_cursor(docs, limit))
 
 
 @fastapi_app.post("/notifications/{notification_id}/mark-read")
@@ -4582,7 +5462,7 @@ async def mark_notification_as_read(
 async def mark_all_notifications_as_read(
     current_user: User = Depends(get_current_user)
 ):
-  """모든 알림을 읽음으로 표시"""
+  """모든 알림을 읽음으로 표시 (안 읽은 알림 부분 인덱스 user_unread_partial 사용)"""
   await notifications_col.update_many(
     {"user_id": current_user.id, "read": False},
     {"$set": {"read": True}}
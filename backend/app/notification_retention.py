@@ -0,0 +1,122 @@
+"""
+Notification Retention
+알림 보존 정책과 목록 페이지네이션
+
+- notifications / login_sessions / password_reset_tokens 는 TTL 인덱스로 만료시킨다.
+- 읽은 지 오래된 알림은 (사용자, 일자)별 롤업 문서로 압축하고 원본을 지운다.
+- 알림 목록은 (created_at, _id) 키셋 커서로 페이지네이션한다.
+"""
+import base64
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+
+def encode_cursor(created_at: datetime, notification_id: str) -> str:
+  raw = f"{created_at.isoformat()}|{notification_id}"
+  return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, str]]:
+  try:
+    raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+    created_at, notification_id = raw.split("|", 1)
+    return datetime.fromisoformat(created_at), notification_id
+  except (ValueError, UnicodeDecodeError):
+    return None
+
+
+def keyset_filter(query: Dict, cursor: Optional[str]) -> Dict:
+  """created_at 내림차순 목록에서 cursor 다음 페이지 조건 추가 (잘못된 cursor는 ValueError)"""
+  if not cursor:
+    return query
+  decoded = decode_cursor(cursor)
+  if decoded is None:
+    raise ValueError("invalid cursor")
+  created_at, notification_id = decoded
+  return {
+    **query,
+    "$or": [
+      {"created_at": {"$lt": created_at}},
+      {"created_at": created_at, "_id": {"$lt": notification_id}},
+    ],
+  }
+
+
+KEYSET_SORT = [("created_at", -1), ("_id", -1)]
+
+
+def next_cursor(docs: List[Dict], limit: int) -> Optional[str]:
+  if len(docs) < limit:
+    return None
+  last = docs[-1]
+  return encode_cursor(last["created_at"], last["_id"])
+
+
+async def ensure_retention_indexes(notifications_col, rollups_col, login_sessions_col, password_reset_tokens_col,
+                                   notification_days: int, rollup_days: int, login_session_days: int):
+  # 알림: 보존 기간이 지나면 읽음 여부와 무관하게 만료
+  await notifications_col.create_index(
+    [("created_at", 1)], name="notif_ttl", expireAfterSeconds=notification_days * 86400
+  )
+  # 키셋 목록 조회용
+  await notifications_col.create_index(
+    [("user_id", 1), ("created_at", -1), ("_id", -1)], name="user_created_keyset"
+  )
+  # 안 읽은 알림만 인덱싱 (모두 읽음 처리, 안 읽은 목록, 재접속 다이제스트)
+  await notifications_col.create_index(
+    [("user_id", 1), ("created_at", -1)],
+    name="user_unread_partial",
+    partialFilterExpression={"read": False},
+  )
+  await rollups_col.create_index([("user_id", 1), ("day", -1)], name="user_day", unique=True)
+  await rollups_col.create_index([("day", 1)], name="rollup_ttl", expireAfterSeconds=rollup_days * 86400)
+  await login_sessions_col.create_index(
+    [("timestamp", 1)], name="login_session_ttl", expireAfterSeconds=login_session_days * 86400
+  )
+  await login_sessions_col.create_index([("user_id", 1), ("ip_address", 1), ("timestamp", -1)], name="user_ip_time")
+  # 재설정 토큰: expires_at 시각에 바로 만료
+  await password_reset_tokens_col.create_index([("expires_at", 1)], name="reset_token_ttl", expireAfterSeconds=0)
+
+
+async def compact_read_notifications(notifications_col, rollups_col, older_than: datetime,
+                                     batch_size: int = 1000) -> int:
+  """older_than 이전에 만들어진 읽은 알림을 (사용자, 일자) 롤업으로 합치고 삭제 - 압축한 개수 반환"""
+  compacted = 0
+  while True:
+    cursor = notifications_col.find(
+      {"read": True, "created_at": {"$lt": older_than}},
+      {"user_id": 1, "type": 1, "channel_id": 1, "created_at": 1},
+    ).limit(batch_size)
+    docs = [doc async for doc in cursor]
+    if not docs:
+      return compacted
+
+    increments: Dict[Tuple[str, datetime], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for doc in docs:
+      created_at = doc["created_at"]
+      day = datetime(created_at.year, created_at.month, created_at.day)
+      counts = increments[(doc["user_id"], day)]
+      counts["total"] += 1
+      counts[f"by_type.{doc.get('type', 'unknown')}"] += 1
+      if doc.get("channel_id"):
+        counts[f"by_channel.{doc['channel_id']}"] += 1
+
+    operations = [
+      UpdateOne({"user_id": user_id, "day": day}, {"$inc": dict(counts)}, upsert=True)
+      for (user_id, day), counts in increments.items()
+    ]
+    # 롤업 반영 후 원본 삭제 (삭제 전에 중단되면 다음 실행에서 한 번 더 집계될 수 있음)
+    await rollups_col.bulk_write(operations, ordered=False)
+    await notifications_col.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+    compacted += len(docs)
+    if len(docs) < batch_size:
+      return compacted
+
+
+def rollup_cutoff(now: datetime, days: int) -> datetime:
+  """days일 전 자정 (롤업은 하루 단위로 끊어서 만든다)"""
+  cutoff = now - timedelta(days=days)
+  return cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -0,0 +1,98 @@
+"""
+Notification Settings
+알림 설정 캐시와 발송 여부 판단
+
+- 알림 팬아웃 시 수신자들의 설정을 메모리 캐시에서 읽고, 캐시에 없거나 TTL이 지난 사용자만
+  한 번의 $in 쿼리로 채운다. 설정 변경 API에서 invalidate 한다.
+- invalidate는 사용자별 세대 번호를 올린다. 조회 도중 무효화된 사용자의 결과는 캐시에 넣지 않아
+  옛 값이 다시 들어가지 않는다. 다른 워커에는 CacheBus로 알리고, 놓친 경우에도 TTL 안에 반영된다.
+- 서버 음소거 / 채널 레벨 "nothing"은 모든 알림을, "mentions"는 키워드 알림을 막는다.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+DEFAULT_SETTINGS = {"channels": {}, "muted_servers": frozenset()}
+
+
+def _compact(settings_doc: Optional[Dict]) -> Dict:
+  """notification_settings 문서 -> 판단에 필요한 필드만"""
+  if not settings_doc:
+    return DEFAULT_SETTINGS
+  return {
+    "channels": {
+      ch["channel_id"]: ch.get("level", "all")
+      for ch in settings_doc.get("channels", [])
+      if ch.get("channel_id")
+    },
+    "muted_servers": frozenset(
+      sv["server_id"] for sv in settings_doc.get("servers", []) if sv.get("muted")
+    ),
+  }
+
+
+def allows(settings: Dict, notif_type: str, channel_id: str, server_id: Optional[str] = None) -> bool:
+  """이 알림을 저장/전송해야 하는지"""
+  if server_id and server_id in settings["muted_servers"]:
+    return False
+  level = settings["channels"].get(channel_id, "all")
+  if level == "nothing":
+    return False
+  if level == "mentions":
+    return notif_type == "mention"
+  return True
+
+
+class NotificationSettingsCache:
+  """사용자별 알림 설정 LRU + TTL 캐시"""
+
+  def __init__(self, collection, ttl: float = 30.0, max_users: int = 10000):
+    self.collection = collection
+    self.ttl = ttl
+    self.max_users = max_users
+    self.entries: "OrderedDict[str, tuple]" = OrderedDict()  # user_id -> (만료 시각, 설정)
+    self.generations: Dict[str, int] = {}  # user_id -> 무효화 횟수 (조회 중 무효화 감지)
+    self.epoch = 0  # clear 횟수
+
+  def _fresh(self, user_id: str, now: float) -> Optional[Dict]:
+    item = self.entries.get(user_id)
+    if item is None or item[0] < now:
+      return None
+    return item[1]
+
+  async def get_many(self, user_ids: Iterable[str]) -> Dict[str, Dict]:
+    user_ids = set(user_ids)
+    now = time.monotonic()
+    result = {}
+    missing = []
+    for uid in user_ids:
+      settings = self._fresh(uid, now)
+      if settings is None:
+        missing.append(uid)
+      else:
+        self.entries.move_to_end(uid)
+        result[uid] = settings
+    if missing:
+      epoch = self.epoch
+      generations = {uid: self.generations.get(uid, 0) for uid in missing}
+      loaded = {uid: DEFAULT_SETTINGS for uid in missing}
+      async for doc in self.collection.find({"user_id": {"$in": missing}}):
+        loaded[doc["user_id"]] = _compact(doc)
+      expires_at = time.monotonic() + self.ttl
+      for uid, settings in loaded.items():
+        result[uid] = settings
+        if self.epoch == epoch and self.generations.get(uid, 0) == generations[uid]:
+          self.entries[uid] = (expires_at, settings)
+          self.entries.move_to_end(uid)
+    while len(self.entries) > self.max_users:
+      self.entries.popitem(last=False)
+    return result
+
+  def invalidate(self, user_id: str):
+    self.entries.pop(user_id, None)
+    self.generations[user_id] = self.generations.get(user_id, 0) + 1
+
+  def clear(self):
+    self.entries.clear()
+    self.generations.clear()
+    self.epoch += 1
@@ -0,0 +1,180 @@
+"""
+Password Hasher
+비밀번호 해싱/검증 프로세스 풀 + 로그인 IP별 허용 제어
+
+- bcrypt_sha256은 호출당 수백 ms의 CPU를 쓰므로 이벤트 루프 대신 별도 프로세스 풀에서 실행한다.
+- 동시에 풀에 넣는 작업은 workers개로 제한하고, 그 뒤에 기다리는 요청이 max_queue를 넘으면
+  HasherBusy를 던져 바로 거절한다 (대기열이 끝없이 길어져 채팅 요청까지 밀리지 않도록).
+- LoginAdmission은 IP별 토큰 버킷(분당 rate, burst)과 IP별 동시 검증 수로 로그인 시도를 거른다.
+  토큰은 실패한 시도(비밀번호 / 2FA 코드 오류)만 쓰므로, NAT / 프록시 뒤의 여러 사용자가 정상 로그인하는 것은
+  동시 검증 수 외에는 막지 않는다.
+- stats / report()로 대기 중 요청 수, 최대 대기열, 평균 대기/실행 시간, 거절 수를 노출한다.
+"""
+import asyncio
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from passlib.context import CryptContext
+
+SCHEMES = ["bcrypt_sha256"]
+
+_context: Optional[CryptContext] = None
+
+
+def _crypt_context() -> CryptContext:
+  global _context
+  if _context is None:
+    _context = CryptContext(schemes=SCHEMES, deprecated="auto")
+  return _context
+
+
+def _hash(password: str) -> str:
+  return _crypt_context().hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+  try:
+    return _crypt_context().verify(password, hashed)
+  except (ValueError, TypeError):
+    # 비어 있거나 형식이 다른 해시
+    return False
+
+
+class HasherBusy(Exception):
+  """해싱 대기열이 가득 참"""
+
+
+class PasswordHasher:
+  """bcrypt 작업용 프로세스 풀 (동시 실행 제한 + 대기열 상한)"""
+
+  def __init__(self, workers: int = 2, max_queue: int = 64):
+    self.workers = workers
+    self.max_queue = max_queue
+    self._executor: Optional[ProcessPoolExecutor] = None
+    self._slots: Optional[asyncio.Semaphore] = None
+    self.waiting = 0
+    self.running = 0
+    self.stats = {"hashed": 0, "verified": 0, "rejected": 0, "max_waiting": 0,
+                  "wait_ms_total": 0.0, "run_ms_total": 0.0}
+
+  def start(self):
+    if self._executor is None:
+      # 이벤트 루프/DB 드라이버 스레드를 가진 프로세스를 fork하지 않도록 spawn
+      self._executor = ProcessPoolExecutor(
+        max_workers=self.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_crypt_context,
+      )
+
+  def stop(self):
+    if self._executor is not None:
+      self._executor.shutdown(wait=False, cancel_futures=True)
+      self._executor = None
+
+  async def _run(self, func, *args):
+    if self.waiting >= self.max_queue:
+      self.stats["rejected"] += 1
+      raise HasherBusy()
+    self.start()
+    if self._slots is None:
+      self._slots = asyncio.Semaphore(self.workers)
+
+    queued_at = time.perf_counter()
+    self.waiting += 1
+    self.stats["max_waiting"] = max(self.stats["max_waiting"], self.waiting)
+    try:
+      await self._slots.acquire()
+    finally:
+      self.waiting -= 1
+    started_at = time.perf_counter()
+    self.stats["wait_ms_total"] += (started_at - queued_at) * 1000
+    self.running += 1
+    try:
+      return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+    finally:
+      self.running -= 1
+      self.stats["run_ms_total"] += (time.perf_counter() - started_at) * 1000
+      self._slots.release()
+
+  async def hash(self, password: str) -> str:
+    hashed = await self._run(_hash, password)
+    self.stats["hashed"] += 1
+    return hashed
+
+  async def verify(self, password: str, hashed: str) -> bool:
+    ok = await self._run(_verify, password, hashed)
+    self.stats["verified"] += 1
+    return ok
+
+  def report(self) -> Dict:
+    done = self.stats["hashed"] + self.stats["verified"]
+    return {
+      **{k: v for k, v in self.stats.items() if not k.endswith("_total")},
+      "workers": self.workers,
+      "max_queue": self.max_queue,
+      "waiting": self.waiting,
+      "running": self.running,
+      "avg_wait_ms": round(self.stats["wait_ms_total"] / done, 2) if done else 0.0,
+      "avg_run_ms": round(self.stats["run_ms_total"] / done, 2) if done else 0.0,
+    }
+
+
+class LoginAdmission:
+  """IP별 로그인 시도 토큰 버킷 + 동시 검증 수 제한"""
+
+  def __init__(self, rate_per_minute: float = 10.0, burst: int = 10, max_concurrent: int = 4,
+               max_ips: int = 100000):
+    self.rate = rate_per_minute / 60.0
+    self.burst = burst
+    self.max_concurrent = max_concurrent
+    self.max_ips = max_ips
+    self.buckets: "OrderedDict[str, list]" = OrderedDict()  # ip -> [tokens, updated_at]
+    self.in_flight: Dict[str, int] = {}
+    self.stats = {"admitted": 0, "failed": 0, "rate_limited": 0, "concurrency_limited": 0}
+
+  def _refill(self, ip: str) -> list:
+    now = time.monotonic()
+    bucket = self.buckets.get(ip)
+    if bucket is None:
+      bucket = [float(self.burst), now]
+      self.buckets[ip] = bucket
+    else:
+      bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+      bucket[1] = now
+    self.buckets.move_to_end(ip)
+    while len(self.buckets) > self.max_ips:
+      self.buckets.popitem(last=False)
+    return bucket
+
+  def admit(self, ip: str) -> Optional[float]:
+    """허용하면 None, 거절하면 재시도까지 기다릴 초 (토큰은 fail()에서만 쓴다)"""
+    if self.in_flight.get(ip, 0) >= self.max_concurrent:
+      self.stats["concurrency_limited"] += 1
+      return 1.0
+
+    bucket = self._refill(ip)
+    if bucket[0] < 1:
+      self.stats["rate_limited"] += 1
+      return (1 - bucket[0]) / self.rate if self.rate else 60.0
+    self.in_flight[ip] = self.in_flight.get(ip, 0) + 1
+    self.stats["admitted"] += 1
+    return None
+
+  def fail(self, ip: str):
+    """실패한 로그인 시도 - 토큰 하나를 쓴다"""
+    bucket = self._refill(ip)
+    bucket[0] = max(0.0, bucket[0] - 1)
+    self.stats["failed"] += 1
+
+  def release(self, ip: str):
+    count = self.in_flight.get(ip, 0) - 1
+    if count > 0:
+      self.in_flight[ip] = count
+    else:
+      self.in_flight.pop(ip, None)
+
+  def report(self) -> Dict:
+    return {**self.stats, "tracked_ips": len(self.buckets), "in_flight": sum(self.in_flight.values())}
@@ -0,0 +1,101 @@
+"""
+Permission Bits
+채널 권한 비트마스크와 일괄 평가
+
+- 권한은 VIEW(1) / POST(2) 두 비트다.
+- 채널의 is_private / allowed_roles / post_permission을 역할별 2비트씩 묶은 정수 하나(perm_mask)로
+  컴파일해 server_channels 문서에 저장한다 (owner, admin, moderator, member 순서).
+- allowed_members는 사용자별 덮어쓰기라서 마스크에 넣지 않고 VIEW 비트만 더한다.
+- POST는 VIEW가 있을 때만 유효하다.
+- evaluate는 채널 N개에 대해 (마스크 >> 역할 시프트) & ALL을 numpy 배열 연산 한 번으로 계산한다.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+VIEW = 1
+POST = 2
+ALL = VIEW | POST
+
+ROLES = ("owner", "admin", "moderator", "member")
+ROLE_BITS = 2
+ROLE_SHIFT = {role: i * ROLE_BITS for i, role in enumerate(ROLES)}
+ADMIN_ROLES = ("owner", "admin")
+
+
+def role_shift(role: Optional[str]) -> int:
+  """알 수 없는 역할은 member로 본다"""
+  return ROLE_SHIFT.get(role or "member", ROLE_SHIFT["member"])
+
+
+def _role_bits(is_private: bool, allowed_roles: Iterable[str], post_permission: str, role: str) -> int:
+  bits = 0
+  if not is_private or role in allowed_roles or role in ADMIN_ROLES:
+    bits |= VIEW
+  if post_permission == "admin_only":
+    postable = role in ADMIN_ROLES
+  elif post_permission == "owner_only":
+    postable = role == "owner"
+  else:
+    postable = True
+  if postable:
+    bits |= POST
+  return bits
+
+
+def compile_mask(is_private: bool, allowed_roles: Iterable[str], post_permission: str) -> int:
+  """채널 권한 필드 -> 역할별 권한 비트를 묶은 정수"""
+  allowed_roles = set(allowed_roles or ())
+  mask = 0
+  for role in ROLES:
+    mask |= _role_bits(is_private, allowed_roles, post_permission or "everyone", role) << ROLE_SHIFT[role]
+  return mask
+
+
+def channel_mask(channel: Dict) -> int:
+  """채널 dict의 perm_mask (옛 문서처럼 없으면 필드에서 컴파일)"""
+  mask = channel.get("perm_mask")
+  if mask is None:
+    mask = compile_mask(
+      channel.get("is_private", False), channel.get("allowed_roles") or (),
+      channel.get("post_permission", "everyone"),
+    )
+  return mask
+
+
+def channel_bits(mask: int, role: Optional[str], is_allowed_member: bool = False) -> int:
+  """채널 하나에 대한 사용자 권한 비트"""
+  bits = (mask >> role_shift(role)) & ALL
+  if is_allowed_member:
+    bits |= VIEW
+  return bits if bits & VIEW else 0
+
+
+def evaluate(masks: np.ndarray, shifts: np.ndarray, allowed_member: np.ndarray) -> np.ndarray:
+  """채널 N개에 대한 권한 비트 배열 (masks / shifts / allowed_member는 같은 길이)"""
+  bits = (masks >> shifts) & ALL
+  bits |= allowed_member.astype(np.int64) * VIEW
+  return np.where(bits & VIEW, bits, 0)
+
+
+def evaluate_channels(channels: List[Dict], user_id: str, roles: Dict[str, str]) -> np.ndarray:
+  """채널 dict 목록(server_id / perm_mask / allowed_members)에 대해 사용자의 권한 비트 배열
+
+  roles는 서버 ID -> 사용자 역할이며, 멤버가 아닌 서버의 채널은 0이다.
+  """
+  count = len(channels)
+  shift_by_server = {server_id: role_shift(role) for server_id, role in roles.items() if role is not None}
+  server_ids = [channel.get("server_id") for channel in channels]
+  member = np.fromiter((server_id in shift_by_server for server_id in server_ids), dtype=bool, count=count)
+  masks = np.fromiter((channel_mask(channel) for channel in channels), dtype=np.int64, count=count)
+  shifts = np.fromiter((shift_by_server.get(server_id, 0) for server_id in server_ids), dtype=np.int64, count=count)
+  allowed_member = np.fromiter(
+    (user_id in (channel.get("allowed_members") or ()) for channel in channels), dtype=bool, count=count
+  )
+  # 멤버가 아닌 서버의 채널은 마스크와 allowed_members를 모두 지운다
+  return evaluate(np.where(member, masks, 0), shifts, allowed_member & member)
+
+
+def select(channels: List[Dict], bits: np.ndarray, required: int = VIEW) -> List[str]:
+  """required 비트를 모두 가진 채널 ID 목록"""
+  return [channels[i]["id"] for i in np.flatnonzero((bits & required) == required)]
@@ -0,0 +1,261 @@
+"""
+Permission Resolver
+(사용자, 채널)별 유효 권한 캐시
+
+- 서버 역할은 서버 문서 전체 대신 $elemMatch 프로젝션으로 호출자 멤버 항목 하나만 읽고,
+  (server_id, user_id) 키로 캐시한다. 멤버가 아니면 None을 캐시한다.
+- 채널의 권한 비트마스크(perm_mask)와 allowed_members는 채널 ID 키로 캐시한다.
+- 둘을 합친 유효 권한(역할, 멤버 여부, 권한 비트)을 (user_id, channel_id) 키로 캐시한다.
+- 여러 채널을 한 번에 물을 때(/state, /unreads, 검색, RAG 범위)는 readable_channels가
+  역할 조회 1회 + 채널 조회 1회 후 permission_bits.evaluate로 일괄 평가한다.
+- 모든 항목은 TTL이 지나면 다시 읽고, 역할 변경 / 초대 / 추방은 invalidate_member,
+  채널 권한 수정 / 이동 / 삭제는 invalidate_channel로 즉시 무효화한다 (다른 워커에는 CacheBus로 전달).
+  Mongo를 기다리는 동안 무효화가 끝나면 읽은 값이 옛 값일 수 있으므로, 키별 무효화 횟수(generation)가
+  조회 전과 달라졌으면 결과를 돌려주기만 하고 캐시에는 넣지 않는다.
+"""
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .permission_bits import POST, VIEW, channel_bits, channel_mask, evaluate_channels, select
+
+
+class ChannelPermission:
+  """사용자 한 명의 채널 하나에 대한 유효 권한"""
+
+  __slots__ = ("server_id", "role", "is_member", "bits", "can_view", "can_post")
+
+  def __init__(self, server_id: str, role: Optional[str], channel: Dict, user_id: str):
+    self.server_id = server_id
+    self.role = role
+    self.is_member = role is not None
+    self.bits = channel_bits(channel["perm_mask"], role, user_id in channel["allowed_members"]) if self.is_member else 0
+    self.can_view = bool(self.bits & VIEW)
+    self.can_post = bool(self.bits & POST)
+
+
+class _TTLCache:
+  """TTL이 있는 LRU"""
+
+  def __init__(self, ttl: float, max_entries: int):
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self.entries: "OrderedDict" = OrderedDict()
+
+  def get(self, key):
+    item = self.entries.get(key)
+    if item is None:
+      return False, None
+    expires_at, value = item
+    if expires_at < time.monotonic():
+      del self.entries[key]
+      return False, None
+    self.entries.move_to_end(key)
+    return True, value
+
+  def put(self, key, value) -> List[Tuple]:
+    """저장 후 LRU로 밀려난 (키, 값) 목록 반환"""
+    self.entries[key] = (time.monotonic() + self.ttl, value)
+    self.entries.move_to_end(key)
+    evicted = []
+    while len(self.entries) > self.max_entries:
+      old_key, (_, old_value) = self.entries.popitem(last=False)
+      evicted.append((old_key, old_value))
+    return evicted
+
+  def pop(self, key):
+    item = self.entries.pop(key, None)
+    return item[1] if item else None
+
+
+class PermissionResolver:
+  """서버 역할 / 채널 권한 / (사용자, 채널) 유효 권한 캐시"""
+
+  def __init__(self, servers_col, server_store, ttl: float = 60.0, max_entries: int = 20000):
+    self.servers = servers_col
+    self.store = server_store
+    self.roles = _TTLCache(ttl, max_entries)
+    self.channels = _TTLCache(ttl, max_entries)
+    self.effective = _TTLCache(ttl, max_entries)
+    # 무효화용 역인덱스: (server_id, user_id) / channel_id -> effective 키
+    self.member_keys: Dict[Tuple[str, str], Set[Tuple[str, str]]] = defaultdict(set)
+    self.channel_keys: Dict[str, Set[Tuple[str, str]]] = defaultdict(set)
+    # 무효화 횟수 (조회 중 무효화 감지): (server_id, user_id) / user_id / channel_id, clear()는 epoch
+    self.member_generations: Dict[Tuple[str, str], int] = {}
+    self.user_generations: Dict[str, int] = {}
+    self.channel_generations: Dict[str, int] = {}
+    self.epoch = 0
+    self.stats = {"hits": 0, "misses": 0, "role_loads": 0, "channel_loads": 0, "invalidations": 0}
+
+  async def role(self, server_id: str, user_id: str) -> Optional[str]:
+    """서버에서 사용자의 역할 (멤버가 아니거나 서버가 없으면 None)"""
+    found, role = self.roles.get((server_id, user_id))
+    if found:
+      return role
+    self.stats["role_loads"] += 1
+    generation = self._member_generation(server_id, user_id)
+    doc = await self.servers.find_one(
+      {"_id": server_id},
+      {"members": {"$elemMatch": {"id": user_id}}},
+    )
+    members = (doc or {}).get("members") or []
+    role = members[0].get("role", "member") if members else None
+    if self._member_generation(server_id, user_id) == generation:
+      self.roles.put((server_id, user_id), role)
+    return role
+
+  async def has_role(self, server_id: str, user_id: str, roles: Iterable[str]) -> bool:
+    return await self.role(server_id, user_id) in roles
+
+  async def is_member(self, server_id: str, user_id: str) -> bool:
+    return await self.role(server_id, user_id) is not None
+
+  async def roles_for(self, user_id: str, server_ids: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """사용자가 멤버인 서버 -> 역할 (server_ids가 없으면 가입한 모든 서버). 결과는 역할 캐시에도 넣는다"""
+    query: Dict = {"members.id": user_id}
+    if server_ids is not None:
+      query["_id"] = {"$in": list(server_ids)}
+    self.stats["role_loads"] += 1
+    generation = (self.epoch, self.user_generations.get(user_id, 0))
+    roles = {}
+    async for doc in self.servers.find(query, {"members": {"$elemMatch": {"id": user_id}}}):
+      roles[doc["_id"]] = (doc.get("members") or [{}])[0].get("role", "member")
+    if (self.epoch, self.user_generations.get(user_id, 0)) != generation:
+      return roles
+    for server_id, role in roles.items():
+      self.roles.put((server_id, user_id), role)
+    if server_ids is not None:
+      for server_id in set(server_ids) - roles.keys():
+        self.roles.put((server_id, user_id), None)
+    return roles
+
+  async def readable_channels(self, user_id: str, server_ids: Optional[Iterable[str]] = None,
+                              channel_ids: Optional[Iterable[str]] = None, required: int = VIEW) -> List[str]:
+    """required 권한 비트를 가진 서버 채널 ID 목록 (일괄 평가)
+
+    server_ids / channel_ids로 범위를 좁힐 수 있고, 둘 다 없으면 가입한 모든 서버의 채널이다.
+    """
+    if channel_ids is not None:
+      channels = await self.store.channel_permissions(channel_ids=channel_ids)
+      roles = await self.roles_for(user_id, {ch["server_id"] for ch in channels})
+    else:
+      roles = await self.roles_for(user_id, server_ids)
+      channels = await self.store.channel_permissions(server_ids=roles.keys())
+    if not channels:
+      return []
+    return select(channels, evaluate_channels(channels, user_id, roles), required)
+
+  async def _channel(self, channel_id: str, channel: Optional[Dict]) -> Optional[Dict]:
+    found, cached = self.channels.get(channel_id)
+    if found:
+      return cached
+    generation = self._channel_generation(channel_id)
+    if channel is None:
+      self.stats["channel_loads"] += 1
+      channel = await self.store.get_channel(channel_id)
+    if channel is not None:
+      channel = {
+        "server_id": channel.get("server_id"),
+        "perm_mask": channel_mask(channel),
+        "allowed_members": frozenset(channel.get("allowed_members") or ()),
+      }
+    if self._channel_generation(channel_id) == generation:
+      self.channels.put(channel_id, channel)
+    return channel
+
+  async def for_channel(self, user_id: str, channel_id: str,
+                        channel: Optional[Dict] = None) -> Optional[ChannelPermission]:
+    """(사용자, 채널) 유효 권한 - 채널이 없으면 None
+
+    이미 읽어 둔 채널 dict(server_id 포함)를 넘기면 캐시 미스 때 채널을 다시 읽지 않는다.
+    """
+    key = (user_id, channel_id)
+    found, permission = self.effective.get(key)
+    if found:
+      self.stats["hits"] += 1
+      return permission
+    self.stats["misses"] += 1
+
+    channel_generation = self._channel_generation(channel_id)
+    channel = await self._channel(channel_id, channel)
+    if channel is None or not channel["server_id"]:
+      return None
+    server_id = channel["server_id"]
+    member_generation = self._member_generation(server_id, user_id)
+    role = await self.role(server_id, user_id)
+    permission = ChannelPermission(server_id, role, channel, user_id)
+    if (self._channel_generation(channel_id) != channel_generation
+        or self._member_generation(server_id, user_id) != member_generation):
+      return permission
+    for old_key, old_permission in self.effective.put(key, permission):
+      self._unindex(old_key, old_permission.server_id)
+    self.member_keys[(server_id, user_id)].add(key)
+    self.channel_keys[channel_id].add(key)
+    return permission
+
+  def _unindex(self, key: Tuple[str, str], server_id: str):
+    user_id, channel_id = key
+    for index, index_key in ((self.member_keys, (server_id, user_id)), (self.channel_keys, channel_id)):
+      keys = index.get(index_key)
+      if keys is not None:
+        keys.discard(key)
+        if not keys:
+          del index[index_key]
+
+  # ---------- 무효화 ----------
+
+  def _member_generation(self, server_id: str, user_id: str) -> Tuple[int, int]:
+    return self.epoch, self.member_generations.get((server_id, user_id), 0)
+
+  def _channel_generation(self, channel_id: str) -> Tuple[int, int]:
+    return self.epoch, self.channel_generations.get(channel_id, 0)
+
+  def _drop_effective(self, keys: Iterable[Tuple[str, str]]):
+    for key in list(keys):
+      permission = self.effective.pop(key)
+      if permission is not None:
+        self._unindex(key, permission.server_id)
+
+  def invalidate_member(self, server_id: str, user_id: str):
+    """역할 변경 / 초대 / 추방"""
+    self.stats["invalidations"] += 1
+    key = (server_id, user_id)
+    self.member_generations[key] = self.member_generations.get(key, 0) + 1
+    self.user_generations[user_id] = self.user_generations.get(user_id, 0) + 1
+    self.roles.pop((server_id, user_id))
+    self._drop_effective(self.member_keys.pop((server_id, user_id), ()))
+
+  def invalidate_members(self, server_id: str, user_ids: Iterable[str]):
+    for user_id in user_ids:
+      self.invalidate_member(server_id, user_id)
+
+  def invalidate_channel(self, channel_id: str):
+    """채널 권한 수정 / 이동 / 삭제"""
+    self.stats["invalidations"] += 1
+    self.channel_generations[channel_id] = self.channel_generations.get(channel_id, 0) + 1
+    self.channels.pop(channel_id)
+    self._drop_effective(self.channel_keys.pop(channel_id, ()))
+
+  def invalidate_channels(self, channel_ids: Iterable[str]):
+    for channel_id in channel_ids:
+      self.invalidate_channel(channel_id)
+
+  def clear(self):
+    self.epoch += 1
+    self.member_generations.clear()
+    self.user_generations.clear()
+    self.channel_generations.clear()
+    for cache in (self.roles, self.channels, self.effective):
+      cache.entries.clear()
+    self.member_keys.clear()
+    self.channel_keys.clear()
+
+  def report(self) -> Dict:
+    lookups = self.stats["hits"] + self.stats["misses"]
+    return {
+      **self.stats,
+      "roles": len(self.roles.entries),
+      "channels": len(self.channels.entries),
+      "effective": len(self.effective.entries),
+      "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,399 @@
+"""
+Presence Registry
+소켓 연결 단위 presence와 사용자 단위 상태 합산
+
+- sid -> (user_id, 상태, 통화 채널) / user_id -> (sid 집합, 가입 서버) 양방향 인덱스를 둔다.
+  채널 열람은 ChannelPresence(viewers)가 이 워커의 sid별로 들고 있고, disconnect 때 같이 정리한다.
+  redis가 있으면 presence:viewing:{channel_id} 해시(sid -> "user_id|시각")에도 적어 다른 워커에 붙은
+  사용자의 열람도 보이게 하고, 사용자의 첫 열람 / 마지막 열람 종료도 모든 워커 기준으로 판단한다.
+- 사용자 상태는 모든 기기(sid) 상태의 합산이다: 하나라도 online이면 online, 모두 idle이면 idle,
+  연결이 없으면 offline. 탭 하나를 닫아도 다른 탭이 남아 있으면 상태가 바뀌지 않는다.
+- 합산 상태가 바뀐 사용자만 서버별로 모아 두고 window 초마다 서버당 한 번 emit(server_id, updates)으로 보낸다.
+- redis를 넘기면 sid별 상태를 presence:user:{user_id} 해시(sid -> "상태|시각")에 저장해 여러 워커가 같은
+  상태를 본다. 각 워커는 자기 sid를 주기적으로 다시 써서 갱신하고, stale 초보다 오래된 항목(죽은 워커)은 무시한다.
+- 죽은 워커는 disconnect를 부르지 못하므로, 갱신 주기마다 reap()이 presence:announced에 남은 사용자 중
+  살아 있는 항목의 합산이 알린 상태와 다른 사용자를 찾아 다시 알린다 (대개 offline). 그 워커에서만 알던
+  사용자의 서버 목록은 servers_of 콜백으로 다시 읽는다.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .channel_membership import ChannelPresence
+
+ONLINE = "online"
+IDLE = "idle"
+OFFLINE = "offline"
+SOCKET_STATUSES = (ONLINE, IDLE)
+
+EmitCallback = Callable[[str, List[Dict]], Awaitable[None]]
+ServersCallback = Callable[[str], Awaitable[Iterable[str]]]
+
+
+def aggregate(statuses: Iterable[str]) -> str:
+  """기기별 상태 -> 사용자 상태"""
+  result = OFFLINE
+  for status in statuses:
+    if status == ONLINE:
+      return ONLINE
+    if status == IDLE:
+      result = IDLE
+  return result
+
+
+def _text(value) -> str:
+  return value.decode() if isinstance(value, bytes) else value
+
+
+class SocketPresence:
+  """연결 하나의 presence"""
+
+  __slots__ = ("user_id", "status", "calls")
+
+  def __init__(self, user_id: str):
+    self.user_id = user_id
+    self.status = ONLINE
+    self.calls: Set[str] = set()
+
+
+class PresenceRegistry:
+  """sid <-> 사용자 인덱스 + 기기별 상태 합산 + 서버별 일괄 브로드캐스트"""
+
+  def __init__(self, emit: EmitCallback, viewers: Optional[ChannelPresence] = None, window: float = 0.5,
+               redis=None, stale: float = 90.0, key_prefix: str = "presence",
+               servers_of: Optional[ServersCallback] = None, reap_batch: int = 500):
+    self.emit = emit
+    self.viewers = viewers or ChannelPresence()
+    self.window = window
+    self.redis = redis
+    self.stale = stale
+    self.key_prefix = key_prefix
+    self.servers_of = servers_of
+    self.reap_batch = reap_batch
+    self.sockets: Dict[str, SocketPresence] = {}
+    self.user_sids: Dict[str, Set[str]] = defaultdict(set)
+    self.user_servers: Dict[str, Set[str]] = defaultdict(set)  # presence를 알릴 서버
+    self.user_status: Dict[str, str] = {}  # 마지막으로 알린 합산 상태 (redis가 없을 때)
+    self.pending: Dict[str, Dict[str, str]] = {}  # server_id -> {user_id: status}
+    self.stats = {"connects": 0, "disconnects": 0, "changes": 0, "broadcasts": 0, "reaped": 0}
+    self._task: Optional[asyncio.Task] = None
+    self._last_refresh = 0.0
+
+  # ---------- 연결 ----------
+
+  async def connect(self, sid: str, user_id: str, servers: Iterable[str]) -> str:
+    """sid 등록 - 등록 전 사용자 합산 상태 반환 (offline이면 첫 기기)"""
+    previous = await self.status(user_id)
+    self.sockets[sid] = SocketPresence(user_id)
+    self.user_sids[user_id].add(sid)
+    self.user_servers[user_id].update(servers)
+    self.stats["connects"] += 1
+    await self._store(sid)
+    await self._changed(user_id)
+    return previous
+
+  async def disconnect(self, sid: str) -> Tuple[Optional[str], str, Set[str], List[Tuple[str, str]]]:
+    """sid 제거 - (user_id, 제거 후 합산 상태, 참가 중이던 통화 채널, 열람이 끝난 (채널, 사용자)) 반환"""
+    ended = []
+    for channel_id in list(self.viewers.sid_channels.get(sid, {})):
+      user_id = await self.leave_channel(sid, channel_id)
+      if user_id:
+        ended.append((channel_id, user_id))
+    entry = self.sockets.pop(sid, None)
+    if entry is None:
+      return None, OFFLINE, set(), ended
+    servers: Set[str] = set()
+    sids = self.user_sids.get(entry.user_id)
+    if sids is not None:
+      sids.discard(sid)
+      if not sids:
+        # 이 워커의 마지막 기기 - 인덱스는 지우고 offline 알림 대상만 넘긴다
+        del self.user_sids[entry.user_id]
+        servers = self.user_servers.pop(entry.user_id, set())
+    self.stats["disconnects"] += 1
+    if self.redis is not None:
+      await self.redis.hdel(self._key(entry.user_id), sid)
+    status = await self._changed(entry.user_id, servers)
+    return entry.user_id, status, entry.calls, ended
+
+  async def set_status(self, sid: str, status: str) -> bool:
+    """기기 상태 변경 (online / idle)"""
+    entry = self.sockets.get(sid)
+    if entry is None or status not in SOCKET_STATUSES or entry.status == status:
+      return False
+    entry.status = status
+    await self._store(sid)
+    await self._changed(entry.user_id)
+    return True
+
+  def add_server(self, sid: str, server_id: str):
+    entry = self.sockets.get(sid)
+    if entry is not None:
+      self.user_servers[entry.user_id].add(server_id)
+
+  def add_call(self, sid: str, channel_id: str):
+    entry = self.sockets.get(sid)
+    if entry is not None:
+      entry.calls.add(channel_id)
+
+  def remove_call(self, sid: str, channel_id: str):
+    entry = self.sockets.get(sid)
+    if entry is not None:
+      entry.calls.discard(channel_id)
+
+  async def enter_channel(self, sid: str, channel_id: str, user_id: str) -> bool:
+    """sid가 채널 열람 시작 - 사용자의 첫 열람이면 True"""
+    first = self.viewers.enter(sid, channel_id, user_id)
+    if self.redis is None:
+      return first
+    key = self._viewing_key(channel_id)
+    pipe = self.redis.pipeline()
+    pipe.hset(key, sid, f"{user_id}|{time.time()}")
+    pipe.expire(key, int(self.stale * 2))
+    pipe.hgetall(key)
+    viewers, _ = self._split_viewers((await pipe.execute())[-1])
+    return viewers.get(user_id) == {sid}
+
+  async def leave_channel(self, sid: str, channel_id: str) -> Optional[str]:
+    """sid가 채널 열람 종료 - 사용자의 마지막 열람이 끝났으면 user_id 반환"""
+    user_id = self.viewers.sid_channels.get(sid, {}).get(channel_id)
+    last = self.viewers.leave(sid, channel_id)
+    if self.redis is None or user_id is None:
+      return last
+    key = self._viewing_key(channel_id)
+    pipe = self.redis.pipeline()
+    pipe.hdel(key, sid)
+    pipe.hgetall(key)
+    viewers, _ = self._split_viewers((await pipe.execute())[-1])
+    return None if viewers.get(user_id) else user_id
+
+  # ---------- 조회 ----------
+
+  def user_of(self, sid: str) -> Optional[str]:
+    entry = self.sockets.get(sid)
+    return entry.user_id if entry else None
+
+  def sids_of(self, user_id: str) -> Set[str]:
+    """이 워커에 연결된 사용자의 sid"""
+    return set(self.user_sids.get(user_id, ()))
+
+  async def status(self, user_id: str) -> str:
+    if self.redis is None:
+      return aggregate(self.sockets[sid].status for sid in self.user_sids.get(user_id, ()))
+    return aggregate(self._live(await self.redis.hgetall(self._key(user_id))))
+
+  async def statuses(self, user_ids: Iterable[str]) -> Dict[str, str]:
+    """사용자 ID -> 합산 상태 (offline 포함)"""
+    user_ids = list(dict.fromkeys(user_ids))
+    if self.redis is None:
+      return {user_id: await self.status(user_id) for user_id in user_ids}
+    pipe = self.redis.pipeline()
+    for user_id in user_ids:
+      pipe.hgetall(self._key(user_id))
+    values = await pipe.execute()
+    return {user_id: aggregate(self._live(value)) for user_id, value in zip(user_ids, values)}
+
+  async def viewing(self, channel_id: str) -> Set[str]:
+    """지금 채널을 보고 있는 사용자 (redis면 모든 워커)"""
+    if self.redis is None:
+      return self.viewers.channel_viewers(channel_id)
+    key = self._viewing_key(channel_id)
+    viewers, stale = self._split_viewers(await self.redis.hgetall(key))
+    if stale:
+      await self.redis.hdel(key, *stale)
+    return set(viewers)
+
+  async def connected(self, user_ids: Iterable[str]) -> Set[str]:
+    """offline이 아닌 사용자"""
+    return {user_id for user_id, status in (await self.statuses(user_ids)).items() if status != OFFLINE}
+
+  async def live_sids(self, user_ids: Iterable[str]) -> Set[str]:
+    """사용자들의 살아 있는 sid (redis면 모든 워커, 죽은 워커의 sid는 빠진다)"""
+    user_ids = list(dict.fromkeys(user_ids))
+    if self.redis is None:
+      return {sid for user_id in user_ids for sid in self.user_sids.get(user_id, ())}
+    pipe = self.redis.pipeline()
+    for user_id in user_ids:
+      pipe.hgetall(self._key(user_id))
+    return {_text(sid) for value in await pipe.execute() for sid in self._split(value)[0]}
+
+  # ---------- 합산 / 브로드캐스트 ----------
+
+  async def _changed(self, user_id: str, servers: Iterable[str] = ()) -> str:
+    """합산 상태를 다시 계산하고 바뀌었으면 사용자의 서버들에 알릴 목록에 넣는다"""
+    status = await self.status(user_id)
+    if await self._announced(user_id, status) == status:
+      return status
+    self.stats["changes"] += 1
+    for server_id in set(servers) | self.user_servers.get(user_id, set()):
+      self.pending.setdefault(server_id, {})[user_id] = status
+    return status
+
+  async def _announced(self, user_id: str, status: str) -> str:
+    """마지막으로 알린 상태를 status로 바꾸고 이전 값 반환 (redis면 워커끼리 공유)"""
+    if self.redis is None:
+      previous = self.user_status.pop(user_id, OFFLINE)
+      if status != OFFLINE:
+        self.user_status[user_id] = status
+      return previous
+    key = f"{self.key_prefix}:announced"
+    pipe = self.redis.pipeline()
+    pipe.hget(key, user_id)
+    if status == OFFLINE:
+      pipe.hdel(key, user_id)
+    else:
+      pipe.hset(key, user_id, status)
+    previous = (await pipe.execute())[0]
+    if isinstance(previous, bytes):
+      previous = previous.decode()
+    return previous or OFFLINE
+
+  async def flush(self):
+    if not self.pending:
+      return
+    batch, self.pending = self.pending, {}
+    for server_id, users in batch.items():
+      updates = [{"userId": user_id, "status": status} for user_id, status in users.items()]
+      try:
+        await self.emit(server_id, updates)
+        self.stats["broadcasts"] += 1
+      except Exception as e:
+        print(f"[presence] 전송 실패: {e}")
+
+  # ---------- redis ----------
+
+  def _key(self, user_id: str) -> str:
+    return f"{self.key_prefix}:user:{user_id}"
+
+  def _viewing_key(self, channel_id: str) -> str:
+    return f"{self.key_prefix}:viewing:{channel_id}"
+
+  def _split_viewers(self, values: Dict) -> Tuple[Dict[str, Set[str]], List]:
+    """열람 항목 -> (살아 있는 항목의 user_id -> sid 집합, stale 항목의 sid 목록)"""
+    cutoff = time.time() - self.stale
+    live: Dict[str, Set[str]] = defaultdict(set)
+    stale = []
+    for sid, value in (values or {}).items():
+      user_id, _, stamp = _text(value).rpartition("|")
+      if float(stamp or 0) >= cutoff:
+        live[user_id].add(_text(sid))
+      else:
+        stale.append(sid)
+    return live, stale
+
+  def _live(self, values: Dict) -> List[str]:
+    return list(self._split(values)[0].values())
+
+  def _split(self, values: Dict) -> Tuple[Dict, List]:
+    """sid 항목 -> (살아 있는 항목의 sid -> 상태, stale 항목의 sid 목록)"""
+    cutoff = time.time() - self.stale
+    live, stale = {}, []
+    for sid, value in (values or {}).items():
+      if isinstance(value, bytes):
+        value = value.decode()
+      status, _, stamp = value.partition("|")
+      if float(stamp or 0) >= cutoff:
+        live[sid] = status
+      else:
+        stale.append(sid)
+    return live, stale
+
+  async def _store(self, sid: str):
+    if self.redis is None:
+      return
+    entry = self.sockets[sid]
+    key = self._key(entry.user_id)
+    pipe = self.redis.pipeline()
+    pipe.hset(key, sid, f"{entry.status}|{time.time()}")
+    pipe.expire(key, int(self.stale * 2))
+    await pipe.execute()
+
+  async def refresh(self):
+    """이 워커의 sid 항목 갱신 (stale 전에 다시 써야 다른 워커가 살아 있는 연결로 본다)"""
+    if self.redis is None or not self.sockets:
+      return
+    now = time.time()
+    pipe = self.redis.pipeline()
+    for sid, entry in self.sockets.items():
+      key = self._key(entry.user_id)
+      pipe.hset(key, sid, f"{entry.status}|{now}")
+      pipe.expire(key, int(self.stale * 2))
+    for sid, channels in self.viewers.sid_channels.items():
+      for channel_id, user_id in channels.items():
+        key = self._viewing_key(channel_id)
+        pipe.hset(key, sid, f"{user_id}|{now}")
+        pipe.expire(key, int(self.stale * 2))
+    await pipe.execute()
+
+  async def reap(self) -> int:
+    """죽은 워커가 남긴 사용자 상태 정리 - 다시 알린 사용자 수 반환"""
+    if self.redis is None:
+      return 0
+    reaped = 0
+    batch: List[Tuple[str, str]] = []
+    async for user_id, status in self.redis.hscan_iter(f"{self.key_prefix}:announced", count=self.reap_batch):
+      batch.append((_text(user_id), _text(status)))
+      if len(batch) >= self.reap_batch:
+        reaped += await self._reap_batch(batch)
+        batch = []
+    if batch:
+      reaped += await self._reap_batch(batch)
+    self.stats["reaped"] += reaped
+    return reaped
+
+  async def _reap_batch(self, batch: List[Tuple[str, str]]) -> int:
+    pipe = self.redis.pipeline()
+    for user_id, _ in batch:
+      pipe.hgetall(self._key(user_id))
+    values = await pipe.execute()
+
+    reaped = 0
+    cleanup = self.redis.pipeline()
+    for (user_id, announced), value in zip(batch, values):
+      live, stale = self._split(value)
+      if stale:
+        cleanup.hdel(self._key(user_id), *stale)
+      if aggregate(live.values()) == announced:
+        continue
+      servers = self.user_servers.get(user_id)
+      if not servers and self.servers_of is not None:
+        servers = await self.servers_of(user_id)
+      # _announced가 읽기+쓰기를 한 트랜잭션으로 하므로 여러 워커가 같이 정리해도 한 번만 알린다
+      await self._changed(user_id, servers or ())
+      reaped += 1
+    await cleanup.execute()
+    return reaped
+
+  # ---------- 주기 작업 ----------
+
+  async def _run(self):
+    while True:
+      await asyncio.sleep(self.window)
+      await self.flush()
+      if time.monotonic() - self._last_refresh >= self.stale / 3:
+        self._last_refresh = time.monotonic()
+        try:
+          await self.refresh()
+          await self.reap()
+        except Exception as e:
+          print(f"[presence] redis 갱신 실패: {e}")
+
+  def start(self):
+    if self._task is None:
+      self._task = asyncio.create_task(self._run())
+
+  async def stop(self):
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+    await self.flush()
+
+  def report(self) -> Dict:
+    return {
+      **self.stats,
+      "sockets": len(self.sockets),
+      "users": len(self.user_sids),
+      "pending_servers": len(self.pending),
+      "shared": self.redis is not None,
+    }
@@ -0,0 +1,59 @@
+"""
+Principal Cache
+인증된 사용자(get_current_user 결과) 캐시
+
+- 토큰의 uid(사용자 ID)를 키로 User 모델을 LRU에 보관하고, TTL이 지나면 다시 읽는다.
+- 프로필 수정 / 키워드 변경 / 계정 탈퇴 / 2FA 변경 / 비밀번호 재설정 때 invalidate로 즉시 비운다.
+- 다른 워커에는 CacheBus로 무효화를 알린다. 알림을 놓친 워커에서는 TTL만큼 옛 값이 보일 수 있어 TTL은 짧게 둔다.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class PrincipalCache:
+  """user_id -> (만료 시각, principal) LRU"""
+
+  def __init__(self, ttl: float = 30.0, max_entries: int = 10000):
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+    self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+  def get(self, user_id: str) -> Optional[Any]:
+    item = self.entries.get(user_id)
+    if item is None:
+      self.stats["misses"] += 1
+      return None
+    expires_at, principal = item
+    if expires_at < time.monotonic():
+      del self.entries[user_id]
+      self.stats["expired"] += 1
+      self.stats["misses"] += 1
+      return None
+    self.entries.move_to_end(user_id)
+    self.stats["hits"] += 1
+    return principal
+
+  def put(self, user_id: str, principal: Any):
+    self.entries[user_id] = (time.monotonic() + self.ttl, principal)
+    self.entries.move_to_end(user_id)
+    while len(self.entries) > self.max_entries:
+      self.entries.popitem(last=False)
+      self.stats["evictions"] += 1
+
+  def invalidate(self, user_id: str):
+    if self.entries.pop(user_id, None) is not None:
+      self.stats["invalidations"] += 1
+
+  def clear(self):
+    self.entries.clear()
+
+  def report(self) -> Dict:
+    lookups = self.stats["hits"] + self.stats["misses"]
+    return {
+      **self.stats,
+      "entries": len(self.entries),
+      "ttl": self.ttl,
+      "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,222 @@
+"""
+Read Receipts
+읽음 위치 write-behind 버퍼
+
+- (사용자, 채널)별 최신 읽음 시각만 메모리에 보관하고 주기적으로 bulk_write upsert 한다.
+- user_read_update 브로드캐스트는 채널 룸별로 broadcast_interval 당 한 번으로 제한하고,
+  그 사이 들어온 갱신은 사용자별 최신 값 하나로 합친다.
+- 채널별 멤버 읽음 위치를 정렬 배열로 유지해 "N명 읽음"을 이진 탐색으로 계산한다.
+  다른 워커에서 처리한 읽음은 CacheBus로 받아 같은 배열에 반영한다 (main.py의 read_position).
+- 미읽음 카운터/멘션 플래그는 읽음 시각 이후에 센 메시지(last_message_at / last_mention_at)가 없을 때만
+  0으로 되돌린다. 버퍼에 머무는 동안 새 메시지가 세어졌으면 recount로 읽음 시각 이후 메시지 수를 다시 센다.
+"""
+import asyncio
+import bisect
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+EmitCallback = Callable[[str, str, datetime], Awaitable[None]]
+RecountCallback = Callable[[str, str, datetime], Awaitable[int]]  # (user_id, channel_id, 읽음 시각) -> 미읽음 수
+
+
+def _epoch(value: datetime) -> float:
+  """datetime -> epoch 초 (Mongo에서 읽은 naive datetime은 UTC로 간주)"""
+  if value.tzinfo is None:
+    value = value.replace(tzinfo=timezone.utc)
+  return value.timestamp()
+
+
+class ReadPositionIndex:
+  """채널별 멤버 읽음 위치 정렬 배열 (지연 로드, 읽음 이벤트로 갱신, LRU로 채널 수 제한)"""
+
+  def __init__(self, max_channels: int = 2000):
+    self.max_channels = max_channels
+    self.channels: "OrderedDict[str, Tuple[List[float], Dict[str, float]]]" = OrderedDict()
+
+  def is_loaded(self, channel_id: str) -> bool:
+    return channel_id in self.channels
+
+  def load(self, channel_id: str, read_states: Dict[str, datetime]):
+    by_user = {user_id: _epoch(ts) for user_id, ts in read_states.items() if ts}
+    self.channels[channel_id] = (sorted(by_user.values()), by_user)
+    self.channels.move_to_end(channel_id)
+    while len(self.channels) > self.max_channels:
+      self.channels.popitem(last=False)
+
+  def clear(self):
+    self.channels.clear()
+
+  def update(self, channel_id: str, user_id: str, timestamp: datetime):
+    """읽음 위치 갱신 (로드된 채널만, 뒤로 가는 갱신은 무시)"""
+    entry = self.channels.get(channel_id)
+    if entry is None:
+      return
+    positions, by_user = entry
+    new_position = _epoch(timestamp)
+    old_position = by_user.get(user_id)
+    if old_position is not None:
+      if new_position <= old_position:
+        return
+      del positions[bisect.bisect_left(positions, old_position)]
+    bisect.insort(positions, new_position)
+    by_user[user_id] = new_position
+
+  def seen_counts(self, channel_id: str, messages: Iterable[Tuple[datetime, Optional[str]]]) -> List[int]:
+    """(메시지 시각, 작성자 ID) 목록마다 해당 시각 이후까지 읽은 멤버 수 (작성자 제외)"""
+    positions, by_user = self.channels[channel_id]
+    self.channels.move_to_end(channel_id)
+    total = len(positions)
+    counts = []
+    for timestamp, sender_id in messages:
+      position = _epoch(timestamp)
+      count = total - bisect.bisect_left(positions, position)
+      sender_position = by_user.get(sender_id) if sender_id else None
+      if sender_position is not None and sender_position >= position:
+        count -= 1
+      counts.append(count)
+    return counts
+
+
+class ReadReceiptBuffer:
+  """채널 읽음 처리(mark-read, channel_read 소켓 이벤트, 일괄 읽음)의 공통 경로"""
+
+  def __init__(self, collection, emit: EmitCallback, positions: Optional[ReadPositionIndex] = None,
+               recount: Optional[RecountCallback] = None,
+               flush_interval: float = 2.0, broadcast_interval: float = 1.0, tick: float = 0.25):
+    self.collection = collection
+    self.emit = emit
+    self.recount = recount
+    self.positions = positions
+    self.flush_interval = flush_interval
+    self.broadcast_interval = broadcast_interval
+    self.tick = tick
+
+    self.pending_writes: Dict[Tuple[str, str], datetime] = {}  # (user_id, channel_id) -> last_read_at
+    self.pending_broadcasts: Dict[str, Dict[str, datetime]] = {}  # channel_id -> {user_id: last_read_at}
+    self.last_broadcast: Dict[str, float] = {}  # channel_id -> monotonic time
+    self._last_flush = time.monotonic()
+    self._task: Optional[asyncio.Task] = None
+
+  def mark(self, user_id: str, channel_id: str, timestamp: datetime, broadcast: bool = True):
+    """읽음 위치 기록 - 같은 키는 가장 최근 시각만 유지"""
+    key = (user_id, channel_id)
+    current = self.pending_writes.get(key)
+    if current is None or timestamp > current:
+      self.pending_writes[key] = timestamp
+    if self.positions is not None:
+      self.positions.update(channel_id, user_id, timestamp)
+    if broadcast:
+      room = self.pending_broadcasts.setdefault(channel_id, {})
+      if user_id not in room or timestamp > room[user_id]:
+        room[user_id] = timestamp
+
+  def pending_channels(self, user_id: str) -> Set[str]:
+    """아직 DB에 반영되지 않은 사용자의 읽음 채널"""
+    return {channel_id for (uid, channel_id) in self.pending_writes if uid == user_id}
+
+  def pending_for_channel(self, channel_id: str) -> Dict[str, datetime]:
+    """아직 DB에 반영되지 않은 채널의 읽음 위치 (user_id -> last_read_at)"""
+    return {uid: ts for (uid, cid), ts in self.pending_writes.items() if cid == channel_id}
+
+  def _requeue(self, key: Tuple[str, str], timestamp: datetime):
+    current = self.pending_writes.get(key)
+    if current is None or timestamp > current:
+      self.pending_writes[key] = timestamp
+
+  async def flush(self):
+    """대기 중인 읽음 위치를 한 번의 bulk_write로 반영"""
+    if not self.pending_writes:
+      return
+    batch, self.pending_writes = self.pending_writes, {}
+    operations = [
+      UpdateOne(
+        {"user_id": user_id, "channel_id": channel_id},
+        [
+          {"$set": {"last_read_at": {"$max": ["$last_read_at", timestamp]}}},
+          # 읽음 시각 이후에 센 메시지가 있으면 카운터는 건드리지 않는다 (아래에서 다시 셈)
+          {"$set": {
+            "unread_count": {"$cond": [{"$gt": ["$last_message_at", "$last_read_at"]}, "$unread_count", 0]},
+            "has_mention": {"$cond": [{"$gt": ["$last_mention_at", "$last_read_at"]}, "$has_mention", False]},
+          }},
+        ],
+        upsert=True,
+      )
+      for (user_id, channel_id), timestamp in batch.items()
+    ]
+    try:
+      await self.collection.bulk_write(operations, ordered=False)
+    except Exception as e:
+      print(f"[read_receipts] flush 실패, 다음 주기에 재시도: {e}")
+      for key, timestamp in batch.items():
+        self._requeue(key, timestamp)
+      return
+    if self.recount is not None:
+      await self._recount_overlapping(batch)
+
+  async def _recount_overlapping(self, batch: Dict[Tuple[str, str], datetime]):
+    """읽음 시각보다 늦은 메시지가 세어진 행은 카운터를 읽음 시각 이후 메시지 수로 맞춘다"""
+    try:
+      cursor = self.collection.find(
+        {
+          "$or": [{"user_id": user_id, "channel_id": channel_id} for user_id, channel_id in batch],
+          "$expr": {"$gt": ["$last_message_at", "$last_read_at"]},
+        },
+        {"user_id": 1, "channel_id": 1, "last_message_at": 1, "last_read_at": 1},
+      )
+      rows = [row async for row in cursor]
+    except Exception as e:
+      print(f"[read_receipts] 미읽음 재계산 대상 조회 실패: {e}")
+      return
+    for row in rows:
+      key = (row["user_id"], row["channel_id"])
+      timestamp = batch[key]
+      try:
+        count = await self.recount(row["user_id"], row["channel_id"], row["last_read_at"])
+        # 센 뒤에 새 메시지가 팬아웃됐으면 다음 flush에서 다시 센다
+        result = await self.collection.update_one(
+          {"_id": row["_id"], "last_message_at": row["last_message_at"]},
+          {"$set": {"unread_count": count}},
+        )
+        if not result.matched_count:
+          self._requeue(key, timestamp)
+      except Exception as e:
+        print(f"[read_receipts] 미읽음 재계산 실패, 다음 주기에 재시도: {e}")
+        self._requeue(key, timestamp)
+
+  async def broadcast_due(self, force: bool = False):
+    """룸별 제한 간격이 지난 채널의 합쳐진 읽음 갱신 전송"""
+    now = time.monotonic()
+    for channel_id in list(self.pending_broadcasts):
+      if not force and now - self.last_broadcast.get(channel_id, 0.0) < self.broadcast_interval:
+        continue
+      updates = self.pending_broadcasts.pop(channel_id)
+      self.last_broadcast[channel_id] = now
+      for user_id, timestamp in updates.items():
+        try:
+          await self.emit(channel_id, user_id, timestamp)
+        except Exception as e:
+          print(f"[read_receipts] broadcast 실패: {e}")
+
+  async def _run(self):
+    while True:
+      await asyncio.sleep(self.tick)
+      await self.broadcast_due()
+      if time.monotonic() - self._last_flush >= self.flush_interval:
+        self._last_flush = time.monotonic()
+        await self.flush()
+
+  def start(self):
+    if self._task is None:
+      self._task = asyncio.create_task(self._run())
+
+  async def stop(self):
+    """종료 시 남은 브로드캐스트/쓰기 반영"""
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+    await self.broadcast_due(force=True)
+    await self.flush()
@@ -0,0 +1,325 @@
+"""
+Server Store
+서버 / 카테고리 / 채널 정규화 저장소
+
+- servers 컬렉션에는 이름, 아바타, 멤버 같은 얇은 문서만 남기고, 카테고리와 채널은
+  server_categories / server_channels 컬렉션에 한 문서씩 저장한다 (_id = 카테고리/채널 ID).
+- 채널 조회는 _id 하나로, 서버 전체 조회는 컬렉션당 $in 쿼리 한 번으로 끝난다.
+- 채널 멤버는 ChannelMembership(channel_members 컬렉션)에 따로 저장한다.
+- hydrate 결과는 기존 임베디드 형태({"categories": [{"channels": [...]}]})와 같아서
+  _server_doc_to_model 등 기존 변환 코드를 그대로 쓴다.
+- 아직 categories 배열을 가진 서버 문서는 migrate_all(시작 시 / migrate_normalize_channels.py)로 옮긴다
+  (여러 번 실행해도 안전). 조회 경로에서는 옮기지 않고, 옮기기 전 문서는 임베디드 형태 그대로 돌려준다.
+- 카테고리/채널을 바꾸는 메서드는 서버 문서의 version을 올린다 (/state 캐시 키).
+- 채널 문서에는 권한 필드를 컴파일한 perm_mask(permission_bits)를 같이 저장한다.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+
+from .permission_bits import channel_mask, compile_mask
+
+CATEGORY_FIELDS = ("name", "collapsed")
+CHANNEL_FIELDS = ("name", "is_private", "allowed_roles", "allowed_members", "post_permission")
+MASK_FIELDS = ("is_private", "allowed_roles", "post_permission")
+PERMISSION_PROJECTION = {"server_id": 1, "perm_mask": 1, "allowed_members": 1,
+                         "is_private": 1, "allowed_roles": 1, "post_permission": 1}
+
+
+def _category_out(doc: Dict) -> Dict:
+  return {"id": doc["_id"], "name": doc["name"], "collapsed": doc.get("collapsed", False), "channels": []}
+
+
+def _channel_out(doc: Dict) -> Dict:
+  channel = {k: v for k, v in doc.items() if k not in ("_id", "category_id", "position")}
+  channel["id"] = doc["_id"]
+  return channel
+
+
+def _channel_in(server_id: str, category_id: str, position: int, channel: Dict) -> Dict:
+  doc = {k: v for k, v in channel.items() if k not in ("id", "unread", "members")}
+  doc.update({"_id": channel["id"], "server_id": server_id, "category_id": category_id, "position": position})
+  doc["perm_mask"] = compile_mask(doc.get("is_private", False), doc.get("allowed_roles") or (),
+                                  doc.get("post_permission", "everyone"))
+  return doc
+
+
+class ServerStore:
+  """servers + server_categories + server_channels 읽기/쓰기"""
+
+  def __init__(self, servers_col, categories_col, channels_col, membership=None):
+    self.servers = servers_col
+    self.categories = categories_col
+    self.channels = channels_col
+    self.membership = membership
+
+  async def ensure_indexes(self):
+    await self.categories.create_index([("server_id", 1), ("position", 1)], name="server_position")
+    await self.channels.create_index(
+      [("server_id", 1), ("category_id", 1), ("position", 1)], name="server_category_position"
+    )
+
+  # ---------- 조회 ----------
+
+  async def hydrate_many(self, docs: List[Dict]) -> List[Dict]:
+    """얇은 서버 문서들에 categories(채널 포함)를 채워 반환"""
+    normalized_ids = [doc["_id"] for doc in docs if "categories" not in doc]
+    if not normalized_ids:
+      return docs
+
+    categories_by_server: Dict[str, List[Dict]] = defaultdict(list)
+    categories_by_id: Dict[str, Dict] = {}
+    cursor = self.categories.find({"server_id": {"$in": normalized_ids}}).sort("position", 1)
+    async for cat_doc in cursor:
+      category = _category_out(cat_doc)
+      categories_by_server[cat_doc["server_id"]].append(category)
+      categories_by_id[cat_doc["_id"]] = category
+
+    cursor = self.channels.find({"server_id": {"$in": normalized_ids}}).sort("position", 1)
+    async for ch_doc in cursor:
+      category = categories_by_id.get(ch_doc.get("category_id"))
+      if category is not None:
+        category["channels"].append(_channel_out(ch_doc))
+
+    for doc in docs:
+      if "categories" not in doc:
+        doc["categories"] = categories_by_server.get(doc["_id"], [])
+    return docs
+
+  async def hydrate(self, doc: Optional[Dict]) -> Optional[Dict]:
+    if doc is None:
+      return None
+    return (await self.hydrate_many([doc]))[0]
+
+  async def find_one(self, query: Dict) -> Optional[Dict]:
+    return await self.hydrate(await self.servers.find_one(query))
+
+  async def find(self, query: Dict) -> List[Dict]:
+    docs = await self.servers.find(query).to_list(None)
+    return await self.hydrate_many(docs)
+
+  async def server_id_for_channel(self, channel_id: str) -> Optional[str]:
+    ch_doc = await self.channels.find_one({"_id": channel_id}, {"server_id": 1})
+    return ch_doc["server_id"] if ch_doc else None
+
+  async def find_by_channel(self, channel_id: str) -> Optional[Dict]:
+    server_id = await self.server_id_for_channel(channel_id)
+    if server_id is None:
+      return None
+    return await self.find_one({"_id": server_id})
+
+  async def get_channel(self, channel_id: str) -> Optional[Dict]:
+    ch_doc = await self.channels.find_one({"_id": channel_id})
+    return _channel_out(ch_doc) if ch_doc else None
+
+  async def channel_ids(self, server_id: str) -> List[str]:
+    cursor = self.channels.find({"server_id": server_id}, {"_id": 1})
+    return [doc["_id"] async for doc in cursor]
+
+  async def channel_ids_for_servers(self, server_ids: Iterable[str]) -> Dict[str, List[str]]:
+    result: Dict[str, List[str]] = defaultdict(list)
+    cursor = self.channels.find({"server_id": {"$in": list(server_ids)}}, {"server_id": 1})
+    async for doc in cursor:
+      result[doc["server_id"]].append(doc["_id"])
+    return result
+
+  async def channel_permissions(self, server_ids: Optional[Iterable[str]] = None,
+                                channel_ids: Optional[Iterable[str]] = None) -> List[Dict]:
+    """권한 평가용 채널 목록 ({id, server_id, perm_mask, allowed_members}) - 서버 또는 채널 ID로 조회"""
+    query: Dict = {}
+    if server_ids is not None:
+      query["server_id"] = {"$in": list(server_ids)}
+    if channel_ids is not None:
+      query["_id"] = {"$in": list(channel_ids)}
+    channels = []
+    async for doc in self.channels.find(query, PERMISSION_PROJECTION):
+      channels.append({
+        "id": doc["_id"],
+        "server_id": doc["server_id"],
+        "perm_mask": channel_mask(doc),
+        "allowed_members": doc.get("allowed_members") or [],
+      })
+    return channels
+
+  # ---------- 쓰기 ----------
+
+  async def bump_version(self, server_id: str):
+    await self.servers.update_one({"_id": server_id}, {"$inc": {"version": 1}})
+
+  async def _next_position(self, collection, query: Dict) -> int:
+    last = await collection.find_one(query, {"position": 1}, sort=[("position", -1)])
+    return last["position"] + 1 if last else 0
+
+  async def create_server(self, doc: Dict):
+    """임베디드 형태의 새 서버 문서를 나눠서 저장"""
+    categories = doc.get("categories", [])
+    thin = {k: v for k, v in doc.items() if k != "categories"}
+    await self._write_categories(doc["_id"], categories)
+    await self.servers.insert_one(thin)
+
+  async def add_category(self, server_id: str, category: Dict) -> bool:
+    if await self.servers.count_documents({"_id": server_id}, limit=1) == 0:
+      return False
+    position = await self._next_position(self.categories, {"server_id": server_id})
+    await self.categories.insert_one({
+      "_id": category["id"],
+      "server_id": server_id,
+      "name": category["name"],
+      "collapsed": category.get("collapsed", False),
+      "position": position,
+    })
+    await self.bump_version(server_id)
+    return True
+
+  async def update_category(self, server_id: str, category_id: str, updates: Dict) -> Optional[Dict]:
+    """변경 후 카테고리(채널 포함) 반환, 없으면 None"""
+    fields = {k: v for k, v in updates.items() if k in CATEGORY_FIELDS}
+    result = await self.categories.update_one({"_id": category_id, "server_id": server_id}, {"$set": fields})
+    if result.matched_count == 0:
+      return None
+    await self.bump_version(server_id)
+    return await self.get_category(server_id, category_id)
+
+  async def get_category(self, server_id: str, category_id: str) -> Optional[Dict]:
+    cat_doc = await self.categories.find_one({"_id": category_id, "server_id": server_id})
+    if not cat_doc:
+      return None
+    category = _category_out(cat_doc)
+    cursor = self.channels.find({"category_id": category_id, "server_id": server_id}).sort("position", 1)
+    category["channels"] = [_channel_out(doc) async for doc in cursor]
+    return category
+
+  async def delete_category(self, server_id: str, category_id: str) -> Optional[List[str]]:
+    """카테고리와 소속 채널 삭제 - 삭제된 채널 ID 목록 반환, 카테고리가 없으면 None"""
+    result = await self.categories.delete_one({"_id": category_id, "server_id": server_id})
+    if result.deleted_count == 0:
+      return None
+    query = {"server_id": server_id, "category_id": category_id}
+    channel_ids = [doc["_id"] async for doc in self.channels.find(query, {"_id": 1})]
+    if channel_ids:
+      await self.channels.delete_many(query)
+      if self.membership:
+        await self.membership.remove_channels(channel_ids)
+    await self.bump_version(server_id)
+    return channel_ids
+
+  async def add_channel(self, server_id: str, category_id: str, channel: Dict) -> bool:
+    """카테고리 끝에 채널 추가 (카테고리가 없으면 False)"""
+    if await self.categories.count_documents({"_id": category_id, "server_id": server_id}, limit=1) == 0:
+      return False
+    position = await self._next_position(self.channels, {"server_id": server_id, "category_id": category_id})
+    await self.channels.insert_one(_channel_in(server_id, category_id, position, channel))
+    await self.bump_version(server_id)
+    return True
+
+  async def update_channel(self, server_id: str, category_id: str, channel_id: str, updates: Dict) -> Optional[Dict]:
+    fields = {k: v for k, v in updates.items() if k in CHANNEL_FIELDS}
+    if any(k in fields for k in MASK_FIELDS):
+      current = await self.channels.find_one({"_id": channel_id, "server_id": server_id}, PERMISSION_PROJECTION)
+      if current is None:
+        return None
+      merged = {k: fields.get(k, current.get(k)) for k in MASK_FIELDS}
+      fields["perm_mask"] = compile_mask(merged.get("is_private") or False, merged.get("allowed_roles") or (),
+                                         merged.get("post_permission") or "everyone")
+    result = await self.channels.update_one(
+      {"_id": channel_id, "server_id": server_id, "category_id": category_id},
+      {"$set": fields},
+    )
+    if result.matched_count == 0:
+      return None
+    await self.bump_version(server_id)
+    return await self.get_channel(channel_id)
+
+  async def delete_channel(self, server_id: str, category_id: str, channel_id: str) -> bool:
+    result = await self.channels.delete_one({"_id": channel_id, "server_id": server_id, "category_id": category_id})
+    if result.deleted_count == 0:
+      return False
+    if self.membership:
+      await self.membership.remove_channels([channel_id])
+    await self.bump_version(server_id)
+    return True
+
+  async def move_channel(self, server_id: str, category_id: str, channel_id: str,
+                         target_category_id: str) -> Optional[Dict]:
+    """채널을 대상 카테고리 끝으로 이동 - 이동한 채널 반환 (채널/대상이 없으면 None)"""
+    if await self.categories.count_documents({"_id": target_category_id, "server_id": server_id}, limit=1) == 0:
+      return None
+    position = await self._next_position(self.channels, {"server_id": server_id, "category_id": target_category_id})
+    result = await self.channels.update_one(
+      {"_id": channel_id, "server_id": server_id, "category_id": category_id},
+      {"$set": {"category_id": target_category_id, "position": position}},
+    )
+    if result.matched_count == 0:
+      return None
+    await self.bump_version(server_id)
+    return await self.get_channel(channel_id)
+
+  # ---------- 마이그레이션 ----------
+
+  async def _write_categories(self, server_id: str, categories: List[Dict]):
+    category_ops = []
+    channel_ops = []
+    member_pairs = []
+    for cat_position, cat in enumerate(categories):
+      category_ops.append(ReplaceOne(
+        {"_id": cat["id"]},
+        {
+          "_id": cat["id"],
+          "server_id": server_id,
+          "name": cat.get("name", ""),
+          "collapsed": cat.get("collapsed", False),
+          "position": cat_position,
+        },
+        upsert=True,
+      ))
+      for ch_position, ch in enumerate(cat.get("channels", [])):
+        doc = _channel_in(server_id, cat["id"], ch_position, ch)
+        channel_ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        member_pairs.extend((ch["id"], m) for m in ch.get("members", []) if m.get("id"))
+    if category_ops:
+      await self.categories.bulk_write(category_ops, ordered=False)
+    if channel_ops:
+      await self.channels.bulk_write(channel_ops, ordered=False)
+    if member_pairs and self.membership:
+      await self.membership.add_many(member_pairs, server_id)
+
+  async def migrate_server(self, doc: Dict) -> bool:
+    """임베디드 categories를 별도 컬렉션으로 옮기고 서버 문서에서 제거
+
+    upsert 후 마지막에 $unset 하므로 중간에 중단돼도 다시 실행하면 이어서 완료된다.
+    """
+    if "categories" not in doc:
+      return False
+    await self._write_categories(doc["_id"], doc.get("categories") or [])
+    await self.servers.update_one({"_id": doc["_id"]}, {"$unset": {"categories": ""}})
+    return True
+
+  async def migrate_channel_members(self, ch_doc: Dict) -> bool:
+    """채널 문서에 남아 있는 members 배열을 channel_members로 옮기고 제거"""
+    if "members" not in ch_doc or not self.membership:
+      return False
+    pairs = [(ch_doc["_id"], m) for m in ch_doc.get("members") or [] if m.get("id")]
+    await self.membership.add_many(pairs, ch_doc.get("server_id"))
+    await self.channels.update_one({"_id": ch_doc["_id"]}, {"$unset": {"members": ""}})
+    return True
+
+  async def backfill_permission_masks(self) -> int:
+    """perm_mask가 없는 채널 문서에 권한 비트마스크 저장"""
+    operations = [
+      UpdateOne({"_id": doc["_id"]}, {"$set": {"perm_mask": channel_mask(doc)}})
+      async for doc in self.channels.find({"perm_mask": {"$exists": False}}, PERMISSION_PROJECTION)
+    ]
+    if operations:
+      await self.channels.bulk_write(operations, ordered=False)
+    return len(operations)
+
+  async def migrate_all(self) -> int:
+    migrated = 0
+    async for doc in self.servers.find({"categories": {"$exists": True}}):
+      if await self.migrate_server(doc):
+        migrated += 1
+    async for ch_doc in self.channels.find({"members": {"$exists": True}}):
+      await self.migrate_channel_members(ch_doc)
+    await self.backfill_permission_masks()
+    return migrated
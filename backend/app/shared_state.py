@@ -0,0 +1,146 @@
+"""
+Shared State
+여러 워커/노드가 함께 보는 소켓 상태 저장소
+
+- REDIS_URL이 있으면 Socket.IO는 AsyncRedisManager로 룸 브로드캐스트를 워커 간에 전달하고,
+  모듈 전역에 두던 소켓 상태(통화 참가자, sid별 서버, 메모장, 멤버 요약 캐시)는 이 저장소를 통해 Redis에 둔다.
+- redis가 None이면 같은 인터페이스를 프로세스 메모리 dict로 구현한다 (단일 워커 개발 환경).
+- SharedMap: 키 -> 값, SharedHashes: 키 -> {필드: 값} (예: 통화 채널 -> {sid: 참가자}).
+  값은 JSON으로 저장하고, ttl을 주면 쓸 때마다 만료를 갱신한다 (죽은 워커가 남긴 항목 정리용).
+- sid는 워커마다 겹치지 않는 무작위 값이라 sid 키는 워커 구분 없이 그대로 쓴다.
+"""
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+
+
+def connect_redis(url: str):
+  """REDIS_URL -> 공유 redis 클라이언트 (비어 있으면 None)"""
+  if not url:
+    return None
+  return aioredis.from_url(url, decode_responses=True)
+
+
+class SharedMap:
+  """키 -> JSON 값 (redis 문자열 키 또는 메모리 dict)"""
+
+  def __init__(self, redis, namespace: str, ttl: Optional[float] = None):
+    self.redis = redis
+    self.namespace = namespace
+    self.ttl = ttl
+    self.local: Dict[str, tuple] = {}  # key -> (만료 시각 또는 None, 값)
+
+  def _key(self, key: str) -> str:
+    return f"{self.namespace}:{key}"
+
+  async def get(self, key: str, default: Any = None) -> Any:
+    if self.redis is None:
+      item = self.local.get(key)
+      if item is None:
+        return default
+      expires_at, value = item
+      if expires_at is not None and expires_at < time.monotonic():
+        del self.local[key]
+        return default
+      return value
+    raw = await self.redis.get(self._key(key))
+    return default if raw is None else json.loads(raw)
+
+  async def set(self, key: str, value: Any):
+    if self.redis is None:
+      expires_at = time.monotonic() + self.ttl if self.ttl else None
+      self.local[key] = (expires_at, value)
+      return
+    await self.redis.set(self._key(key), json.dumps(value), ex=int(self.ttl) if self.ttl else None)
+
+  async def delete(self, key: str):
+    if self.redis is None:
+      self.local.pop(key, None)
+      return
+    await self.redis.delete(self._key(key))
+
+  async def pop(self, key: str, default: Any = None) -> Any:
+    if self.redis is None:
+      value = await self.get(key, default)
+      self.local.pop(key, None)
+      return value
+    raw = await self.redis.getdel(self._key(key))
+    return default if raw is None else json.loads(raw)
+
+
+class SharedHashes:
+  """키 -> {필드: JSON 값} (redis 해시 + 키 목록 집합 또는 메모리 중첩 dict)"""
+
+  def __init__(self, redis, namespace: str, ttl: Optional[float] = None):
+    self.redis = redis
+    self.namespace = namespace
+    self.ttl = ttl
+    self.local: Dict[str, Dict[str, Any]] = {}
+
+  def _key(self, key: str) -> str:
+    return f"{self.namespace}:{key}"
+
+  @property
+  def _index(self) -> str:
+    return f"{self.namespace}:keys"
+
+  async def get(self, key: str, field: str) -> Any:
+    if self.redis is None:
+      return self.local.get(key, {}).get(field)
+    raw = await self.redis.hget(self._key(key), field)
+    return None if raw is None else json.loads(raw)
+
+  async def set(self, key: str, field: str, value: Any):
+    if self.redis is None:
+      self.local.setdefault(key, {})[field] = value
+      return
+    pipe = self.redis.pipeline()
+    pipe.hset(self._key(key), field, json.dumps(value))
+    pipe.sadd(self._index, key)
+    if self.ttl:
+      pipe.expire(self._key(key), int(self.ttl))
+    await pipe.execute()
+
+  async def delete(self, key: str, field: str) -> bool:
+    """필드 삭제 - 있었으면 True. 마지막 필드면 키도 목록에서 뺀다"""
+    if self.redis is None:
+      fields = self.local.get(key)
+      if fields is None or field not in fields:
+        return False
+      del fields[field]
+      if not fields:
+        del self.local[key]
+      return True
+    removed = await self.redis.hdel(self._key(key), field)
+    if removed and not await self.redis.exists(self._key(key)):
+      await self.redis.srem(self._index, key)
+    return bool(removed)
+
+  async def all(self, key: str) -> Dict[str, Any]:
+    if self.redis is None:
+      return dict(self.local.get(key, {}))
+    raw = await self.redis.hgetall(self._key(key))
+    return {field: json.loads(value) for field, value in raw.items()}
+
+  async def items(self) -> Dict[str, Dict[str, Any]]:
+    """비어 있지 않은 모든 키 -> 필드 dict"""
+    if self.redis is None:
+      return {key: dict(fields) for key, fields in self.local.items() if fields}
+    keys: List[str] = sorted(await self.redis.smembers(self._index))
+    if not keys:
+      return {}
+    pipe = self.redis.pipeline()
+    for key in keys:
+      pipe.hgetall(self._key(key))
+    result = {}
+    stale = []
+    for key, raw in zip(keys, await pipe.execute()):
+      if raw:
+        result[key] = {field: json.loads(value) for field, value in raw.items()}
+      else:
+        stale.append(key)  # ttl로 만료된 키
+    if stale:
+      await self.redis.srem(self._index, *stale)
+    return result
@@ -0,0 +1,86 @@
+"""
+State Cache
+/state 렌더링 캐시
+
+- 서버 문서의 version은 서버/카테고리/채널/서버 멤버가 바뀔 때마다 1씩 오른다.
+- 역할별 채널 필터링 결과를 (server_id, role, version) 키로 JSON 직렬화 가능한 dict로 캐시한다.
+  버전이 오르면 새 키로 다시 렌더링되고, 옛 키는 LRU로 밀려난다.
+- allowed_members로만 열리는 비공개 채널은 역할만으로 판단할 수 없으므로 허용 사용자 집합을
+  같이 저장해 두고 응답할 때 사용자별로 걸러낸다.
+- 사용자 응답의 ETag는 (서버, 버전, 역할) 목록과 사용자 ID로 만든다.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+StateKey = Tuple[str, str, int]
+
+
+class RenderedServer:
+  """역할 하나 기준으로 렌더링된 서버"""
+
+  __slots__ = ("data", "gated")
+
+  def __init__(self, data: Dict, gated: Dict[str, FrozenSet[str]]):
+    self.data = data  # Server.model_dump(mode="json") - 역할로 볼 수 있는 채널 + 멤버 한정 채널
+    self.gated = gated  # 채널 ID -> 볼 수 있는 사용자 (allowed_members로만 열리는 채널)
+
+  def for_user(self, user_id: str) -> Dict:
+    if not self.gated:
+      return self.data
+    hidden = {ch_id for ch_id, allowed in self.gated.items() if user_id not in allowed}
+    if not hidden:
+      return self.data
+    return {
+      **self.data,
+      "categories": [
+        {**cat, "channels": [ch for ch in cat["channels"] if ch["id"] not in hidden]}
+        for cat in self.data["categories"]
+      ],
+    }
+
+
+class StateCache:
+  """(server_id, role, version) -> RenderedServer LRU"""
+
+  def __init__(self, max_entries: int = 5000):
+    self.max_entries = max_entries
+    self.entries: "OrderedDict[StateKey, RenderedServer]" = OrderedDict()
+    self.stats = {"requests": 0, "not_modified": 0, "hits": 0, "misses": 0}
+
+  def get(self, key: StateKey) -> Optional[RenderedServer]:
+    rendered = self.entries.get(key)
+    if rendered is None:
+      self.stats["misses"] += 1
+      return None
+    self.entries.move_to_end(key)
+    self.stats["hits"] += 1
+    return rendered
+
+  def put(self, key: StateKey, rendered: RenderedServer):
+    self.entries[key] = rendered
+    self.entries.move_to_end(key)
+    while len(self.entries) > self.max_entries:
+      self.entries.popitem(last=False)
+
+  def report(self) -> Dict:
+    lookups = self.stats["hits"] + self.stats["misses"]
+    return {
+      **self.stats,
+      "entries": len(self.entries),
+      "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+      "not_modified_rate": round(self.stats["not_modified"] / self.stats["requests"], 4)
+      if self.stats["requests"] else 0.0,
+    }
+
+
+def state_etag(user_id: str, keys: List[StateKey]) -> str:
+  raw = user_id + "|" + ";".join(f"{sid}:{role}:{version}" for sid, role, version in sorted(keys))
+  return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+  if not if_none_match:
+    return False
+  candidates = [tag.strip() for tag in if_none_match.split(",")]
+  return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
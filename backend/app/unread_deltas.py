@@ -0,0 +1,68 @@
+"""
+Unread Deltas
+사용자별 미읽음/멘션 증분 실시간 푸시
+
+- 메시지 팬아웃 시 (채널, 증가량, 멘션 여부) 증분을 사용자별로 모아 두고
+  window 초마다 사용자 룸(room=user_id)으로 한 번에 보낸다.
+- 읽음 처리는 reset 증분으로 보내 다른 기기/세션의 배지도 함께 지운다.
+- 클라이언트는 접속 시 GET /unreads로 한 번 동기화한 뒤 이 이벤트만 적용하면 된다.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+EmitCallback = Callable[[str, List[Dict]], Awaitable[None]]
+
+
+class UnreadDeltaBuffer:
+  """사용자별 미읽음 증분 합치기 + 주기적 전송"""
+
+  def __init__(self, emit: EmitCallback, window: float = 0.3):
+    self.emit = emit
+    self.window = window
+    self.pending: Dict[str, Dict[str, Dict]] = {}  # user_id -> {channel_id: {count, mention, reset}}
+    self._task: Optional[asyncio.Task] = None
+
+  def add(self, user_id: str, channel_id: str, increment: int = 1, mention: bool = False):
+    entry = self.pending.setdefault(user_id, {}).setdefault(
+      channel_id, {"count": 0, "mention": False, "reset": False}
+    )
+    entry["count"] += increment
+    entry["mention"] = entry["mention"] or mention
+
+  def clear(self, user_id: str, channel_id: str):
+    """읽음 처리 - 이전에 쌓인 증분을 버리고 0으로 맞추는 reset 증분으로 대체"""
+    self.pending.setdefault(user_id, {})[channel_id] = {"count": 0, "mention": False, "reset": True}
+
+  async def flush(self):
+    if not self.pending:
+      return
+    batch, self.pending = self.pending, {}
+    for user_id, channels in batch.items():
+      deltas = [
+        {
+          "channelId": channel_id,
+          "count": entry["count"],
+          "hasMention": entry["mention"],
+          "reset": entry["reset"],
+        }
+        for channel_id, entry in channels.items()
+      ]
+      try:
+        await self.emit(user_id, deltas)
+      except Exception as e:
+        print(f"[unread_deltas] 전송 실패: {e}")
+
+  async def _run(self):
+    while True:
+      await asyncio.sleep(self.window)
+      await self.flush()
+
+  def start(self):
+    if self._task is None:
+      self._task = asyncio.create_task(self._run())
+
+  async def stop(self):
+    if self._task is not None:
+      self._task.cancel()
+      self._task = None
+    await self.flush()
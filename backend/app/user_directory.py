@@ -0,0 +1,224 @@
+"""
+User Directory
+@멘션 자동완성과 사용자 검색을 위한 디렉터리 인덱스
+
+- DB에는 정규화된 소문자 키와 한글 초성 키를 `search_keys` 배열로 저장하고
+  ko collation 인덱스로 접두사(prefix) 범위 검색을 한다.
+- 메모리에는 서버 멤버십별 접두사 트라이를 두어 자동완성을 DB 왕복 없이 처리한다.
+- 다른 워커에서 멤버/프로필이 바뀌면 그 서버(또는 사용자가 속한 서버) 트라이를 내려
+  다음 자동완성 때 DB에서 다시 만든다 (unload_server / drop_user).
+"""
+import heapq
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+
+# 한글 초성 (유니코드 음절 순서)
+CHOSUNG = [
+  "ㄱ", "ㄲ", "ㄴ", "ㄷ", "ㄸ", "ㄹ", "ㅁ", "ㅂ", "ㅃ", "ㅅ",
+  "ㅆ", "ㅇ", "ㅈ", "ㅉ", "ㅊ", "ㅋ", "ㅌ", "ㅍ", "ㅎ",
+]
+HANGUL_BASE = 0xAC00
+HANGUL_LAST = 0xD7A3
+JUNGSUNG_COUNT = 21
+JONGSUNG_COUNT = 28
+
+# search_keys 인덱스에 사용하는 collation (strength 1: 대소문자/악센트 무시)
+SEARCH_KEY_COLLATION = {"locale": "ko", "strength": 1}
+# ICU collation에서 U+FFFF는 최대 가중치를 가지므로 접두사 범위의 상한으로 쓸 수 있다
+PREFIX_UPPER_BOUND = "\uffff"
+
+
+def normalize_key(text: Optional[str]) -> str:
+  """NFKC 정규화 + 소문자 + 공백 제거"""
+  if not text:
+    return ""
+  normalized = unicodedata.normalize("NFKC", text).casefold()
+  return "".join(normalized.split())
+
+
+def chosung_key(text: Optional[str]) -> str:
+  """한글 음절을 초성으로 치환한 키 (한글이 없으면 빈 문자열)"""
+  key = normalize_key(text)
+  result = []
+  has_hangul = False
+  for char in key:
+    code = ord(char)
+    if HANGUL_BASE <= code <= HANGUL_LAST:
+      result.append(CHOSUNG[(code - HANGUL_BASE) // (JUNGSUNG_COUNT * JONGSUNG_COUNT)])
+      has_hangul = True
+    else:
+      result.append(char)
+  # 초성(호환 자모)도 NFKC로 정규화해 검색어 정규화 결과와 같은 형태로 맞춘다
+  return normalize_key("".join(result)) if has_hangul else ""
+
+
+def build_search_keys(user_doc: Dict) -> List[str]:
+  """사용자 문서에서 검색 키 목록 생성 (username, name, nickname, email, 초성)"""
+  keys = []
+  for field in ("username", "name", "nickname"):
+    value = user_doc.get(field)
+    keys.append(normalize_key(value))
+    keys.append(chosung_key(value))
+  email = user_doc.get("email") or ""
+  keys.append(normalize_key(email))
+  # 중복/빈 키 제거 (순서 유지)
+  return [k for k in dict.fromkeys(keys) if k]
+
+
+def prefix_query(prefix: str) -> Dict:
+  """search_keys 접두사 범위 쿼리 (SEARCH_KEY_COLLATION과 함께 사용)"""
+  key = normalize_key(prefix)
+  return {"search_keys": {"$gte": key, "$lt": key + PREFIX_UPPER_BOUND}}
+
+
+class PrefixTrie:
+  """접두사 트라이 - 각 노드에 해당 접두사를 가진 사용자 ID 참조 카운트를 보관"""
+
+  __slots__ = ("root",)
+
+  def __init__(self):
+    self.root = {"children": {}, "ids": {}}
+
+  def insert(self, key: str, user_id: str):
+    node = self.root
+    for char in key:
+      node = node["children"].setdefault(char, {"children": {}, "ids": {}})
+      node["ids"][user_id] = node["ids"].get(user_id, 0) + 1
+
+  def remove(self, key: str, user_id: str):
+    node = self.root
+    path = []
+    for char in key:
+      child = node["children"].get(char)
+      if child is None:
+        return
+      path.append((node, char, child))
+      node = child
+    for parent, char, child in reversed(path):
+      count = child["ids"].get(user_id, 0) - 1
+      if count > 0:
+        child["ids"][user_id] = count
+      else:
+        child["ids"].pop(user_id, None)
+      if not child["ids"]:
+        del parent["children"][char]
+
+  def match(self, prefix: str) -> Set[str]:
+    node = self.root
+    for char in prefix:
+      node = node["children"].get(char)
+      if node is None:
+        return set()
+    return set(node["ids"])
+
+
+class UserDirectory:
+  """사용자 요약 정보 + 서버별 접두사 트라이"""
+
+  def __init__(self):
+    self.entries: Dict[str, Dict] = {}  # user_id -> {id, username, name, nickname, avatar, keys}
+    self.tries: Dict[str, PrefixTrie] = {}  # server_id -> PrefixTrie
+    self.members: Dict[str, Set[str]] = {}  # server_id -> user_ids
+
+  def is_loaded(self, server_id: str) -> bool:
+    return server_id in self.tries
+
+  def upsert_user(self, user_doc: Dict):
+    """가입/프로필 변경 시 호출 - 사용자가 속한 모든 서버 트라이를 갱신"""
+    user_id = user_doc["_id"]
+    old_entry = self.entries.get(user_id)
+    entry = {
+      "id": user_id,
+      "username": user_doc.get("username", ""),
+      "name": user_doc.get("name", ""),
+      "nickname": user_doc.get("nickname"),
+      "avatar": user_doc.get("avatar") or (user_doc.get("name") or "U")[:1],
+      "sort_key": normalize_key(user_doc.get("name") or user_doc.get("username")),
+      "keys": build_search_keys(user_doc),
+    }
+    self.entries[user_id] = entry
+    if old_entry and old_entry["keys"] == entry["keys"]:
+      return
+    for server_id, member_ids in self.members.items():
+      if user_id not in member_ids:
+        continue
+      trie = self.tries[server_id]
+      if old_entry:
+        for key in old_entry["keys"]:
+          trie.remove(key, user_id)
+      for key in entry["keys"]:
+        trie.insert(key, user_id)
+
+  def load_server(self, server_id: str, user_docs: Iterable[Dict]):
+    """서버 멤버 전체로 트라이 구성 (최초 조회 시 지연 로드)"""
+    trie = PrefixTrie()
+    member_ids = set()
+    for user_doc in user_docs:
+      self.upsert_user(user_doc)
+      entry = self.entries[user_doc["_id"]]
+      member_ids.add(entry["id"])
+      for key in entry["keys"]:
+        trie.insert(key, entry["id"])
+    self.tries[server_id] = trie
+    self.members[server_id] = member_ids
+
+  def add_member(self, server_id: str, user_doc: Dict):
+    """초대/서버 생성 시 호출 (트라이가 로드된 서버만 갱신)"""
+    self.upsert_user(user_doc)
+    if server_id not in self.tries:
+      return
+    user_id = user_doc["_id"]
+    if user_id in self.members[server_id]:
+      return
+    self.members[server_id].add(user_id)
+    for key in self.entries[user_id]["keys"]:
+      self.tries[server_id].insert(key, user_id)
+
+  def remove_member(self, server_id: str, user_id: str):
+    """추방 시 호출"""
+    if server_id not in self.tries or user_id not in self.members[server_id]:
+      return
+    self.members[server_id].discard(user_id)
+    entry = self.entries.get(user_id)
+    if entry:
+      for key in entry["keys"]:
+        self.tries[server_id].remove(key, user_id)
+
+  def unload_server(self, server_id: str):
+    self.tries.pop(server_id, None)
+    self.members.pop(server_id, None)
+
+  def drop_user(self, user_id: str):
+    """사용자 항목과 그 사용자가 속한 서버 트라이를 내린다"""
+    self.entries.pop(user_id, None)
+    for server_id in [sid for sid, member_ids in self.members.items() if user_id in member_ids]:
+      self.unload_server(server_id)
+
+  def clear(self):
+    self.entries.clear()
+    self.tries.clear()
+    self.members.clear()
+
+  def autocomplete(self, server_id: str, prefix: str, limit: int = 10,
+                   exclude: Optional[str] = None) -> List[Dict]:
+    """접두사로 서버 멤버 top-k 반환 (username 접두사 일치 우선, 이름순)"""
+    key = normalize_key(prefix)
+    trie = self.tries.get(server_id)
+    if trie is None:
+      return []
+    if key:
+      candidate_ids = trie.match(key)
+    else:
+      candidate_ids = set(self.members.get(server_id, ()))
+    candidate_ids.discard(exclude)
+
+    def rank(user_id: str):
+      entry = self.entries[user_id]
+      username_hit = 0 if key and normalize_key(entry["username"]).startswith(key) else 1
+      return (username_hit, entry["sort_key"], user_id)
+
+    top_ids = heapq.nsmallest(limit, candidate_ids, key=rank)
+    return [
+      {k: self.entries[uid][k] for k in ("id", "username", "name", "nickname", "avatar")}
+      for uid in top_ids
+    ]
@@ -0,0 +1,328 @@
+"""
+Vector Index
+@chatbot RAG 문맥 검색용 로컬 벡터 인덱스
+
+- 외부 API 없이 해시 임베딩(feature hashing)을 NumPy로 계산한다.
+- 메시지 저장 시점에 채널별로 증분 추가한다.
+- 채널별로 `{channel_id}.f32`(float32 행렬, 행 단위 append)와 `{channel_id}.ids`(메시지 ID)를
+  디스크에 두고, 조회 시 np.memmap으로 매핑해 코사인 유사도 top-k를 계산한다.
+- 수정된 메시지는 새 행을 append하고 이전 행을, 삭제된 메시지는 그 행을 `{channel_id}.del`(행 번호)에
+  묘비로 남긴다. 묘비 행은 검색 점수를 -inf로 가려 top-k 자리를 차지하지 않는다.
+- 백필은 스레드 풀에서 돌 수 있으므로 변경/검색은 인덱스 잠금 안에서 한다.
+- 여러 워커가 같은 디렉터리를 쓰므로 채널마다 `{channel_id}.lock` 파일 잠금을 잡고 쓰며, 쓰기/검색 전에
+  다른 워커가 덧붙인 .ids / .del 꼬리를 읽어 메모리 상태(행 번호, 묘비)를 맞춘다.
+  백필과 수정 메시지 재색인은 `_writer.lock`을 잡은 워커 하나만 한다 (acquire_writer).
+"""
+import re
+import threading
+import zlib
+import heapq
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:
+  import fcntl
+except ImportError:  # Windows
+  fcntl = None
+  import msvcrt
+
+EMBEDDING_DIM = 512
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+SAFE_NAME_PATTERN = re.compile(r"[^A-Za-z0-9_\-]")
+
+
+def tokenize(text: str) -> List[str]:
+  """단어 토큰 + 단어 내부 문자 bigram (조사가 붙는 한국어 대응)"""
+  features = []
+  for word in TOKEN_PATTERN.findall(text.lower()):
+    features.append(word)
+    if len(word) > 2:
+      features.extend(word[i:i + 2] for i in range(len(word) - 1))
+  return features
+
+
+def embed(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+  """해시 임베딩 - crc32 버킷 + 부호 해시, 서브리니어 tf, L2 정규화"""
+  vector = np.zeros(dim, dtype=np.float32)
+  for feature in tokenize(text):
+    h = zlib.crc32(feature.encode("utf-8"))
+    sign = 1.0 if (h >> 31) & 1 else -1.0
+    vector[h % dim] += sign
+  vector = np.sign(vector) * np.log1p(np.abs(vector))
+  norm = np.linalg.norm(vector)
+  if norm > 0:
+    vector /= norm
+  return vector.astype(np.float32)
+
+
+@contextmanager
+def _file_lock(path: Path):
+  """프로세스 간 배타 잠금 (워커끼리 같은 채널 파일에 동시에 쓰지 않도록)"""
+  with open(path, "a+b") as f:
+    if fcntl is not None:
+      fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+      f.seek(0)
+      while True:
+        try:
+          msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+          break
+        except OSError:
+          continue
+    try:
+      yield
+    finally:
+      if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+      else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_lines(path: Path, offset: int) -> Tuple[List[str], int]:
+  """offset부터 완성된 줄만 읽어 (줄 목록, 새 offset) 반환"""
+  if not path.exists() or path.stat().st_size <= offset:
+    return [], offset
+  with open(path, "rb") as f:
+    f.seek(offset)
+    data = f.read()
+  end = data.rfind(b"\n") + 1
+  return data[:end].decode("utf-8").split("\n")[:-1], offset + end
+
+
+class ChannelVectorStore:
+  """채널 하나의 벡터 파일 + 메시지 ID 목록"""
+
+  def __init__(self, directory: Path, channel_id: str, dim: int):
+    safe_name = SAFE_NAME_PATTERN.sub("_", channel_id)
+    self.dim = dim
+    self.vectors_path = directory / f"{safe_name}.f32"
+    self.ids_path = directory / f"{safe_name}.ids"
+    self.dead_path = directory / f"{safe_name}.del"
+    self.lock_path = directory / f"{safe_name}.lock"
+    self.message_ids: List[str] = []
+    self.rows: Dict[str, int] = {}  # 메시지 ID -> 살아 있는 행
+    self.dead: Set[int] = set()  # 묘비 행 (수정 전 행, 삭제된 메시지)
+    self._mmap = None
+    self._dead_mask: Optional[np.ndarray] = None
+    self._ids_offset = 0  # 읽은 .ids / .del 바이트 (다른 워커가 덧붙인 꼬리만 다시 읽는다)
+    self._dead_offset = 0
+    with self.locked():
+      self._repair()
+      self.sync()
+
+  @contextmanager
+  def locked(self):
+    with _file_lock(self.lock_path):
+      yield
+
+  def _repair(self):
+    """비정상 종료로 두 파일 길이가 어긋난 경우 짧은 쪽에 맞춘다 (파일 잠금 안에서)"""
+    if not self.ids_path.exists() or not self.vectors_path.exists():
+      return
+    text = self.ids_path.read_text(encoding="utf-8")
+    ids = [i for i in text.split("\n") if i]
+    row_bytes = self.dim * 4
+    size = self.vectors_path.stat().st_size
+    count = min(len(ids), size // row_bytes)
+    if size != count * row_bytes:
+      with open(self.vectors_path, "r+b") as f:
+        f.truncate(count * row_bytes)
+    if len(ids) != count or (text and not text.endswith("\n")):
+      self.ids_path.write_text("".join(f"{i}\n" for i in ids[:count]), encoding="utf-8")
+
+  def sync(self):
+    """다른 워커가 덧붙인 행과 묘비를 메모리 상태에 반영 (파일 잠금 안에서)"""
+    ids, self._ids_offset = _read_lines(self.ids_path, self._ids_offset)
+    for message_id in ids:
+      previous = self.rows.get(message_id)
+      if previous is not None:
+        self.dead.add(previous)
+      self.rows[message_id] = len(self.message_ids)
+      self.message_ids.append(message_id)
+    if ids:
+      self._mmap = None
+      self._dead_mask = None
+    lines, self._dead_offset = _read_lines(self.dead_path, self._dead_offset)
+    for line in lines:
+      if line.isdigit() and int(line) < len(self.message_ids):
+        self._bury(int(line))
+
+  def __len__(self):
+    return len(self.message_ids)
+
+  def _bury(self, row: int):
+    self.dead.add(row)
+    if self.rows.get(self.message_ids[row]) == row:
+      del self.rows[self.message_ids[row]]
+    self._dead_mask = None
+
+  def append(self, message_id: str, vector: np.ndarray):
+    """행 추가 - 같은 메시지의 이전 행은 묘비 처리 (수정). 파일 잠금 안에서 sync() 후 호출"""
+    self.remove(message_id)
+    with open(self.vectors_path, "ab") as f:
+      # 쓰다 죽은 워커가 남긴 짝 없는 벡터가 있으면 잘라 행 번호를 .ids와 맞춘다
+      expected = len(self.message_ids) * self.dim * 4
+      if f.tell() != expected:
+        f.truncate(expected)
+      f.write(vector.astype(np.float32).tobytes())
+    with open(self.ids_path, "a", encoding="utf-8") as f:
+      f.write(f"{message_id}\n")
+    # 방금 쓴 줄은 sync()가 읽어 행 번호와 이전 행 묘비를 맞춘다
+    self.sync()
+
+  def remove(self, message_id: str) -> bool:
+    """메시지 행을 묘비 처리 - 있었으면 True. 파일 잠금 안에서 sync() 후 호출"""
+    row = self.rows.get(message_id)
+    if row is None:
+      return False
+    with open(self.dead_path, "a", encoding="utf-8") as f:
+      f.write(f"{row}\n")
+    self._dead_offset = self.dead_path.stat().st_size
+    self._bury(row)
+    return True
+
+  def dead_mask(self) -> np.ndarray:
+    if self._dead_mask is None or self._dead_mask.shape[0] != len(self.message_ids):
+      mask = np.zeros(len(self.message_ids), dtype=bool)
+      if self.dead:
+        mask[np.fromiter(self.dead, dtype=np.int64, count=len(self.dead))] = True
+      self._dead_mask = mask
+    return self._dead_mask
+
+  def matrix(self) -> np.ndarray:
+    if not self.message_ids:
+      return np.zeros((0, self.dim), dtype=np.float32)
+    if self._mmap is None or self._mmap.shape[0] != len(self.message_ids):
+      self._mmap = np.memmap(
+        self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.message_ids), self.dim)
+      )
+    return self._mmap
+
+
+class VectorIndex:
+  """채널별 벡터 저장소 모음 - 접근 가능한 채널 집합에 대해 top-k 검색"""
+
+  def __init__(self, directory: Path, dim: int = EMBEDDING_DIM):
+    self.directory = Path(directory)
+    self.directory.mkdir(parents=True, exist_ok=True)
+    self.dim = dim
+    self.stores: Dict[str, ChannelVectorStore] = {}
+    self._lock = threading.Lock()
+    self._writer = None  # acquire_writer로 잡은 잠금 파일 (프로세스가 끝나면 OS가 푼다)
+
+  def _store(self, channel_id: str) -> ChannelVectorStore:
+    store = self.stores.get(channel_id)
+    if store is None:
+      store = ChannelVectorStore(self.directory, channel_id, self.dim)
+      self.stores[channel_id] = store
+    return store
+
+  @property
+  def is_writer(self) -> bool:
+    return self._writer is not None
+
+  def acquire_writer(self) -> bool:
+    """백필/재색인을 맡을 워커인지 - 비차단으로 디렉터리 잠금을 시도하고, 잡으면 계속 들고 있는다"""
+    if self._writer is not None:
+      return True
+    f = open(self.directory / "_writer.lock", "a+b")
+    try:
+      if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+      else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+      f.close()
+      return False
+    self._writer = f
+    return True
+
+  @contextmanager
+  def _synced(self, channel_id: str):
+    """스레드 잠금 + 채널 파일 잠금 안에서 다른 워커의 변경을 반영한 저장소"""
+    with self._lock:
+      store = self._store(channel_id)
+      with store.locked():
+        store.sync()
+        yield store
+
+  def has_channel(self, channel_id: str) -> bool:
+    with self._synced(channel_id) as store:
+      return len(store) > 0
+
+  def add(self, channel_id: str, message_id: str, text: str) -> bool:
+    """메시지 저장/수정 시 호출 - 이미 색인된 메시지면 이전 행을 대체, 토큰이 없으면 색인에서 뺀다"""
+    vector = embed(text, self.dim)
+    with self._synced(channel_id) as store:
+      if not vector.any():
+        store.remove(message_id)
+        return False
+      store.append(message_id, vector)
+      return True
+
+  def remove(self, channel_id: str, message_id: str) -> bool:
+    """삭제된 메시지를 묘비 처리"""
+    with self._synced(channel_id) as store:
+      return store.remove(message_id)
+
+  @property
+  def _edited_since_path(self) -> Path:
+    return self.directory / "_edited_since"
+
+  def edited_since(self) -> Optional[datetime]:
+    """수정 메시지 재색인을 마지막으로 반영한 edited_at (없으면 None)"""
+    if not self._edited_since_path.exists():
+      return None
+    return datetime.fromisoformat(self._edited_since_path.read_text(encoding="utf-8").strip())
+
+  def mark_edited_since(self, value: datetime):
+    self._edited_since_path.write_text(value.isoformat(), encoding="utf-8")
+
+  def add_many(self, channel_id: str, items: Iterable[Tuple[str, str]]) -> int:
+    """백필용 일괄 추가 - (message_id, text) 목록"""
+    count = 0
+    for message_id, text in items:
+      if self.add(channel_id, message_id, text):
+        count += 1
+    return count
+
+  def search(self, query: str, channel_ids: Iterable[str], k: int = 10,
+             min_score: float = 0.05) -> List[Tuple[float, str, str]]:
+    """코사인 유사도 top-k - [(score, channel_id, message_id)] 점수 내림차순"""
+    query_vector = embed(query, self.dim)
+    if not query_vector.any():
+      return []
+
+    candidates = []
+    for channel_id in channel_ids:
+      with self._synced(channel_id) as store:
+        if not len(store):
+          continue
+        # 벡터가 이미 정규화되어 있으므로 내적 = 코사인 유사도
+        scores = store.matrix() @ query_vector
+        if store.dead:
+          scores = np.where(store.dead_mask(), -np.inf, scores)
+        top = min(k, scores.shape[0])
+        top_rows = np.argpartition(-scores, top - 1)[:top]
+        for row in top_rows:
+          score = float(scores[row])
+          if score >= min_score:
+            candidates.append((score, channel_id, store.message_ids[row]))
+
+    # 중복 색인(백필 중 새 메시지 등)된 메시지는 한 번만
+    seen = set()
+    results = []
+    for score, channel_id, message_id in heapq.nlargest(k * 2, candidates):
+      if message_id in seen:
+        continue
+      seen.add(message_id)
+      results.append((score, channel_id, message_id))
+      if len(results) >= k:
+        break
+    return results
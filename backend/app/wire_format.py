@@ -0,0 +1,293 @@
+"""
+Wire Format
+Socket.IO 이벤트 MessagePack 직렬화 (연결별 협상)
+
+- 클라이언트가 연결 URL 쿼리에 wire=msgpack을 붙이면 그 연결의 Socket.IO 패킷을 MessagePack 바이너리로
+  주고받는다 (socket.io-msgpack-parser 호환). 쿼리가 없으면 기존 JSON 텍스트 그대로다.
+- 룸 브로드캐스트는 받는 사람 수와 상관없이 형식별로 한 번씩만 인코딩한다 (JSON 1회 + MessagePack 1회).
+- MessagePack 연결에는 자주 오가는 이벤트(화이트보드, ICE 후보, 타이핑, 읽음, 메시지)에 compact 스키마를 적용한다:
+  키를 짧은 키로 바꾸고 None / 빈 배열 / 빈 객체 / 이벤트별 기본값 필드를 뺀다. 받은 이벤트는 키를 다시 펼친다.
+  스키마는 wire_schema()로 클라이언트에 내려준다.
+- outbound(backpressure.OutboundLimiter)를 주면 연결별 송신 대기 바이트를 기록하고,
+  밀린 연결에는 덜 중요한 이벤트를 버리거나 합친다.
+- inbound(event_limits.EventRateLimiter)를 주면 받은 이벤트를 핸들러에 넘기기 전에 토큰 버킷으로 거른다.
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs
+
+import msgpack
+import socketio
+from engineio import packet as eio_packet
+from socketio import packet
+from socketio.msgpack_packet import MsgPackPacket
+
+from .backpressure import OutboundLimiter
+from .event_limits import EventRateLimiter
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# 이벤트별 긴 키 -> 짧은 키 (중첩 dict에도 같은 표를 적용)
+COMPACT_KEYS: Dict[str, Dict[str, str]] = {
+  "whiteboard_draw": {
+    "serverId": "s", "channelId": "c", "drawData": "d", "type": "t", "tool": "o", "color": "k",
+    "size": "z", "startX": "x0", "startY": "y0", "endX": "x1", "endY": "y1",
+  },
+  "webrtc_ice_candidate": {
+    "fromSid": "f", "targetSid": "g", "channelId": "c", "candidate": "i",
+    "sdpMid": "m", "sdpMLineIndex": "l", "usernameFragment": "u",
+  },
+  "typing_start": {"channelId": "c", "userId": "u", "username": "n"},
+  "typing_stop": {"channelId": "c", "userId": "u"},
+  "channel_read": {"channelId": "c"},
+  "user_read_update": {"channelId": "c", "userId": "u", "lastReadAt": "r"},
+  "message": {
+    "channelId": "c", "message": "m", "id": "i", "channel_id": "ch", "sender": "s", "name": "n",
+    "avatar": "a", "content": "b", "timestamp": "t", "files": "f", "size": "z", "type": "y", "url": "l",
+    "thread_id": "th", "reply_count": "rc", "edited_at": "e", "is_deleted": "x", "reactions": "r",
+    "emoji": "j", "users": "us",
+  },
+}
+
+# 이벤트별로 생략하는 기본값 (클라이언트는 없는 키를 이 값으로 본다)
+OMITTED_DEFAULTS: Dict[str, Dict[str, Any]] = {
+  "message": {"reply_count": 0, "is_deleted": False},
+}
+
+_EXPAND_KEYS = {event: {short: long for long, short in keys.items()} for event, keys in COMPACT_KEYS.items()}
+
+
+def wire_schema() -> Dict:
+  """클라이언트용 compact 스키마"""
+  return {"format": MSGPACK, "keys": COMPACT_KEYS, "defaults": OMITTED_DEFAULTS}
+
+
+def _is_empty(value: Any) -> bool:
+  return value is None or value == [] or value == {}
+
+
+def _compact_value(value: Any, keys: Dict[str, str], defaults: Dict[str, Any]) -> Any:
+  if isinstance(value, dict):
+    out = {}
+    for key, item in value.items():
+      if _is_empty(item) or (key in defaults and type(item) is type(defaults[key]) and item == defaults[key]):
+        continue
+      out[keys.get(key, key)] = _compact_value(item, keys, defaults)
+    return out
+  if isinstance(value, list):
+    return [_compact_value(item, keys, defaults) for item in value]
+  return value
+
+
+def _rename(value: Any, keys: Dict[str, str]) -> Any:
+  if isinstance(value, dict):
+    return {keys.get(key, key): _rename(item, keys) for key, item in value.items()}
+  if isinstance(value, list):
+    return [_rename(item, keys) for item in value]
+  return value
+
+
+def compact(data: List) -> List:
+  """[이벤트, 인자...] -> compact 스키마 적용 (스키마가 없는 이벤트는 그대로)"""
+  if not data or data[0] not in COMPACT_KEYS:
+    return data
+  event = data[0]
+  return [event] + [_compact_value(arg, COMPACT_KEYS[event], OMITTED_DEFAULTS.get(event, {})) for arg in data[1:]]
+
+
+def expand(data: List) -> List:
+  """클라이언트가 보낸 compact 이벤트의 키를 원래 키로 펼친다"""
+  if not data or data[0] not in _EXPAND_KEYS:
+    return data
+  return [data[0]] + [_rename(arg, _EXPAND_KEYS[data[0]]) for arg in data[1:]]
+
+
+def _default(value: Any) -> Any:
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(f"직렬화할 수 없는 값: {type(value).__name__}")
+
+
+def encode_msgpack(packet_type: int, data: Any, namespace: str = None, id: int = None) -> bytes:
+  """Socket.IO 패킷 -> MessagePack (이벤트면 compact 스키마 적용)"""
+  if packet_type == packet.BINARY_EVENT:
+    packet_type = packet.EVENT
+  elif packet_type == packet.BINARY_ACK:
+    packet_type = packet.ACK
+  if packet_type == packet.EVENT:
+    data = compact(data)
+  pkt = {"type": packet_type, "data": data, "nsp": namespace or "/"}
+  if id is not None:
+    pkt["id"] = id
+  if data is None:
+    del pkt["data"]
+  return msgpack.dumps(pkt, default=_default)
+
+
+class WireServer(socketio.AsyncServer):
+  """연결마다 JSON 텍스트 / MessagePack 패킷 형식을 고르는 AsyncServer
+
+  python-socketio의 비공개 메서드를 바꿔 끼운다: _handle_eio_connect, _handle_eio_message,
+  _handle_eio_disconnect(eio_sid, reason), _trigger_event, _send_packet. 그 밖에 _send_eio_packet,
+  _handle_connect / _handle_disconnect(reason) / _handle_event / _handle_ack, self.reason을 부른다.
+  disconnect reason 인자가 5.12에서 생겼으므로 requirements.txt는 python-socketio>=5.12,<6으로 고정한다
+  (5.17 / python-engineio 4.14에서 확인). 버전을 올릴 때는 이 메서드들의 시그니처를 다시 확인해야 한다.
+  """
+
+  def __init__(self, *args, outbound: Optional[OutboundLimiter] = None,
+               inbound: Optional[EventRateLimiter] = None, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.inbound = inbound
+    self.wire_formats: Dict[str, str] = {}  # MessagePack을 협상한 eio_sid -> MSGPACK
+    self.wire_stats = {"json_packets": 0, "json_bytes": 0, "msgpack_packets": 0, "msgpack_bytes": 0}
+    self.outbound = outbound
+    if outbound is not None:
+      outbound.bind(self._queue_size, self._resend, self._shed)
+
+  def wire_format(self, eio_sid: str) -> str:
+    return self.wire_formats.get(eio_sid, JSON)
+
+  def count(self, fmt: str, size: int):
+    self.wire_stats[f"{fmt}_packets"] += 1
+    self.wire_stats[f"{fmt}_bytes"] += size
+
+  async def _handle_eio_connect(self, eio_sid, environ):
+    query = parse_qs(environ.get("QUERY_STRING", ""))
+    if MSGPACK in query.get("wire", []):
+      self.wire_formats[eio_sid] = MSGPACK
+    return await super()._handle_eio_connect(eio_sid, environ)
+
+  async def _handle_eio_disconnect(self, eio_sid, reason):
+    try:
+      return await super()._handle_eio_disconnect(eio_sid, reason)
+    finally:
+      self.wire_formats.pop(eio_sid, None)
+      if self.outbound is not None:
+        self.outbound.forget(eio_sid)
+
+  async def _trigger_event(self, event, namespace, *args):
+    if self.inbound is None or event == "connect":
+      return await super()._trigger_event(event, namespace, *args)
+    sid = args[0]
+    if event == "disconnect":
+      self.inbound.forget(sid)
+      return await super()._trigger_event(event, namespace, *args)
+    session = await self.get_session(sid, namespace=namespace)
+    limited = await self.inbound.check(event, sid, session.get("user_id"))
+    if limited is None:
+      return await super()._trigger_event(event, namespace, *args)
+    # 핸들러를 부르지 않고 ack로 거절 (ack를 요청하지 않은 emit은 그냥 버린다)
+    scope, retry_after = limited
+    return {"ok": False, "error": "rate_limited", "event": event, "scope": scope,
+            "retryAfter": round(retry_after, 2)}
+
+  def _queue_size(self, eio_sid: str) -> int:
+    """Engine.IO 송신 큐에 남은 패킷 수 (polling은 다음 요청, websocket은 쓰기가 끝날 때까지 남는다)"""
+    socket = self.eio.sockets.get(eio_sid)
+    return socket.queue.qsize() if socket is not None else 0
+
+  async def _resend(self, eio_sid: str, event: str, data: List):
+    """밀려서 보관했던 이벤트를 그 연결에만 보낸다"""
+    sid = self.manager.sid_from_eio_sid(eio_sid, "/")
+    if sid is not None:
+      await self.emit(event, tuple(data), to=sid)
+
+  async def _shed(self, eio_sid: str):
+    """한도를 계속 넘는 느린 연결 끊기"""
+    sid = self.manager.sid_from_eio_sid(eio_sid, "/")
+    print(f"[backpressure] 느린 연결 종료: {sid or eio_sid}")
+    if sid is not None:
+      await self.disconnect(sid)
+    else:
+      await self.eio.disconnect(eio_sid)
+
+  async def _deliver(self, eio_sid: str, event: str, data: List, eio_pkts: List):
+    """브로드캐스트 한 건을 한 연결에 - 밀린 연결이면 우선순위에 따라 보관하거나 버린다"""
+    if self.outbound is not None and not self.outbound.admit(eio_sid, event, data):
+      return
+    for p in eio_pkts:
+      await self._send_eio_packet(eio_sid, p)
+    if self.outbound is not None:
+      self.outbound.sent(eio_sid, [len(p.data) for p in eio_pkts])
+
+  async def _handle_eio_message(self, eio_sid, data):
+    if eio_sid not in self.wire_formats:
+      return await super()._handle_eio_message(eio_sid, data)
+    pkt = MsgPackPacket(encoded_packet=data)
+    if pkt.packet_type == packet.CONNECT:
+      await self._handle_connect(eio_sid, pkt.namespace, pkt.data)
+    elif pkt.packet_type == packet.DISCONNECT:
+      await self._handle_disconnect(eio_sid, pkt.namespace, self.reason.CLIENT_DISCONNECT)
+    elif pkt.packet_type == packet.EVENT:
+      await self._handle_event(eio_sid, pkt.namespace, pkt.id, expand(pkt.data))
+    elif pkt.packet_type == packet.ACK:
+      await self._handle_ack(eio_sid, pkt.namespace, pkt.id, pkt.data)
+    else:
+      raise ValueError("Unexpected MessagePack packet type.")
+
+  async def _send_packet(self, eio_sid, pkt):
+    if eio_sid not in self.wire_formats:
+      encoded = pkt.encode()
+      encoded = encoded if isinstance(encoded, list) else [encoded]
+      self.count(JSON, sum(len(p) for p in encoded))
+      for p in encoded:
+        await self.eio.send(eio_sid, p)
+    else:
+      encoded = [encode_msgpack(pkt.packet_type, pkt.data, pkt.namespace, pkt.id)]
+      self.count(MSGPACK, len(encoded[0]))
+      await self.eio.send(eio_sid, encoded[0])
+    if self.outbound is not None:
+      # ack / 콜백 / 연결 패킷은 항상 보내고 대기 바이트에만 더한다
+      self.outbound.sent(eio_sid, [len(p) for p in encoded])
+
+
+class _WireEmitMixin:
+  """브로드캐스트를 형식별로 한 번씩 인코딩해 받는 사람의 형식대로 보낸다 (AsyncManager.emit 대체)"""
+
+  async def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+    wire_formats = getattr(self.server, "wire_formats", None)
+    if callback or wire_formats is None:
+      # 콜백은 받는 사람마다 ack id가 달라 server._send_packet을 거치고, 거기서 형식을 고른다
+      return await super().emit(event, data, namespace, room=room, skip_sid=skip_sid,
+                                callback=callback, to=to, **kwargs)
+    room = to or room
+    if namespace not in self.rooms:
+      return
+    if isinstance(data, tuple):
+      data = list(data)
+    elif data is not None:
+      data = [data]
+    else:
+      data = []
+    if not isinstance(skip_sid, list):
+      skip_sid = [skip_sid]
+
+    encoded: Dict[str, List] = {}
+    tasks = []
+    for sid, eio_sid in self.get_participants(namespace, room):
+      if sid in skip_sid:
+        continue
+      fmt = wire_formats.get(eio_sid, JSON)
+      eio_pkts = encoded.get(fmt)
+      if eio_pkts is None:
+        if fmt == MSGPACK:
+          payloads = [encode_msgpack(packet.EVENT, [event] + data, namespace)]
+        else:
+          payloads = self.server.packet_class(packet.EVENT, namespace=namespace, data=[event] + data).encode()
+          if not isinstance(payloads, list):
+            payloads = [payloads]
+        eio_pkts = encoded[fmt] = [eio_packet.Packet(eio_packet.MESSAGE, p) for p in payloads]
+      self.server.count(fmt, sum(len(p.data) for p in eio_pkts))
+      tasks.append(asyncio.create_task(self.server._deliver(eio_sid, event, data, eio_pkts)))
+    if tasks:
+      await asyncio.wait(tasks)
+
+
+class WireManager(_WireEmitMixin, socketio.AsyncManager):
+  """단일 워커용 클라이언트 매니저"""
+
+
+class WireRedisManager(socketio.AsyncRedisManager, WireManager):
+  """여러 워커용 - redis pub/sub로 받은 emit을 이 워커의 연결에 형식별로 보낸다"""
@@ -0,0 +1,75 @@
+"""
+키워드 알림 매칭 벤치마크 - 기존 사용자 x 키워드 루프 vs Aho-Corasick 매처
+
+사용법: python backend/benchmark_keyword_matcher.py [사용자 수] [사용자당 키워드 수] [메시지 수]
+(기존 루프의 Mongo 조회 비용은 제외하고 매칭 CPU 시간만 비교)
+"""
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.keyword_matcher import KeywordMatcher  # noqa: E402
+
+WORDS = ["배포", "장애", "회의", "리뷰", "버그", "릴리즈", "서버", "점검", "일정", "보고서"]
+
+
+def random_word(rng: random.Random) -> str:
+  if rng.random() < 0.5:
+    return rng.choice(WORDS) + str(rng.randint(0, 99))
+  return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+
+def legacy_match(users, content: str, sender_id: str):
+  """main.py의 기존 키워드 알림 루프"""
+  matches = {}
+  for user_doc in users:
+    if user_doc["_id"] == sender_id:
+      continue
+    for keyword in user_doc.get("notification_keywords", []):
+      if keyword.lower() in content.lower():
+        matches[user_doc["_id"]] = keyword
+        break
+  return matches
+
+
+def main():
+  user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+  keywords_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+  message_count = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+  rng = random.Random(42)
+  users = [
+    {"_id": f"user_{i}", "notification_keywords": [random_word(rng) for _ in range(keywords_per_user)]}
+    for i in range(user_count)
+  ]
+  messages = [" ".join(random_word(rng) for _ in range(rng.randint(5, 40))) for _ in range(message_count)]
+
+  matcher = KeywordMatcher()
+  started = time.perf_counter()
+  matcher.load(users)
+  matcher.match("warmup")
+  build_time = time.perf_counter() - started
+
+  started = time.perf_counter()
+  legacy_results = [legacy_match(users, content, "user_0") for content in messages]
+  legacy_time = time.perf_counter() - started
+
+  started = time.perf_counter()
+  matcher_results = [matcher.match(content, exclude="user_0") for content in messages]
+  matcher_time = time.perf_counter() - started
+
+  assert legacy_results == matcher_results, "매칭 결과가 기존 루프와 다릅니다"
+
+  print(f"사용자 {user_count}명 x 키워드 {keywords_per_user}개, 메시지 {message_count}개")
+  print(f"  오토마톤 구성:   {build_time * 1000:8.1f} ms")
+  print(f"  기존 루프:       {legacy_time / message_count * 1000:8.3f} ms/메시지")
+  print(f"  Aho-Corasick:    {matcher_time / message_count * 1000:8.3f} ms/메시지")
+  print(f"  속도 향상:       {legacy_time / matcher_time:8.1f}x")
+
+
+if __name__ == "__main__":
+  main()
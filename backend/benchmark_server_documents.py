@@ -0,0 +1,186 @@
+"""
+서버 문서 벤치마크 - 임베디드 categories vs 정규화(server_categories / server_channels / channel_members)
+
+사용법: python backend/benchmark_server_documents.py [서버 수] [서버당 채널 수] [서버당 멤버 수] [반복 횟수]
+- 문서 크기(BSON)는 항상 계산한다.
+- MONGO_URI의 MongoDB에 연결되면 임시 DB에서 /state 조회, 채널 join(첫 입장/재입장), 서버 invite 지연도
+  측정하고 DB를 삭제한다.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import bson
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.channel_membership import ChannelMembership, ChannelPresence  # noqa: E402
+from app.server_store import ServerStore  # noqa: E402
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+CHANNELS_PER_CATEGORY = 10
+
+
+def member(i: int) -> dict:
+  return {"id": f"user_{i}", "name": f"사용자{i}", "avatar": "사", "status": "offline", "role": "member"}
+
+
+def build_server(index: int, channel_count: int, member_count: int) -> dict:
+  """모든 멤버가 모든 채널에 들어가 있는 임베디드 서버 문서 (초대 기본 동작)"""
+  members = [member(i) for i in range(member_count)]
+  categories = []
+  for c in range(0, channel_count, CHANNELS_PER_CATEGORY):
+    categories.append({
+      "id": f"cat_{index}_{c}",
+      "name": f"카테고리 {c}",
+      "collapsed": False,
+      "channels": [
+        {
+          "id": f"channel_{index}_{n}",
+          "name": f"채널 {n}",
+          "type": "text",
+          "unread": 0,
+          "members": list(members),
+          "is_private": False,
+          "allowed_roles": [],
+          "allowed_members": [],
+          "post_permission": "everyone",
+        }
+        for n in range(c, min(c + CHANNELS_PER_CATEGORY, channel_count))
+      ],
+    })
+  return {"_id": f"server_{index}", "name": f"서버 {index}", "avatar": "서", "categories": categories,
+          "members": members}
+
+
+def report_sizes(servers):
+  embedded = [len(bson.encode(doc)) for doc in servers]
+  thin = [len(bson.encode({k: v for k, v in doc.items() if k != "categories"})) for doc in servers]
+  channels = [
+    len(bson.encode({
+      **{k: v for k, v in ch.items() if k != "members"},
+      "_id": ch["id"], "server_id": doc["_id"], "category_id": cat["id"], "position": 0,
+    }))
+    for doc in servers for cat in doc["categories"] for ch in cat["channels"]
+  ]
+  membership = len(bson.encode({
+    "_id": "channel_0_0:user_0", "channel_id": "channel_0_0", "user_id": "user_0", "server_id": "server_0",
+    "name": "사용자0", "avatar": "사", "role": "member", "joined_at": 0,
+  }))
+  print("문서 크기 (BSON)")
+  print(f"  임베디드 서버 문서: 평균 {statistics.mean(embedded) / 1024:8.1f} KB, 최대 {max(embedded) / 1024:8.1f} KB")
+  print(f"  정규화 서버 문서:   평균 {statistics.mean(thin) / 1024:8.1f} KB, 최대 {max(thin) / 1024:8.1f} KB")
+  print(f"  정규화 채널 문서:   평균 {statistics.mean(channels) / 1024:8.1f} KB, 최대 {max(channels) / 1024:8.1f} KB")
+  print(f"  채널 멤버십 문서:   {membership} B")
+
+
+async def timed(label_times: dict, label: str, coro):
+  started = time.perf_counter()
+  await coro
+  label_times.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+
+
+async def legacy_invite(col, server_id: str, new_member: dict):
+  """기존 invite_to_server: 서버 문서를 읽어 모든 채널에 멤버를 넣고 categories 전체를 $set"""
+  server_doc = await col.find_one({"_id": server_id})
+  await col.update_one({"_id": server_id}, {"$addToSet": {"members": new_member}})
+  categories = server_doc.get("categories", [])
+  for cat in categories:
+    for ch in cat.get("channels", []):
+      ch.setdefault("members", []).append(new_member)
+  await col.update_one({"_id": server_id}, {"$set": {"categories": categories}})
+
+
+async def normalized_invite(store: ServerStore, server_id: str, new_member: dict):
+  await store.servers.update_one({"_id": server_id}, {"$addToSet": {"members": new_member}})
+  await store.membership.add(await store.channel_ids(server_id), new_member, server_id=server_id)
+
+
+async def legacy_join(col, channel_id: str, joiner: dict):
+  """기존 소켓 join: 입장할 때마다 임베디드 members에 $addToSet"""
+  await col.update_one(
+    {"categories.channels.id": channel_id},
+    {"$addToSet": {"categories.$[].channels.$[ch].members": joiner}},
+    array_filters=[{"ch.id": channel_id}],
+  )
+
+
+async def normalized_join(store: ServerStore, presence: ChannelPresence, sid: str, channel_id: str, joiner: dict):
+  """소켓 join: 처음 입장할 때만 멤버십 저장, 열람 상태는 메모리"""
+  if not await store.membership.is_member(channel_id, joiner["id"]):
+    await store.membership.add([channel_id], joiner)
+  presence.enter(sid, channel_id, joiner["id"])
+
+
+async def measure_latency(db, servers, iterations: int):
+  legacy_col = db["servers_embedded"]
+  await legacy_col.create_index([("members.id", 1)])
+  await legacy_col.insert_many([dict(doc) for doc in servers])
+
+  store = ServerStore(db["servers"], db["server_categories"], db["server_channels"],
+                      membership=ChannelMembership(db["channel_members"]))
+  presence = ChannelPresence()
+  await store.ensure_indexes()
+  await store.membership.ensure_indexes()
+  await db["servers"].create_index([("members.id", 1)])
+  await db["servers"].insert_many([dict(doc) for doc in servers])
+  await store.migrate_all()
+
+  times = {}
+  for i in range(iterations):
+    server = servers[i % len(servers)]
+    channel_id = server["categories"][0]["channels"][0]["id"]
+    joiner = member(100000 + i)
+    invitee = member(200000 + i)
+
+    await timed(times, "state 임베디드", legacy_col.find({"members.id": "user_0"}).to_list(None))
+    await timed(times, "state 정규화", store.find({"members.id": "user_0"}))
+
+    await timed(times, "join 임베디드", legacy_join(legacy_col, channel_id, joiner))
+    await timed(times, "join 정규화", normalized_join(store, presence, f"sid_{i}", channel_id, joiner))
+    # 재접속/채널 전환: 기존 코드는 매번 다시 쓰고, 정규화는 캐시만 확인
+    await timed(times, "rejoin 임베디드", legacy_join(legacy_col, channel_id, joiner))
+    await timed(times, "rejoin 정규화", normalized_join(store, presence, f"sid_{i}_2", channel_id, joiner))
+
+    await timed(times, "invite 임베디드", legacy_invite(legacy_col, server["_id"], invitee))
+    await timed(times, "invite 정규화", normalized_invite(store, server["_id"], invitee))
+
+  print(f"\n지연 (반복 {iterations}회, ms)")
+  for label, values in times.items():
+    values.sort()
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    print(f"  {label:16s} 평균 {statistics.mean(values):8.2f}  p95 {p95:8.2f}")
+
+
+async def main():
+  server_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+  channel_count = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+  member_count = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+  iterations = int(sys.argv[4]) if len(sys.argv) > 4 else 50
+
+  servers = [build_server(i, channel_count, member_count) for i in range(server_count)]
+  print(f"서버 {server_count}개 x 채널 {channel_count}개 x 멤버 {member_count}명")
+  report_sizes(servers)
+
+  client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=2000)
+  db_name = f"server_doc_bench_{uuid.uuid4().hex[:8]}"
+  try:
+    await client.admin.command("ping")
+  except Exception as e:
+    print(f"\nMongoDB에 연결할 수 없어 지연 측정을 건너뜁니다: {e}")
+    client.close()
+    return
+  try:
+    await measure_latency(client[db_name], servers, iterations)
+  finally:
+    await client.drop_database(db_name)
+    client.close()
+
+
+if __name__ == "__main__":
+  asyncio.run(main())
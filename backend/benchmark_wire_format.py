@@ -0,0 +1,104 @@
+"""
+Socket.IO 직렬화 벤치마크 - JSON 텍스트 vs MessagePack vs MessagePack + compact 스키마
+
+사용법: python backend/benchmark_wire_format.py [이벤트 수]
+(이벤트 종류별로 N개를 인코딩해 전송 바이트 합계와 서버 인코딩 CPU 시간을 비교, 기본 10000개)
+"""
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import msgpack
+from socketio import packet
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.wire_format import encode_msgpack  # noqa: E402
+
+
+def whiteboard_draw(rng: random.Random):
+  return {
+    "serverId": "server_3f9a1c2b7d", "channelId": "channel_8e21d0c4aa",
+    "drawData": {
+      "type": "path", "tool": "pen", "color": "#1e88e5", "size": 3,
+      "startX": rng.randint(0, 1600), "startY": rng.randint(0, 900),
+      "endX": rng.randint(0, 1600), "endY": rng.randint(0, 900),
+    },
+  }
+
+
+def webrtc_ice_candidate(rng: random.Random):
+  port = rng.randint(40000, 65000)
+  return {
+    "fromSid": uuid.uuid4().hex[:20], "channelId": "channel_8e21d0c4aa",
+    "candidate": {
+      "candidate": f"candidate:{rng.randint(1, 4 ** 10)} 1 udp 2122260223 192.168.0.{rng.randint(2, 254)} {port} typ host",
+      "sdpMid": "0", "sdpMLineIndex": 0, "usernameFragment": uuid.uuid4().hex[:4],
+    },
+  }
+
+
+def typing_start(rng: random.Random):
+  return {"channelId": "channel_8e21d0c4aa", "userId": f"user_{rng.randint(1, 500)}", "username": "김개발"}
+
+
+def user_read_update(rng: random.Random):
+  return {
+    "channelId": "channel_8e21d0c4aa", "userId": f"user_{rng.randint(1, 500)}",
+    "lastReadAt": datetime.now(timezone.utc).isoformat(),
+  }
+
+
+def message(rng: random.Random):
+  return {
+    "channelId": "channel_8e21d0c4aa",
+    "message": {
+      "id": uuid.uuid4().hex, "channel_id": "channel_8e21d0c4aa",
+      "sender": {"id": f"user_{rng.randint(1, 500)}", "name": "김개발", "avatar": "김"},
+      "content": "배포 끝났습니다. 리뷰 부탁드려요 " * rng.randint(1, 3),
+      "timestamp": datetime.now(timezone.utc).isoformat(),
+      "files": [], "thread_id": None, "reply_count": 0, "edited_at": None, "is_deleted": False, "reactions": [],
+    },
+  }
+
+
+EVENTS = [whiteboard_draw, webrtc_ice_candidate, typing_start, user_read_update, message]
+
+
+def encode_json(data):
+  return packet.Packet(packet.EVENT, data=data, namespace="/").encode()
+
+
+def encode_plain_msgpack(data):
+  return msgpack.dumps({"type": packet.EVENT, "data": data, "nsp": "/"})
+
+
+def encode_compact(data):
+  return encode_msgpack(packet.EVENT, data, "/")
+
+
+def measure(encoder, events):
+  started = time.process_time()
+  total = sum(len(encoder(data)) for data in events)
+  return total, time.process_time() - started
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+  rng = random.Random(42)
+
+  print(f"이벤트 {count}개당 전송 바이트 / 인코딩 CPU 시간")
+  print(f"{'event':<22}{'json':>18}{'msgpack':>18}{'msgpack+compact':>22}{'절감':>8}")
+  for make in EVENTS:
+    events = [[make.__name__, make(rng)] for _ in range(count)]
+    results = [measure(encoder, events) for encoder in (encode_json, encode_plain_msgpack, encode_compact)]
+    cells = [f"{size / 1024:>8.1f}KB {cpu * 1000:>6.1f}ms" for size, cpu in results]
+    saved = 1 - results[2][0] / results[0][0]
+    print(f"{make.__name__:<22}{cells[0]:>18}{cells[1]:>18}{cells[2]:>22}{saved:>8.0%}")
+
+
+if __name__ == "__main__":
+  main()
@@ -1,7 +1,9 @@
 """
 기존 서버들의 채널에 owner를 members로 추가하는 스크립트
+(임베디드 categories가 남아 있으면 먼저 migrate_normalize_channels.py 실행)
 """
 import asyncio
+from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 
@@ -20,6 +22,8 @@ async def fix_servers():
     client = AsyncIOMotorClient(MONGO_URI)
     db = client[MONGO_DB]
     servers_col = db["servers"]
+    channels_col = db["server_channels"]
+    channel_members_col = db["channel_members"]
     users_col = db["users"]
 
     print(f"MongoDB 연결: {MONGO_URI} / DB={MONGO_DB}")
@@ -44,33 +48,35 @@ async def fix_servers():
         owner = members[0]
         print(f"  Owner: {owner.get('name')} (ID: {owner.get('id')})")
 
-        # 모든 카테고리와 채널을 순회
-        categories = server_doc.get("categories", [])
+        # 서버의 모든 채널 순회 (멤버십은 channel_members 컬렉션에 (채널, 사용자)당 한 문서)
         modified = False
 
-        for cat in categories:
-            for ch in cat.get("channels", []):
-                channel_id = ch.get("id")
-                channel_name = ch.get("name")
-                channel_members = ch.get("members", [])
-
-                # Owner가 이미 채널 멤버인지 확인
-                owner_exists = any(m.get("id") == owner.get("id") for m in channel_members)
+        async for ch in channels_col.find({"server_id": server_id}):
+            channel_id = ch["_id"]
+            channel_name = ch.get("name")
+
+            # Owner가 이미 채널 멤버인지 확인 후 없으면 추가
+            result = await channel_members_col.update_one(
+                {"_id": f"{channel_id}:{owner.get('id')}"},
+                {"$setOnInsert": {
+                    "channel_id": channel_id,
+                    "user_id": owner.get("id"),
+                    "server_id": server_id,
+                    "name": owner.get("name"),
+                    "avatar": owner.get("avatar"),
+                    "role": owner.get("role", "owner"),
+                    "joined_at": datetime.now(timezone.utc),
+                }},
+                upsert=True,
+            )
 
-                if not owner_exists:
-                    print(f"  [+] 채널 '{channel_name}'에 owner 추가")
-                    channel_members.insert(0, owner)  # 맨 앞에 추가
-                    ch["members"] = channel_members
-                    modified = True
-                else:
-                    print(f"  [-] 채널 '{channel_name}'에 이미 owner 있음")
+            if result.upserted_id:
+                print(f"  [+] 채널 '{channel_name}'에 owner 추가")
+                modified = True
+            else:
+                print(f"  [-] 채널 '{channel_name}'에 이미 owner 있음")
 
-        # 서버 업데이트
         if modified:
-            await servers_col.update_one(
-                {"_id": server_id},
-                {"$set": {"categories": categories}}
-            )
             updated_count += 1
             print(f"  [OK] 서버 업데이트 완료")
         else:
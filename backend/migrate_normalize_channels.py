@@ -0,0 +1,79 @@
+"""
+서버 문서에 임베디드된 카테고리/채널을 server_categories / server_channels 컬렉션으로,
+채널 멤버 목록을 channel_members 컬렉션으로 옮기는 스크립트
+
+- 서버 하나씩 카테고리/채널을 upsert 한 뒤 서버 문서의 categories 필드를 제거한다.
+- 채널 문서에 남아 있는 members 배열도 channel_members로 옮기고 제거한다.
+- perm_mask(채널 권한 비트마스크)가 없는 채널 문서에 채워 넣는다.
+- categories / members 필드가 남아 있는 문서만 처리하므로, 중간에 중단돼도 다시 실행하면 이어서 진행된다.
+- 백엔드 시작 시에도 같은 이전을 수행하지만, 서버가 많으면 배포 전에 이 스크립트로 먼저 옮긴다.
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.channel_membership import ChannelMembership  # noqa: E402
+from app.server_store import ServerStore  # noqa: E402
+
+# 환경변수 로드
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except:
+    pass
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "work_messenger")
+
+async def migrate_servers():
+    # MongoDB 연결
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client[MONGO_DB]
+    membership = ChannelMembership(db["channel_members"])
+    store = ServerStore(db["servers"], db["server_categories"], db["server_channels"], membership=membership)
+
+    print(f"MongoDB 연결: {MONGO_URI} / DB={MONGO_DB}")
+
+    await store.ensure_indexes()
+    await membership.ensure_indexes()
+
+    remaining = await db["servers"].count_documents({"categories": {"$exists": True}})
+    print(f"이전 대상 서버: {remaining}개")
+
+    migrated_count = 0
+    async for server_doc in db["servers"].find({"categories": {"$exists": True}}):
+        server_id = server_doc["_id"]
+        server_name = server_doc.get("name", "Unknown")
+        categories = server_doc.get("categories") or []
+        channel_count = sum(len(cat.get("channels", [])) for cat in categories)
+
+        await store.migrate_server(server_doc)
+        migrated_count += 1
+        print(f"  [OK] {server_name} (ID: {server_id}) - 카테고리 {len(categories)}개, 채널 {channel_count}개")
+
+    # 1차 이전(카테고리/채널만)에서 채널 문서에 남은 멤버 목록
+    channel_count = 0
+    async for channel_doc in db["server_channels"].find({"members": {"$exists": True}}):
+        await store.migrate_channel_members(channel_doc)
+        channel_count += 1
+    if channel_count:
+        print(f"  [OK] 채널 {channel_count}개의 멤버 목록을 channel_members로 이전")
+
+    # 권한 비트마스크(perm_mask)가 없는 채널
+    backfilled = await store.backfill_permission_masks()
+    if backfilled:
+        print(f"  [OK] 채널 {backfilled}개에 perm_mask 저장")
+
+    print(f"\n\n{'='*60}")
+    print(f"총 {migrated_count}개 서버 이전 완료!")
+    print(f"{'='*60}")
+
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(migrate_servers())
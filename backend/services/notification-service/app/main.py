@@ -6,7 +6,9 @@ Port: 8005
 import os
 import sys
 import uuid
+import base64
 from datetime import datetime, timezone
+from typing import Optional
 from fastapi import FastAPI, HTTPException, Depends, Body
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -16,6 +18,9 @@ from shared.auth import get_current_user_id
 
 app = FastAPI(title="Notification Service", version="1.0.0")
 
+# 보존 정책 (일 단위, 모놀리스 backend/app과 같은 환경 변수)
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -28,6 +33,36 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup():
     await connect_db()
+    cols = get_collections()
+    try:
+        # 알림 TTL + 키셋 목록 인덱스 + 안 읽은 알림 부분 인덱스
+        await cols["notifications"].create_index(
+            [("created_at", 1)], name="notif_ttl",
+            expireAfterSeconds=NOTIFICATION_RETENTION_DAYS * 86400
+        )
+        await cols["notifications"].create_index(
+            [("user_id", 1), ("created_at", -1), ("_id", -1)], name="user_created_keyset"
+        )
+        await cols["notifications"].create_index(
+            [("user_id", 1), ("created_at", -1)], name="user_unread_partial",
+            partialFilterExpression={"read": False}
+        )
+    except Exception as e:
+        print(f"[Notification] 인덱스 생성 실패: {e}")
+
+
+def _encode_cursor(doc: dict) -> str:
+    raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, notif_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), notif_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @app.get("/health")
@@ -38,21 +73,31 @@ async def health():
 @app.get("/notifications")
 async def get_notifications(
     user_id: str = Depends(get_current_user_id),
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None
 ):
-    """Get user notifications"""
+    """Get user notifications (keyset pagination via next_cursor)"""
     cols = get_collections()
-    
-    cursor = cols["notifications"].find(
-        {"user_id": user_id}
-    ).sort("created_at", -1).limit(limit)
-    
-    notifications = await cursor.to_list(length=limit)
-    
+    limit = max(1, min(limit, 100))
+
+    query = {"user_id": user_id}
+    if cursor:
+        created_at, notif_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": notif_id}},
+        ]
+
+    notifications = await cols["notifications"].find(query).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).limit(limit).to_list(length=limit)
+
+    next_cursor = _encode_cursor(notifications[-1]) if len(notifications) == limit else None
+
     for notif in notifications:
         notif["id"] = notif.pop("_id")
     
-    return {"notifications": notifications}
+    return {"notifications": notifications, "next_cursor": next_cursor}
 
 
 @app.post("/notifications/{notif_id}/read")
@@ -73,11 +118,11 @@ async def mark_read(
 
 @app.post("/notifications/read-all")
 async def mark_all_read(user_id: str = Depends(get_current_user_id)):
-    """Mark all notifications as read"""
+    """Mark all notifications as read (unread rows only, via user_unread_partial)"""
     cols = get_collections()
     
     await cols["notifications"].update_many(
-        {"user_id": user_id},
+        {"user_id": user_id, "read": False},
         {"$set": {"read": True}}
     )
     
@@ -2,6 +2,9 @@
 Server Service
 Handles servers, categories, and channels
 Port: 8004
+
+Categories and channels are stored in server_categories / server_channels
+(one document each), the same layout the monolith's ServerStore reads and writes.
 """
 import os
 import sys
@@ -36,6 +39,41 @@ async def health():
     return {"status": "ok", "service": "server"}
 
 
+async def _next_position(collection, query: dict) -> int:
+    last = await collection.find_one(query, {"position": 1}, sort=[("position", -1)])
+    return last["position"] + 1 if last else 0
+
+
+async def _hydrate(cols, servers: List[dict]) -> List[dict]:
+    """Fill categories/channels from server_categories / server_channels (same shape as the monolith)"""
+    server_ids = [s["_id"] for s in servers if "categories" not in s]
+    categories_by_server = {}
+    categories_by_id = {}
+    cursor = cols["server_categories"].find({"server_id": {"$in": server_ids}}).sort("position", 1)
+    async for cat_doc in cursor:
+        category = {
+            "id": cat_doc["_id"],
+            "name": cat_doc["name"],
+            "collapsed": cat_doc.get("collapsed", False),
+            "channels": [],
+        }
+        categories_by_server.setdefault(cat_doc["server_id"], []).append(category)
+        categories_by_id[cat_doc["_id"]] = category
+
+    cursor = cols["server_channels"].find({"server_id": {"$in": server_ids}}).sort("position", 1)
+    async for ch_doc in cursor:
+        category = categories_by_id.get(ch_doc.get("category_id"))
+        if category is not None:
+            channel = {k: v for k, v in ch_doc.items() if k not in ("_id", "category_id", "position")}
+            channel["id"] = ch_doc["_id"]
+            category["channels"].append(channel)
+
+    for server in servers:
+        if "categories" not in server:
+            server["categories"] = categories_by_server.get(server["_id"], [])
+    return servers
+
+
 @app.get("/state")
 async def get_state(user_id: str = Depends(get_current_user_id)):
     """Get all servers for current user"""
@@ -43,7 +81,7 @@ async def get_state(user_id: str = Depends(get_current_user_id)):
     
     # Find servers where user is a member
     cursor = cols["servers"].find({"members.id": user_id})
-    servers = await cursor.to_list(length=100)
+    servers = await _hydrate(cols, await cursor.to_list(length=100))
     
     result = []
     for server in servers:
@@ -67,7 +105,41 @@ async def create_server(
         raise HTTPException(status_code=404, detail="User not found")
     
     server_id = f"server_{uuid.uuid4().hex[:8]}"
+    category_id = f"cat_{uuid.uuid4().hex[:8]}"
     channel_id = f"channel_{uuid.uuid4().hex[:8]}"
+    owner = {
+        "id": user_id,
+        "name": user_doc["name"],
+        "avatar": user_doc.get("avatar", "U"),
+        "role": "owner"
+    }
+    
+    # Categories and channels live in their own collections; the server document stays thin
+    await cols["server_categories"].insert_one({
+        "_id": category_id,
+        "server_id": server_id,
+        "name": "일반",
+        "collapsed": False,
+        "position": 0,
+    })
+    await cols["server_channels"].insert_one({
+        "_id": channel_id,
+        "server_id": server_id,
+        "category_id": category_id,
+        "position": 0,
+        "name": "general",
+        "type": "text",
+    })
+    await cols["channel_members"].insert_one({
+        "_id": f"{channel_id}:{user_id}",
+        "channel_id": channel_id,
+        "user_id": user_id,
+        "server_id": server_id,
+        "joined_at": datetime.now(timezone.utc),
+        "name": owner["name"],
+        "avatar": owner["avatar"],
+        "role": "owner",
+    })
     
     new_server = {
         "_id": server_id,
@@ -75,33 +147,19 @@ async def create_server(
         "icon": data.get("icon"),
         "owner_id": user_id,
         "created_at": datetime.now(timezone.utc),
-        "members": [{
-            "id": user_id,
-            "name": user_doc["name"],
-            "avatar": user_doc.get("avatar", "U"),
-            "role": "owner"
-        }],
-        "categories": [{
-            "id": f"cat_{uuid.uuid4().hex[:8]}",
-            "name": "일반",
-            "channels": [{
-                "id": channel_id,
-                "name": "general",
-                "type": "text",
-                "unread": 0,
-                "members": [{
-                    "id": user_id,
-                    "name": user_doc["name"],
-                    "avatar": user_doc.get("avatar", "U"),
-                    "role": "owner"
-                }]
-            }]
-        }]
+        "members": [owner],
+        "version": 0,
     }
     
     await cols["servers"].insert_one(new_server)
     
     new_server["id"] = new_server.pop("_id")
+    new_server["categories"] = [{
+        "id": category_id,
+        "name": "일반",
+        "collapsed": False,
+        "channels": [{"id": channel_id, "name": "general", "type": "text", "server_id": server_id}]
+    }]
     return new_server
 
 
@@ -128,9 +186,10 @@ async def update_server(
         update_data["icon"] = data["icon"]
     
     if update_data:
+        # 모놀리스 /state 캐시는 (server_id, role, version) 키라 버전을 올려야 새 이름/아이콘을 보낸다
         await cols["servers"].update_one(
             {"_id": server_id},
-            {"$set": update_data}
+            {"$set": update_data, "$inc": {"version": 1}}
         )
     
     return {"status": "ok"}
@@ -152,6 +211,9 @@ async def delete_server(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     await cols["servers"].delete_one({"_id": server_id})
+    await cols["server_categories"].delete_many({"server_id": server_id})
+    await cols["server_channels"].delete_many({"server_id": server_id})
+    await cols["channel_members"].delete_many({"server_id": server_id})
     
     return {"status": "deleted"}
 
@@ -166,23 +228,23 @@ async def create_category(
     """Create a new category"""
     cols = get_collections()
     
-    category_id = f"cat_{uuid.uuid4().hex[:8]}"
-    
-    new_category = {
-        "id": category_id,
-        "name": data.get("name", "New Category"),
-        "channels": []
-    }
-    
-    result = await cols["servers"].update_one(
-        {"_id": server_id},
-        {"$push": {"categories": new_category}}
-    )
-    
-    if result.modified_count == 0:
+    if await cols["servers"].count_documents({"_id": server_id}, limit=1) == 0:
         raise HTTPException(status_code=404, detail="Server not found")
     
-    return new_category
+    category_id = f"cat_{uuid.uuid4().hex[:8]}"
+    name = data.get("name", "New Category")
+    
+    position = await _next_position(cols["server_categories"], {"server_id": server_id})
+    await cols["server_categories"].insert_one({
+        "_id": category_id,
+        "server_id": server_id,
+        "name": name,
+        "collapsed": False,
+        "position": position,
+    })
+    await cols["servers"].update_one({"_id": server_id}, {"$inc": {"version": 1}})
+    
+    return {"id": category_id, "name": name, "collapsed": False, "channels": []}
 
 
 # Channels
@@ -196,25 +258,28 @@ async def create_channel(
     """Create a new channel"""
     cols = get_collections()
     
-    channel_id = f"channel_{uuid.uuid4().hex[:8]}"
+    category_query = {"_id": category_id, "server_id": server_id}
+    if await cols["server_categories"].count_documents(category_query, limit=1) == 0:
+        raise HTTPException(status_code=404, detail="Category not found")
     
-    new_channel = {
-        "id": channel_id,
-        "name": data.get("name", "new-channel"),
-        "type": data.get("type", "text"),
-        "unread": 0,
-        "members": []
-    }
+    channel_id = f"channel_{uuid.uuid4().hex[:8]}"
+    name = data.get("name", "new-channel")
+    channel_type = data.get("type", "text")
     
-    result = await cols["servers"].update_one(
-        {"_id": server_id, "categories.id": category_id},
-        {"$push": {"categories.$.channels": new_channel}}
+    position = await _next_position(
+        cols["server_channels"], {"server_id": server_id, "category_id": category_id}
     )
-    
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Category not found")
-    
-    return new_channel
+    await cols["server_channels"].insert_one({
+        "_id": channel_id,
+        "server_id": server_id,
+        "category_id": category_id,
+        "position": position,
+        "name": name,
+        "type": channel_type,
+    })
+    await cols["servers"].update_one({"_id": server_id}, {"$inc": {"version": 1}})
+    
+    return {"id": channel_id, "name": name, "type": channel_type, "server_id": server_id}
 
 
 # Members
@@ -241,7 +306,7 @@ async def add_member(
     
     result = await cols["servers"].update_one(
         {"_id": server_id},
-        {"$push": {"members": new_member}}
+        {"$push": {"members": new_member}, "$inc": {"version": 1}}
     )
     
     if result.modified_count == 0:
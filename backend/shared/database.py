@@ -26,6 +26,9 @@ bookmarks_col = None
 audit_logs_col = None
 password_reset_tokens_col = None
 user_sessions_col = None
+server_categories_col = None
+server_channels_col = None
+channel_members_col = None
 
 
 async def connect_db():
@@ -33,6 +36,7 @@ async def connect_db():
     global client, db, users_col, servers_col, messages_col
     global notifications_col, reminders_col, bookmarks_col
     global audit_logs_col, password_reset_tokens_col, user_sessions_col
+    global server_categories_col, server_channels_col, channel_members_col
     
     client = AsyncIOMotorClient(MONGO_URI)
     db = client[MONGO_DB]
@@ -47,6 +51,9 @@ async def connect_db():
     audit_logs_col = db["audit_logs"]
     password_reset_tokens_col = db["password_reset_tokens"]
     user_sessions_col = db["user_sessions"]
+    server_categories_col = db["server_categories"]
+    server_channels_col = db["server_channels"]
+    channel_members_col = db["channel_members"]
     
     print(f"[Database] Connected to MongoDB: {MONGO_URI} / {MONGO_DB}")
     return db
@@ -77,4 +84,7 @@ def get_collections():
         "audit_logs": audit_logs_col,
         "password_reset_tokens": password_reset_tokens_col,
         "user_sessions": user_sessions_col,
+        "server_categories": server_categories_col,
+        "server_channels": server_channels_col,
+        "channel_members": channel_members_col,
     }
@@ -0,0 +1,160 @@
+"""
+메일 큐 테스트 하네스 - 로컬 aiosmtpd SMTP 서버로 발송/재시도/dead letter 확인
+
+사용법: python backend/test_mail_queue.py
+(MONGO_URI의 MongoDB가 필요하며, 임시 DB를 만들고 끝나면 삭제한다)
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+from aiosmtpd.controller import Controller
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.mail_queue import MailQueue  # noqa: E402
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+SMTP_PORT = int(os.getenv("TEST_SMTP_PORT", "8025"))
+
+
+class RecordingHandler:
+  """받은 메일과 SMTP 세션을 기록하고, 지정한 만큼 일시/영구 오류를 돌려주는 핸들러"""
+
+  def __init__(self):
+    self.messages = []
+    self.sessions = set()
+    self.transient_failures = 0
+
+  async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+    if address.startswith("bounce"):
+      return "550 No such user"
+    envelope.rcpt_tos.append(address)
+    return "250 OK"
+
+  async def handle_DATA(self, server, session, envelope):
+    self.sessions.add(id(session))
+    if self.transient_failures > 0:
+      self.transient_failures -= 1
+      return "451 Try again later"
+    self.messages.append(envelope)
+    return "250 Message accepted for delivery"
+
+
+def make_queue(db) -> MailQueue:
+  return MailQueue(
+    db["mail_queue"],
+    db["mail_dead_letters"],
+    hostname="127.0.0.1",
+    port=SMTP_PORT,
+    from_email="noreply@example.com",
+    start_tls=False,
+    workers=1,
+    batch_size=10,
+    base_delay=0.1,
+    max_delay=0.5,
+    poll_interval=0.1,
+  )
+
+
+async def check_batch_with_connection_reuse(db, handler):
+  queue = make_queue(db)
+  queue.start()
+  for i in range(25):
+    await queue.enqueue(f"user{i}@example.com", f"제목 {i}", f"<p>본문 {i}</p>")
+  assert await queue.drain(timeout=15), "큐가 비워지지 않았습니다"
+  await queue.stop()
+
+  assert len(handler.messages) == 25, len(handler.messages)
+  assert queue.stats["connections"] == 1, queue.stats
+  print(f"[ok] 25통 발송, SMTP 연결 {queue.stats['connections']}회")
+
+
+async def check_transient_retry(db, handler):
+  handler.messages.clear()
+  handler.transient_failures = 2
+  queue = make_queue(db)
+  queue.start()
+  await queue.enqueue("retry@example.com", "재시도", "<p>451 이후 성공</p>")
+  assert await queue.drain(timeout=15), "재시도 메일이 남아 있습니다"
+  await queue.stop()
+
+  assert len(handler.messages) == 1
+  assert queue.stats["retried"] == 2, queue.stats
+  print(f"[ok] 일시 오류 {queue.stats['retried']}회 후 발송")
+
+
+async def check_dead_letter(db, handler):
+  queue = make_queue(db)
+  queue.start()
+  mail_id = await queue.enqueue("bounce@example.com", "반송", "<p>550</p>")
+  assert await queue.drain(timeout=15), "반송 메일이 큐에 남아 있습니다"
+  await queue.stop()
+
+  dead = await db["mail_dead_letters"].find_one({"_id": mail_id})
+  assert dead is not None and dead["status"] == "dead", dead
+  print(f"[ok] 영구 오류 메일 dead letter 이동: {dead['last_error']}")
+
+
+async def check_reclaimed_lease_skipped(db, handler):
+  handler.messages.clear()
+  queue = make_queue(db)
+  await queue.enqueue("slow@example.com", "lease", "<p>lease</p>")
+  batch = await queue._claim_batch("worker_a")
+  # worker_a가 멈춘 사이 lease가 만료되어 다른 워커가 가져간 상황
+  await db["mail_queue"].update_one({"_id": batch[0]["_id"]}, {"$set": {"lease_owner": "worker_b"}})
+  await queue._send_batch(None, batch, "worker_a")
+
+  assert handler.messages == [], handler.messages
+  assert queue.stats["lease_lost"] == 1, queue.stats
+  await db["mail_queue"].delete_many({})
+  print("[ok] 다른 워커가 가져간 메일은 중복 발송하지 않음")
+
+
+async def check_worker_survives_errors(db, handler):
+  handler.messages.clear()
+  queue = make_queue(db)
+  claim = queue._claim_batch
+  failures = [RuntimeError("mongo down")]
+
+  async def flaky_claim(owner):
+    if failures:
+      raise failures.pop()
+    return await claim(owner)
+
+  queue._claim_batch = flaky_claim
+  queue.start()
+  await queue.enqueue("after-error@example.com", "복구", "<p>복구</p>")
+  assert await queue.drain(timeout=15), "워커 오류 후 큐가 비워지지 않았습니다"
+  await queue.stop()
+
+  assert len(handler.messages) == 1 and queue.stats["worker_errors"] == 1, queue.stats
+  print("[ok] 워커 루프 오류 후 백오프하고 계속 발송")
+
+
+async def main():
+  handler = RecordingHandler()
+  controller = Controller(handler, hostname="127.0.0.1", port=SMTP_PORT)
+  controller.start()
+
+  client = AsyncIOMotorClient(MONGO_URI)
+  db_name = f"mail_queue_test_{uuid.uuid4().hex[:8]}"
+  db = client[db_name]
+  try:
+    await check_batch_with_connection_reuse(db, handler)
+    await check_transient_retry(db, handler)
+    await check_dead_letter(db, handler)
+    await check_reclaimed_lease_skipped(db, handler)
+    await check_worker_survives_errors(db, handler)
+    print("모든 메일 큐 확인 통과")
+  finally:
+    await client.drop_database(db_name)
+    client.close()
+    controller.stop()
+
+
+if __name__ == "__main__":
+  asyncio.run(main())
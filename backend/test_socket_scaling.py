@@ -0,0 +1,218 @@
+"""
+멀티 워커 Socket.IO 테스트 하네스 - app.main 워커 2개를 로컬 Redis / MongoDB로 띄워 워커 간 동작 확인
+
+사용법: REDIS_URL=redis://localhost:6379/15 MONGO_URI=mongodb://localhost:27017 python backend/test_socket_scaling.py
+(실행마다 새 Mongo DB를 만들고 끝나면 지운다. main.py의 Redis 키 이름은 고정이므로 REDIS_URL은 비어 있는
+ 테스트용 DB를 가리켜야 하며, 끝나면 소켓 상태 키(socket:* / presence:* / ratelimit:*)를 지운다)
+
+각 워커는 별도 프로세스의 uvicorn에서 app.main:app을 그대로 띄우므로 REST 인증, 권한 확인, 캐시 무효화 버스,
+presence 정리까지 main.py의 배선을 그대로 거친다. 클라이언트는 REST로 가입/서버 생성/초대를 하고 JWT로 소켓에 붙는다.
+"""
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import aiohttp
+import socketio
+import uvicorn
+from motor.motor_asyncio import AsyncIOMotorClient
+
+BACKEND_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.shared_state import connect_redis  # noqa: E402
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/15")
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+BASE_PORT = int(os.getenv("TEST_SOCKET_PORT", "8101"))
+PRESENCE_STALE = 3.0  # 죽은 워커 정리를 기다리는 시간을 줄인다
+REDIS_KEY_PATTERNS = ("socket:*", "presence:*", "ratelimit:*")
+
+
+def run_worker(port: int, env: dict):
+  """워커 하나 - main.py가 import 시점에 환경 변수를 읽으므로 먼저 설정한다"""
+  os.environ.update(env)
+  os.chdir(BACKEND_DIR)
+  uvicorn.run("app.main:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def url(port: int, path: str = "") -> str:
+  return f"http://127.0.0.1:{port}{path}"
+
+
+async def wait_ready(http: aiohttp.ClientSession, port: int):
+  for _ in range(300):
+    try:
+      async with http.get(url(port, "/health")) as resp:
+        if resp.status == 200:
+          return
+    except aiohttp.ClientError:
+      pass
+    await asyncio.sleep(0.1)  # 워커 기동 대기 (Mongo 인덱스 생성 포함)
+  raise RuntimeError(f"워커 {port}가 뜨지 않았습니다")
+
+
+async def signup(http: aiohttp.ClientSession, port: int, name: str) -> dict:
+  username = f"{name}_{uuid.uuid4().hex[:6]}"
+  payload = {"username": username, "name": name, "email": f"{username}@example.com", "password": "scaling-test"}
+  async with http.post(url(port, "/auth/signup"), json=payload) as resp:
+    assert resp.status == 201, await resp.text()
+    body = await resp.json()
+  return {"id": body["user"]["id"], "headers": {"Authorization": f"Bearer {body['access_token']}"},
+          "token": body["access_token"]}
+
+
+async def connect_client(port: int, user: dict) -> socketio.AsyncClient:
+  # 죽인 워커에 다시 붙지 않도록 재접속은 끈다
+  client = socketio.AsyncClient(reconnection=False)
+  await client.connect(url(port), auth={"token": user["token"]}, transports=["websocket"])
+  return client
+
+
+def next_event(client: socketio.AsyncClient, event: str, match=lambda data: True) -> asyncio.Future:
+  """다음에 오는 event 중 match를 만족하는 것"""
+  future = asyncio.get_running_loop().create_future()
+
+  def handler(data):
+    if not future.done() and match(data):
+      future.set_result(data)
+
+  client.on(event, handler)
+  return future
+
+
+async def autocomplete_status(http: aiohttp.ClientSession, port: int, server_id: str, user: dict) -> int:
+  async with http.get(url(port, f"/servers/{server_id}/members/autocomplete"), headers=user["headers"]) as resp:
+    return resp.status
+
+
+async def check_cache_invalidation(http, ports, server_id, channel_id, alice, bob, bob_ws):
+  # 워커 2가 초대 전 상태(비멤버)를 캐시해 둔 뒤, 워커 1에서 초대한다
+  assert await autocomplete_status(http, ports[1], server_id, bob) == 403
+  assert await bob_ws.call("join", {"channelId": channel_id}) is False
+  async with http.post(url(ports[0], f"/servers/{server_id}/invite"), json={"user_id": bob["id"]},
+                       headers=alice["headers"]) as resp:
+    assert resp.status == 200, await resp.text()
+  await asyncio.sleep(0.3)  # pub/sub 전파
+  assert await autocomplete_status(http, ports[1], server_id, bob) == 200
+  assert await bob_ws.call("join", {"channelId": channel_id}) is True
+  print("[ok] 워커 1의 초대가 워커 2의 @멘션 디렉터리 / 권한 캐시에 바로 반영")
+
+
+async def check_broadcast_and_notepad(server_id, channel_id, alice_ws, bob_ws):
+  received = next_event(bob_ws, "notepad_update")
+  await alice_ws.call("notepad_update", {"serverId": server_id, "channelId": channel_id, "content": "회의록"})
+  assert (await asyncio.wait_for(received, 5))["content"] == "회의록"
+  content = next_event(bob_ws, "notepad_content")
+  await bob_ws.call("notepad_join", {"serverId": server_id, "channelId": channel_id})
+  assert (await asyncio.wait_for(content, 5))["content"] == "회의록"
+  print("[ok] 워커 1의 채널 룸 브로드캐스트를 워커 2가 수신, 메모장 내용 공유")
+
+
+async def bob_call_participants(bob_ws, channel_id) -> list:
+  participants = next_event(bob_ws, "call_participants")
+  await bob_ws.call("call_join", {"channelId": channel_id})
+  return (await asyncio.wait_for(participants, 5))["participants"]
+
+
+async def check_shared_calls(channel_id, alice, bob, alice_ws, bob_ws):
+  await alice_ws.call("call_join", {"channelId": channel_id})
+  participants = await bob_call_participants(bob_ws, channel_id)
+  assert sorted(p["id"] for p in participants) == sorted([alice["id"], bob["id"]]), participants
+  print("[ok] 워커 1의 통화 참가자를 워커 2에서 조회")
+
+
+async def check_dead_worker(server_id, channel_id, alice, bob, alice_tab2, bob_ws, worker):
+  def alice_offline(data):
+    return data.get("serverId") == server_id and any(
+      u["userId"] == alice["id"] and u["status"] == "offline" for u in data["users"]
+    )
+
+  # 워커 1을 disconnect 없이 죽여도 alice는 워커 2의 탭으로 online이고, 죽은 sid는 통화 참가자에서 빠진다
+  early_offline = next_event(bob_ws, "presence_update", alice_offline)
+  worker.kill()
+  worker.join(timeout=5)
+  await asyncio.sleep(PRESENCE_STALE * 2)
+  assert not early_offline.done(), early_offline.result()
+  participants = await bob_call_participants(bob_ws, channel_id)
+  assert [p["id"] for p in participants] == [bob["id"]], participants
+  print("[ok] 워커 1이 죽어도 워커 2의 탭으로 online 유지, 죽은 워커의 통화 참가자는 정리")
+
+  offline = next_event(bob_ws, "presence_update", alice_offline)
+  await alice_tab2.disconnect()
+  await asyncio.wait_for(offline, 5)
+  print("[ok] 마지막 기기 종료 시 presence_update offline 전송")
+
+
+async def main():
+  prefix = f"scaling_test_{uuid.uuid4().hex[:8]}"
+  vector_dir = tempfile.mkdtemp(prefix=f"{prefix}_vectors_")
+  env = {
+    "REDIS_URL": REDIS_URL,
+    "MONGO_URI": MONGO_URI,
+    "MONGO_DB": prefix,
+    "VECTOR_INDEX_DIR": vector_dir,
+    "PRESENCE_STALE_SECONDS": str(PRESENCE_STALE),
+    "PRESENCE_BROADCAST_WINDOW": "0.05",
+  }
+  ports = [BASE_PORT, BASE_PORT + 1]
+  ctx = multiprocessing.get_context("spawn")
+  workers = [ctx.Process(target=run_worker, args=(port, env), daemon=True) for port in ports]
+  for worker in workers:
+    worker.start()
+
+  redis = connect_redis(REDIS_URL)
+  clients = []
+  try:
+    async with aiohttp.ClientSession() as http:
+      for port in ports:
+        await wait_ready(http, port)
+      alice = await signup(http, ports[0], "alice")
+      bob = await signup(http, ports[0], "bob")
+      async with http.post(url(ports[0], "/servers"), json={"name": "scaling"}, headers=alice["headers"]) as resp:
+        assert resp.status == 201, await resp.text()
+        server = await resp.json()
+      server_id = server["id"]
+      channel_id = server["categories"][0]["channels"][0]["id"]
+
+      bob_ws = await connect_client(ports[1], bob)
+      clients.append(bob_ws)
+      await check_cache_invalidation(http, ports, server_id, channel_id, alice, bob, bob_ws)
+
+    alice_ws = await connect_client(ports[0], alice)
+    clients.append(alice_ws)
+    assert await alice_ws.call("join", {"channelId": channel_id}) is True
+    await bob_ws.call("join_server", {"serverId": server_id})  # presence / 음성 상태 룸
+
+    await check_broadcast_and_notepad(server_id, channel_id, alice_ws, bob_ws)
+    await check_shared_calls(channel_id, alice, bob, alice_ws, bob_ws)
+
+    alice_tab2 = await connect_client(ports[1], alice)
+    clients.append(alice_tab2)
+    await check_dead_worker(server_id, channel_id, alice, bob, alice_tab2, bob_ws, workers[0])
+    print("모든 멀티 워커 확인 통과")
+  finally:
+    for client in clients:
+      if client.connected:
+        await client.disconnect()
+    for worker in workers:
+      worker.terminate()
+      worker.join(timeout=5)
+    for pattern in REDIS_KEY_PATTERNS:
+      keys = [key async for key in redis.scan_iter(pattern)]
+      if keys:
+        await redis.delete(*keys)
+    await redis.aclose()
+    mongo = AsyncIOMotorClient(MONGO_URI)
+    await mongo.drop_database(prefix)
+    mongo.close()
+    shutil.rmtree(vector_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+  asyncio.run(main())
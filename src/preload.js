@@ -166,7 +166,8 @@ contextBridge.exposeInMainWorld('electronAPI', {
       forceNew: true,
       upgrade: true,
       closeOnBeforeunload: false,
-      // auth 제거하여 테스트 - python-socketio가 auth 처리 안할 수 있음
+      // connect 시 서버가 JWT를 검증하고 사용자 정보를 소켓 세션에 저장
+      auth: token ? { token } : undefined,
     };
 
     console.log('[Preload] Socket options:', socketOptions);
@@ -61,6 +61,11 @@ export class ChatManager {
             this.handleNotificationReceived(data);
         });
 
+        // 재접속 시 오프라인 동안 쌓인 알림 요약
+        this.app.eventBus.on('NOTIFICATION_DIGEST', (data) => {
+            this.handleNotificationDigest(data);
+        });
+
         // 메시지 삭제 이벤트
         this.app.eventBus.on('MESSAGE_DELETED', (data) => {
             this.handleMessageDeleted(data);
@@ -736,7 +741,7 @@ export class ChatManager {
         document.querySelectorAll('.read-receipts').forEach(el => el.innerHTML = '');
 
         // For each member (except me), find the latest message they've read
-        const members = this.app.serverManager.currentChannel?.members || [];
+        const members = this.app.serverManager.channelMembers?.[channelId] || this.app.serverManager.currentChannel?.members || [];
         const myId = this.app.auth.currentUser?.id;
 
         members.forEach(member => {
@@ -1044,6 +1049,23 @@ export class ChatManager {
         }
     }
 
+    handleNotificationReceived(data) {
+        // 보고 있는 채널의 알림은 표시하지 않음
+        if (!data || data.channel_id === this.app.serverManager.currentChannel?.id) return;
+
+        const title = data.type === 'mention' ? `${data.trigger} 멘션` : `키워드 알림: ${data.trigger}`;
+        const body = (data.content || '').replace(/<[^>]*>/g, '');
+        if (window.electronAPI?.showNotification) {
+            window.electronAPI.showNotification({ title, body });
+        }
+        this.app.uiManager.showToast(`${title} - ${body}`, 'info');
+    }
+
+    handleNotificationDigest(data) {
+        if (!data?.total) return;
+        this.app.uiManager.showToast(`오프라인 동안 새 알림 ${data.total}개가 도착했습니다.`, 'info', 5000);
+    }
+
     handleReminderNotification(data) {
         // Display reminder notification
         const { text, message_id, channel_id } = data;
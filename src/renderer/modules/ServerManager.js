@@ -34,6 +34,20 @@ export class ServerManager {
             this.handleMemberLeft(data);
         });
 
+        // 일괄 초대/추방 이벤트 (채널별로 한 번)
+        this.app.eventBus.on('MEMBERS_JOINED', (data) => {
+            this.handleMembersJoined(data);
+        });
+
+        this.app.eventBus.on('MEMBERS_LEFT', (data) => {
+            this.handleMembersLeft(data);
+        });
+
+        // 채널 열람 상태 이벤트 (멤버십은 그대로, 온라인 표시만 변경)
+        this.app.eventBus.on('CHANNEL_PRESENCE', (data) => {
+            this.handleChannelPresence(data);
+        });
+
         // 사용자 상태 변경 이벤트
         this.app.eventBus.on('USER_STATUS_CHANGED', (data) => {
             this.handleUserStatusChanged(data);
@@ -43,6 +57,11 @@ export class ServerManager {
         this.app.eventBus.on('VOICE_STATE_UPDATE', (data) => {
             this.handleVoiceStateUpdate(data);
         });
+
+        // 미읽음 증분 이벤트 (사용자 룸으로 푸시)
+        this.app.eventBus.on('UNREAD_DELTA', (data) => {
+            this.handleUnreadDelta(data);
+        });
     }
 
     bindSidebarButtons() {
@@ -617,6 +636,31 @@ export class ServerManager {
         }
     }
 
+    /**
+     * 서버가 푸시한 미읽음 증분 적용 (접속 시 fetchUnreadCounts로 받은 스냅샷 기준)
+     * @param {{deltas: Array<{channelId: string, count: number, hasMention: boolean, reset: boolean}>}} data
+     */
+    handleUnreadDelta(data) {
+        const deltas = data?.deltas || [];
+        deltas.forEach(delta => {
+            const current = delta.reset ? { count: 0, has_mention: false } : (this.unreadCounts[delta.channelId] || { count: 0, has_mention: false });
+            // 보고 있는 채널의 새 메시지는 곧 읽음 처리되므로 배지에 반영하지 않음
+            if (!delta.reset && this.currentChannel?.id === delta.channelId) return;
+
+            const next = {
+                count: current.count + delta.count,
+                has_mention: current.has_mention || delta.hasMention
+            };
+            if (next.count > 0) {
+                this.unreadCounts[delta.channelId] = next;
+            } else {
+                delete this.unreadCounts[delta.channelId];
+            }
+        });
+        this.renderChannelList();
+        this.renderServerList();
+    }
+
     renderServerList() {
         const list = document.getElementById('servers-list');
         if (!list) return;
@@ -1348,6 +1392,40 @@ export class ServerManager {
         }
     }
 
+    handleMembersJoined(data) {
+        const { channelId, members = [] } = data;
+        if (this.currentChannel?.id !== channelId) return;
+        const list = this.channelMembers[channelId] || (this.channelMembers[channelId] = []);
+        const seenIds = new Set(list.map(m => m.id));
+        members.forEach(member => {
+            if (!seenIds.has(member.id)) {
+                seenIds.add(member.id);
+                list.push(member);
+            }
+        });
+        this.renderMembers();
+    }
+
+    handleMembersLeft(data) {
+        const { channelId, userIds = [] } = data;
+        if (this.currentChannel?.id === channelId && this.channelMembers[channelId]) {
+            const removed = new Set(userIds);
+            this.channelMembers[channelId] = this.channelMembers[channelId].filter(m => !removed.has(m.id));
+            this.renderMembers();
+        }
+    }
+
+    handleChannelPresence(data) {
+        const { channelId, userId, status } = data;
+        const member = this.channelMembers[channelId]?.find(m => m.id === userId);
+        if (member) {
+            member.status = status;
+            if (this.currentChannel?.id === channelId) {
+                this.renderMembers();
+            }
+        }
+    }
+
     handleUserStatusChanged(data) {
         console.log('[ServerManager] 사용자 상태 변경:', data);
         const { userId, status } = data;
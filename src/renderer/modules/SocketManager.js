@@ -13,6 +13,10 @@ export class SocketManager {
         this.connection = new SocketConnection(this.apiBase, null);
         this.dispatcher = new SocketEventDispatcher();
         this.eventHandler = new SocketEventHandler();
+        // 기기 idle 감지 (입력이 IDLE_AFTER_MS 동안 없으면 idle, 다시 입력하면 online)
+        this.presenceStatus = 'online';
+        this.lastActivityAt = Date.now();
+        this.idleTimer = null;
     }
 
     get apiBase() {
@@ -62,8 +66,12 @@ export class SocketManager {
             this.connection.setConnectionState(true);
             this.updateConnectionStatus('연결됨', true);
 
-            // 재연결 시 데이터 새로고침
+            // 재연결 시 사용자 룸 참가 후 미읽음 스냅샷 동기화 (이후는 unread_delta로 갱신)
             if (this.app.auth.isAuthenticated) {
+                const userId = this.app.auth.currentUser?.id;
+                if (userId) {
+                    this.emit('join_user', { userId });
+                }
                 this.app.serverManager.fetchUnreadCounts();
             }
 
@@ -71,6 +79,11 @@ export class SocketManager {
             if (this.app.webRTCManager) {
                 this.app.webRTCManager.setupSignalingListeners();
             }
+
+            // 새 연결은 online으로 시작
+            this.presenceStatus = 'online';
+            this.lastActivityAt = Date.now();
+            this.startIdleTracking();
         });
 
         this.eventHandler.on('disconnect', () => {
@@ -94,6 +107,10 @@ export class SocketManager {
             this.app.eventBus.emit('NOTIFICATION_RECEIVED', data);
         });
 
+        this.eventHandler.on('notification_digest', (data) => {
+            this.app.eventBus.emit('NOTIFICATION_DIGEST', data);
+        });
+
         this.eventHandler.on('message_deleted', (data) => {
             this.app.eventBus.emit('MESSAGE_DELETED', data);
         });
@@ -110,6 +127,10 @@ export class SocketManager {
             this.app.eventBus.emit('USER_READ_UPDATE', data);
         });
 
+        this.eventHandler.on('unread_delta', (data) => {
+            this.app.eventBus.emit('UNREAD_DELTA', data);
+        });
+
         this.eventHandler.on('reminder_notification', (data) => {
             this.app.eventBus.emit('REMINDER_NOTIFICATION', data);
         });
@@ -135,10 +156,29 @@ export class SocketManager {
             this.app.eventBus.emit('MEMBER_LEFT', data);
         });
 
+        this.eventHandler.on('members_joined', (data) => {
+            this.app.eventBus.emit('MEMBERS_JOINED', data);
+        });
+
+        this.eventHandler.on('members_left', (data) => {
+            this.app.eventBus.emit('MEMBERS_LEFT', data);
+        });
+
+        this.eventHandler.on('channel_presence', (data) => {
+            this.app.eventBus.emit('CHANNEL_PRESENCE', data);
+        });
+
         this.eventHandler.on('user_status_changed', (data) => {
             this.app.eventBus.emit('USER_STATUS_CHANGED', data);
         });
 
+        // 서버별로 모아서 오는 사용자 상태 (모든 기기 합산: online / idle / offline)
+        this.eventHandler.on('presence_update', (data) => {
+            for (const { userId, status } of data.users || []) {
+                this.app.eventBus.emit('USER_STATUS_CHANGED', { userId, status, serverId: data.serverId });
+            }
+        });
+
         this.eventHandler.on('voice_state_update', (data) => {
             console.log('[SocketManager] voice_state_update received:', data);
             this.app.eventBus.emit('VOICE_STATE_UPDATE', data);
@@ -194,10 +234,45 @@ export class SocketManager {
         }
     }
 
+    /**
+     * 입력 활동으로 기기 상태(online / idle)를 서버에 알림
+     */
+    startIdleTracking() {
+        if (this.idleTimer) return;
+        const IDLE_AFTER_MS = 5 * 60 * 1000;
+        const onActivity = () => {
+            this.lastActivityAt = Date.now();
+            if (this.presenceStatus === 'idle') {
+                this.setPresence('online');
+            }
+        };
+        this.activityEvents = ['mousemove', 'keydown', 'mousedown', 'focus'];
+        this.activityHandler = onActivity;
+        this.activityEvents.forEach((name) => window.addEventListener(name, onActivity, { passive: true }));
+        this.idleTimer = setInterval(() => {
+            if (this.presenceStatus === 'online' && Date.now() - this.lastActivityAt >= IDLE_AFTER_MS) {
+                this.setPresence('idle');
+            }
+        }, 30 * 1000);
+    }
+
+    stopIdleTracking() {
+        if (!this.idleTimer) return;
+        clearInterval(this.idleTimer);
+        this.idleTimer = null;
+        this.activityEvents.forEach((name) => window.removeEventListener(name, this.activityHandler));
+    }
+
+    setPresence(status) {
+        this.presenceStatus = status;
+        this.emit('set_presence', { status });
+    }
+
     /**
      * Socket 연결 해제
      */
     disconnect() {
+        this.stopIdleTracking();
         this.connection.disconnect();
         this.eventHandler.removeAllListeners();
     }